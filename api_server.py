@@ -0,0 +1,770 @@
+"""
+📌 語音互動 AI 系統 API 概述
+本系統支援語音與文字互動，整合 Whisper（STT）、自訂 ChatBot、TTS（本地/雲端），提供多種互動方式與回傳格式。
+
+所有部署（api_voice_input*.py、wsgi.py）都以 create_app(profile) 建立，共用同一組路由與 core/voice_pipeline.py 的
+VoicePipeline（降噪 → STT → agent → TTS），差別只在預設的回傳格式（response profile）：
+
+    - "unity"：multipart/form-data
+        - json: {"action": int, "response": 回應文字, ...}
+        - file: base64 編碼的 output.wav（或 output.ogg / output.mp3）
+    - "json"：application/json，{"response_text": 回應文字, "parsed_response": {"action": int}, "transcription": 辨識文字, "audio": base64 音訊}
+    - "raw"：直接回傳音訊檔，動作編號放在 X-Action 標頭
+
+每個請求可用 ?profile=xxx 或 X-Response-Profile 標頭改用其他格式。
+語音的編碼（wav / opus / mp3、位元率、取樣率）可用 audio_format / audio_bitrate / audio_sample_rate 指定（query string 或 JSON）。
+產生的語音都以內容雜湊存放，payload 帶有 audio_id 與 audio_url（見 9️⃣）；inline_audio=false 時回應不內嵌音訊，只給 audio_url。
+
+🧩 API 路由總覽：
+
+1️⃣ POST /voice_chat
+    - 說明：上傳語音檔（支援 mp3/wav/ogg，以檔頭判斷格式） → Whisper 辨識 → ChatBot 回應 → TTS 回傳語音
+    - 請求格式：multipart/form-data
+        - file: 語音檔案（超過 UPLOAD_MAX_MB 回傳 413，不是支援的音訊格式或無法解碼回傳 400）
+    - 回傳格式：依 response profile，payload 為 {"action": int, "response": 回應文字, "transcription": 辨識文字}
+
+2️⃣ POST /text_chat_unity
+    - 說明：Unity 使用者輸入文字 → 回傳文字 + 語音（Base64 編碼）
+    - 請求格式：application/json
+        - text: 要輸入的文字
+        - tts_service: "local" 或 "openai"（可選，預設為 local）
+    - 回傳格式：依 response profile，payload 為 {"action": int, "response": 回應文字}
+
+3️⃣ POST /text_chat
+    - 說明：通用文字聊天 API，可選是否回傳語音
+    - 請求格式：application/json
+        - text: 要輸入的文字
+        - generate_audio: true / false（可選，預設為 true）
+        - tts_service: "local" 或 "openai"（可選，預設為 local）
+    - 回傳格式：
+        - 若 generate_audio 為 false：json 格式 {"response": 回應文字}
+        - 若 generate_audio 為 true：依 response profile，payload 為 {"response": 回應文字}
+
+4️⃣ POST /text_chat_stream
+    - 說明：串流文字聊天 API，邊生成邊回傳，偵測到 <action> 標籤時立即通知 Unity
+    - 請求格式：application/json
+        - text: 要輸入的文字
+    - 回傳格式：application/x-ndjson，每行一個 JSON 事件
+        - {"action": int}：偵測到動作標籤時立即送出
+        - {"text": 文字片段}：已去除標籤、可直接送去 TTS 的文字
+        - {"action": int, "response": 完整回應文字}：串流結束
+
+5️⃣ GET /test_api?prompt=xxx
+    - 說明：測試 ChatBot 與語音回應（直接播放語音）
+    - 請求格式：URL query string
+        - prompt=xxx
+    - 回傳格式：audio/wav 音訊檔（原始流回傳）
+
+6️⃣ POST /voice_chat_stream
+    - 說明：邊錄邊傳 PCM 音訊 → VAD 偵測停頓/說完 → 分段降噪 + Whisper 辨識 → ChatBot 回應 → TTS 回傳語音
+    - 請求格式：application/octet-stream（chunked）
+        - body: 16-bit 單聲道 PCM，?sample_rate=16000（可選，8000–48000）
+    - 回傳格式：依 response profile，payload 為 {"action": int, "response": 回應文字, "transcription": 辨識文字}
+
+7️⃣ GET /inference_stats
+    - 說明：推論工作池的排隊數量與各 stage 的排隊/執行時間
+    - 回傳格式：application/json
+
+8️⃣ GET /metrics
+    - 說明：Prometheus 格式的各階段（降噪、STT、agent 每一步與 tool call、TTS、編碼）與各路由延遲直方圖，
+            以及 LLM 呼叫次數、token 數與估計費用（依 agent / 各 tool 分開統計）
+    - 回傳格式：text/plain
+
+9️⃣ GET /audio/<audio_id>
+    - 說明：下載先前產生的語音（回應中的 audio_url），支援 ETag（304）、Range 續傳（206）與長期快取
+    - 回傳格式：audio/wav、audio/ogg 或 audio/mpeg
+
+🔟 GET /healthz、GET /readyz
+    - 說明：存活檢查（process 能回應即 200）與就緒檢查（所有模型載入並完成 warm-up 才 200，否則 503），
+            /readyz 附上各元件（embedding、chatbot、denoiser、whisper、tts）的狀態與載入時間
+    - 回傳格式：application/json
+
+※ 1️⃣、2️⃣、3️⃣、4️⃣、5️⃣、6️⃣ 可用 X-Session-ID 標頭（或 ?session_id=）指定對話 session：同一個 session 的問題共用對話紀錄，
+   閒置超過 CHAT_SESSION_IDLE_SECONDS 自動清除；沒有指定時每個問題都不帶前文
+※ 所有非串流回應都帶有 Server-Timing 標頭，列出該請求各階段的耗時（毫秒）
+
+※ 1️⃣、6️⃣ 的降噪與辨識在推論工作池中執行，排隊已滿時回傳 503 與 Retry-After 標頭
+※ 1️⃣、2️⃣、3️⃣、4️⃣、6️⃣ 有並行上限與等待佇列，滿載時回傳 503 與 Retry-After；
+   接近滿載時進入降級模式（回應帶 X-Degraded: 1 標頭）：語音路由略過降噪，3️⃣ 只回傳文字
+"""
+from core.voice_pipeline import InvalidAudioError, VoicePipeline
+from utils.AudioEncoder import CODECS, EncodingConfig
+from utils.AudioSniffer import SNIFF_BYTES, sniff_audio_format
+from utils.AudioStore import AudioStore
+from utils.InferenceScheduler import QueueFullError
+from utils.AdmissionController import AdmissionController, OverloadedError
+from utils.RequestTracer import start_trace, end_trace, current_trace, trace_span, metrics, request_histogram
+from utils.ScratchStorage import record_write, request_bytes
+from utils.StreamingTagParser import StreamingTagParser
+
+from flask import Blueprint, Flask, Request, request, jsonify, send_file, make_response, Response, stream_with_context, g, current_app, url_for
+from flask_cors import CORS
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from werkzeug.exceptions import RequestEntityTooLarge
+import base64
+import contextlib
+import functools
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import time
+import uuid
+
+import openai
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# 整個 process 共用一個 pipeline（模型、推論工作池），create_app 建立幾個 app 都一樣
+pipeline = VoicePipeline()
+
+# 每類路由的並行上限與等待佇列；滿載時自動進入降級模式（略過降噪 / 只回文字），超過等待佇列直接回 503
+voice_admission = AdmissionController(
+    'voice',
+    max_concurrent=int(os.getenv("VOICE_MAX_CONCURRENT", 4)),
+    max_waiting=int(os.getenv("VOICE_MAX_WAITING", 8)),
+    wait_timeout=float(os.getenv("ADMISSION_WAIT_SECONDS", 10))
+)
+text_admission = AdmissionController(
+    'text',
+    max_concurrent=int(os.getenv("TEXT_MAX_CONCURRENT", 8)),
+    max_waiting=int(os.getenv("TEXT_MAX_WAITING", 16)),
+    wait_timeout=float(os.getenv("ADMISSION_WAIT_SECONDS", 10))
+)
+
+class ColoredFormatter(logging.Formatter):
+    COLORS = {
+        'DEBUG': '\033[94m',  # 藍色
+        'INFO': '\033[92m',   # 綠色
+        'WARNING': '\033[93m', # 黃色
+        'ERROR': '\033[91m',  # 紅色
+        'CRITICAL': '\033[1;91m', # 粗體紅色
+        'PURPLE': '\033[95m'  # 紫色
+    }
+
+    def format(self, record):
+        log_color = self.COLORS.get(record.levelname, '\033[0m')
+        reset_color = '\033[0m'
+        message = super().format(record)
+        return f"{log_color}{message}{reset_color}"
+
+def setup_logging():
+    # 彩色 handler 掛在 root logger，app.logger、pipeline 與各元件（Denoiser、Hedging...）的 log 都經過它；重複呼叫不會重複掛
+    root = logging.getLogger()
+    if any(isinstance(h.formatter, ColoredFormatter) for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColoredFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+# ---- Response profiles ----
+
+def unity_response(payload, audio, filename, inline):
+    # Unity 端以 multipart 解析：json 欄位 + base64 音訊（inline 為 false 時只有 json，音訊改由 audio_url 下載）
+    fields = {'json': ('json', json.dumps(payload, ensure_ascii=False), 'application/json')}
+    if inline:
+        with trace_span('encoding'):
+            audio_base64 = base64.b64encode(audio.data).decode('utf-8')
+        fields['file'] = (filename, audio_base64, audio.mimetype)
+    encoder = MultipartEncoder(fields=fields)
+    response = make_response(encoder.to_string())
+    response.headers['Content-Type'] = encoder.content_type
+    return response
+
+def json_response(payload, audio, filename, inline):
+    # 專題展網頁使用的 JSON 格式
+    body = {
+        "response_text": payload['response'],
+        "parsed_response": {"action": payload.get('action', -1)},
+        "audio_format": audio.codec,
+        "audio_url": payload['audio_url']
+    }
+    if inline:
+        with trace_span('encoding'):
+            body['audio'] = base64.b64encode(audio.data).decode('utf-8')
+    if 'transcription' in payload:
+        body['transcription'] = payload['transcription']
+    return jsonify(body)
+
+def raw_response(payload, audio, filename, inline):
+    # 直接回傳音訊（瀏覽器可直接播放），沒有 base64 的 33% 額外大小；同 /audio/<audio_id>，支援 ETag 與 Range
+    response = send_stored_audio(payload['audio_id'], download_name=filename, as_attachment=True)
+    response.headers['X-Action'] = str(payload.get('action', -1))
+    response.headers['X-Audio-Url'] = payload['audio_url']
+    return response
+
+AUDIO_MIMETYPES = {codec['extension']: codec['mimetype'] for codec in CODECS.values()}
+# /audio/<audio_id> 的快取時間（秒），預設一年：檔名就是內容雜湊，內容永遠不會變
+AUDIO_MAX_AGE = int(os.getenv("AUDIO_CACHE_MAX_AGE", 31536000))
+
+# X-Session-ID 允許的格式（英數字、底線、點、連字號，最多 64 字）
+SESSION_ID_PATTERN = re.compile(r'[\w.-]{1,64}')
+
+# /voice_chat_stream 接受的 PCM 取樣率（太低時 VAD 的 frame 長度會變成 0）
+STREAM_SAMPLE_RATES = range(8000, 48001)
+
+RESPONSE_PROFILES = {
+    'unity': unity_response,
+    'json': json_response,
+    'raw': raw_response,
+}
+
+def requested_profile():
+    # ?profile= 或 X-Response-Profile 標頭優先，否則使用 app 的預設 profile
+    return request.args.get('profile') or request.headers.get('X-Response-Profile') or current_app.config['RESPONSE_PROFILE']
+
+def requested_session():
+    """
+    X-Session-ID 標頭或 ?session_id= 指定的對話 session（例如每台導覽機一個 id），同一個 session 的問題共用對話紀錄；
+    沒有指定或格式不符時回傳 None，這個請求不帶任何前文。
+    """
+    session_id = request.headers.get('X-Session-ID') or request.args.get('session_id')
+    if session_id and not SESSION_ID_PATTERN.fullmatch(session_id):
+        current_app.logger.warning("Ignoring invalid session id")
+        return None
+    return session_id or None
+
+def requested_encoding():
+    """
+    回傳音訊的編碼：以 app 的預設值（create_app 的 encoding）為基礎，
+    請求可用 query string 或 JSON 的 audio_format / audio_bitrate（kbps）/ audio_sample_rate 覆寫。
+    """
+    options = request.args.to_dict()
+    # 串流上傳的 body 是音訊，不能當 JSON 讀
+    if request.is_json and request.endpoint != 'api.voice_chat_stream':
+        options = {**(request.get_json(silent=True) or {}), **options}
+    try:
+        return current_app.config['AUDIO_ENCODING'].override(
+            codec=options.get('audio_format'),
+            bitrate_kbps=int(options.get('audio_bitrate') or 0) or None,
+            sample_rate=int(options.get('audio_sample_rate') or 0) or None
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid audio encoding options: {e}") from e
+
+def requested_inline_audio():
+    # inline_audio=false 時回應不內嵌音訊，用戶端再依 audio_url 下載（可快取、可續傳）
+    inline = request.args.get('inline_audio')
+    if inline is None and request.is_json:
+        inline = (request.get_json(silent=True) or {}).get('inline_audio')
+    if isinstance(inline, str):
+        inline = inline.lower() != 'false'
+    return inline is None or bool(inline)
+
+def audio_response(payload, audio, filename='output'):
+    """
+    把 TTS 的 wav 依請求的編碼轉檔並存進 audio_store，再依 response profile 組出含語音的回應。
+    payload 會加上 audio_id 與 audio_url（/audio/<audio_id>）。
+    """
+    encoded = pipeline.encode(audio, g.encoding)
+    audio_id = pipeline.audio_store.put(encoded.data, encoded.extension)
+    payload = dict(payload, audio_id=audio_id, audio_url=url_for('api.audio', audio_id=audio_id))
+    return RESPONSE_PROFILES[requested_profile()](payload, encoded, f"{filename}.{encoded.extension}", requested_inline_audio())
+
+def send_stored_audio(audio_id, download_name=None, as_attachment=False):
+    """
+    回傳 audio_store 中的音檔。內容不會改變，所以用內容雜湊當 ETag 並允許長期快取；
+    conditional=True 讓 werkzeug 處理 If-None-Match（304）與 Range（206）。
+    """
+    path = pipeline.audio_store.path(audio_id)
+    if path is None:
+        return jsonify({"error": "Audio not found"}), 404
+    response = send_file(
+        path,
+        mimetype=AUDIO_MIMETYPES[audio_id.rsplit('.', 1)[1]],
+        as_attachment=as_attachment,
+        download_name=download_name or audio_id,
+        conditional=True,
+        etag=AudioStore.etag(audio_id),
+        max_age=AUDIO_MAX_AGE
+    )
+    response.headers['Cache-Control'] = f"public, max-age={AUDIO_MAX_AGE}, immutable"
+    return response
+
+# ---- Routes ----
+
+api = Blueprint('api', __name__)
+
+def admission(controller):
+    """
+    路由的准入控制 decorator；g.degraded 代表這個請求應該以降級模式處理。
+    推論工作池排隊超過一半時也視為高負載。
+    串流回應在 view 回傳後才真正執行 agent，名額保留到串流送完（或用戶端中斷）才釋放。
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with contextlib.ExitStack() as stack:
+                degraded = stack.enter_context(controller.admit())
+                scheduler = pipeline.scheduler
+                g.degraded = degraded or scheduler.depth >= scheduler.max_queue // 2
+                if g.degraded:
+                    current_app.logger.warning(f"\033[93m[Request ID: {request.id}] Degraded mode ({controller.name})\033[0m")
+                response = make_response(view(*args, **kwargs))
+                if g.degraded:
+                    response.headers['X-Degraded'] = '1'
+                if response.is_streamed:
+                    response.call_on_close(stack.pop_all().close)
+                return response
+        return wrapper
+    return decorator
+
+def read_audio_upload(field='file'):
+    """
+    取出 multipart 上傳的語音檔（已寫在這個請求的 scratch 資料夾，見 ScratchRequest）；
+    缺少檔案或內容不是支援的音訊格式時回傳 (None, 錯誤回應)。格式以檔頭的 magic bytes 判斷，不看用戶端的副檔名。
+    """
+    if field not in request.files:
+        current_app.logger.warning("No file part in the request")
+        return None, (jsonify({"error": "No file part"}), 400)
+    file = request.files[field]
+    if file.filename == '':
+        current_app.logger.warning("No selected file in the request")
+        return None, (jsonify({"error": "No selected file"}), 400)
+
+    audio_format = sniff_audio_format(file.stream.read(SNIFF_BYTES))
+    if audio_format not in current_app.config['ALLOWED_AUDIO_FORMATS']:
+        current_app.logger.warning(f"Unsupported audio content: {file.filename}")
+        return None, (jsonify({"error": "Unsupported audio format"}), 400)
+    size = file.stream.seek(0, os.SEEK_END)
+    file.stream.seek(0)
+    record_write('uploads', size)
+    current_app.logger.info(f"Received {audio_format} upload: {size} bytes")
+    return file.stream, None
+
+def read_text_input(field='text'):
+    """
+    取出 JSON 請求中的文字；缺少或空白時回傳 (None, 錯誤回應)。
+    """
+    if not request.json or field not in request.json:
+        current_app.logger.warning(f"No '{field}' parameter in the request")
+        return None, (jsonify({"error": f"No '{field}' parameter in the request"}), 400)
+    text_input = request.json[field]
+    if not text_input.strip():
+        current_app.logger.warning(f"Empty '{field}' parameter in the request")
+        return None, (jsonify({"error": f"Empty '{field}' parameter"}), 400)
+    current_app.logger.info(f"Received text input: {text_input}")
+    return text_input, None
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus 格式的延遲直方圖：
+        - voice_pipeline_stage_seconds{stage=...}: decode / denoise / stt / agent / agent_step / llm / tool_* / tts / transcode / encoding ...
+        - http_request_duration_seconds{route=...}: 各路由的總處理時間
+    LLM 用量（scope 為 agent 或 tool_<工具名稱>）：
+        - llm_calls_total / llm_call_seconds{scope=...}: LLM 呼叫次數與耗時
+        - llm_tokens_total{scope=...,kind=prompt|cached|completion}: token 數
+        - llm_cost_usd_total{scope=...}: 依 LLM_PRICE_* 估計的費用
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/inference_stats', methods=['GET'])
+def inference_stats():
+    """
+    推論工作池的狀態：目前排隊數量，以及各 stage（denoise / stt）的排隊與執行時間（平均、p95，單位秒）
+    """
+    stats = pipeline.scheduler.stats()
+    stats['admission'] = {'voice': voice_admission.stats(), 'text': text_admission.stats()}
+    return jsonify(stats)
+
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    存活檢查：process 能回應就回傳 200，不代表模型已載入（見 /readyz）。
+    """
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+@api.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    就緒檢查：所有必要元件都載入並完成 warm-up 才回傳 200，否則 503。
+    回傳各元件的狀態（pending / loading / warming / ready / failed）、載入與 warm-up 秒數，以及失敗原因。
+    """
+    status = pipeline.startup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@api.route('/audio/<audio_id>', methods=['GET'])
+def audio(audio_id):
+    """
+    下載先前產生的語音（回應中的 audio_url）。
+
+    支援 ETag / If-None-Match（304）、Range 部分下載（206）與長期快取（Cache-Control: immutable），
+    用戶端與 proxy 可以快取、重播或續傳。
+    """
+    return send_stored_audio(audio_id)
+
+@api.route('/voice_chat', methods=['POST'])
+@admission(voice_admission)
+def voice_chat():
+    """
+    語音輸入聊天 API，支援 mp3/wav/ogg，自動降噪 + Whisper 語音辨識 + ChatBot 回應 + TTS
+
+    請求類型：multipart/form-data
+        - file: 語音檔案（wav / mp3 / ogg，以檔頭判斷格式，與檔名無關）
+        - tts_service: "local" 或 "openai"（可選，預設為 local）
+
+    回傳：依 response profile，payload 為 {"action": int, "response": 回應文字, "transcription": 辨識文字}
+    上傳超過 UPLOAD_MAX_MB 回傳 413，內容不是支援的音訊格式或無法解碼回傳 400，都不會用到模型。
+
+    用途：語音輸入 → 對話回應（文字 + 語音）
+
+    高負載（降級模式）時略過降噪，直接辨識原始音訊。
+    """
+    upload, error = read_audio_upload()
+    if error:
+        return error
+
+    try:
+        transcription = pipeline.transcribe_upload(upload, denoise=not g.degraded)
+        response_text, action = pipeline.ask(transcription, requested_session())
+        audio = pipeline.synthesize(response_text, request.form.get('tts_service', 'local'))
+        return audio_response({'action': action, 'response': response_text, 'transcription': transcription}, audio)
+    except InvalidAudioError as e:
+        current_app.logger.warning(f"Invalid audio upload: {e}")
+        return jsonify({"error": "Invalid audio file"}), 400
+    except QueueFullError:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error processing file: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@api.route('/voice_chat_stream', methods=['POST'])
+@admission(voice_admission)
+def voice_chat_stream():
+    """
+    即時語音輸入聊天 API，邊收音邊做語音活動偵測（VAD）、降噪與 Whisper 辨識（見 VoicePipeline.transcribe_stream）
+
+    請求類型：application/octet-stream（建議使用 chunked transfer encoding 邊錄邊傳）
+        - body: 16-bit little-endian 單聲道 PCM，總長度上限同 UPLOAD_MAX_MB（超過時回傳 413）
+        - ?sample_rate=16000（可選，預設 16000，範圍 8000–48000，超出範圍回傳 400）
+        - ?tts_service=local 或 openai（可選，預設為 local）
+
+    偵測到說完話（長時間靜音）或上傳結束後，合併各段文字交給 ChatBot 回應。高負載（降級模式）時完全略過降噪。
+
+    回傳：依 response profile，payload 為 {"action": int, "response": 回應文字, "transcription": 辨識文字}
+    """
+    sample_rate = request.args.get('sample_rate', '16000')
+    if not sample_rate.isdigit() or int(sample_rate) not in STREAM_SAMPLE_RATES:
+        current_app.logger.warning(f"Invalid sample_rate: {sample_rate}")
+        return jsonify({"error": f"Invalid sample_rate (expected {STREAM_SAMPLE_RATES.start}-{STREAM_SAMPLE_RATES.stop - 1})"}), 400
+    sample_rate = int(sample_rate)
+    try:
+        transcription = pipeline.transcribe_stream(request.stream, sample_rate=sample_rate, denoise=not g.degraded)
+        if not transcription:
+            current_app.logger.warning("No speech detected in the stream")
+            return jsonify({"error": "No speech detected"}), 400
+
+        response_text, action = pipeline.ask(transcription, requested_session())
+        audio = pipeline.synthesize(response_text, request.args.get('tts_service', 'local'))
+        return audio_response({'action': action, 'response': response_text, 'transcription': transcription}, audio)
+    except (QueueFullError, RequestEntityTooLarge):
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error in voice_chat_stream: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@api.route('/text_chat_unity', methods=['POST'])
+@admission(text_admission)
+def text_chat_unity():
+    """
+    Unity 專用純文字聊天 API，回傳 ChatBot 回應 + 語音音檔
+
+    請求類型：application/json
+        {
+            "text": "你想問的問題",
+            "tts_service": "local" 或 "openai"（可選，預設為 local）
+        }
+
+    回傳：依 response profile，payload 為 {"action": int, "response": 回應文字}
+
+    用途：提供 Unity 使用者用於文字問答與語音播放
+
+    降級模式只加上 X-Degraded 標頭，不略過 TTS：Unity 端只播放回傳的語音，沒有語音就等於沒有回答。
+    """
+    try:
+        text_input, error = read_text_input()
+        if error:
+            return error
+
+        response_text, action = pipeline.ask(text_input, requested_session())
+        audio = pipeline.synthesize(response_text, request.json.get('tts_service', 'local'))
+        return audio_response({'action': action, 'response': response_text}, audio)
+    except Exception as e:
+        current_app.logger.error(f"Error in text_chat_unity: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@api.route('/text_chat', methods=['POST'])
+@admission(text_admission)
+def text_chat():
+    """
+    通用純文字聊天 API，可選擇是否產生語音
+
+    請求類型：application/json
+        {
+            "text": "你想問的內容",
+            "generate_audio": true 或 false（可選，預設為 true），
+            "tts_service": "local" 或 "openai"（可選，預設為 local）
+        }
+
+    回傳：
+        若 generate_audio 為 false，或伺服器高負載（降級模式）：
+            - JSON: {"response": 回應文字}（降級模式另有 "degraded": true）
+        若 generate_audio 為 true：
+            - 依 response profile，payload 為 {"response": 回應文字}
+
+    用途：前端通用文字輸入，支援語音輸出功能
+    """
+    try:
+        text_input, error = read_text_input()
+        if error:
+            return error
+
+        # 獲取可選參數 generate_audio（預設為 True）
+        generate_audio = request.json.get('generate_audio', True)
+        if isinstance(generate_audio, str):
+            generate_audio = generate_audio.lower() == 'true'
+
+        response_text, action = pipeline.ask(text_input, requested_session())
+
+        if g.degraded:
+            # 高負載時不產生語音，只回文字
+            return jsonify({"response": response_text, "degraded": True}), 200
+
+        if not generate_audio:
+            # 如果不需要生成音訊，直接返回文字回應
+            return jsonify({"response": response_text}), 200
+
+        audio = pipeline.synthesize(response_text, request.json.get('tts_service', 'local'))
+        return audio_response({'response': response_text}, audio)
+    except Exception as e:
+        current_app.logger.error(f"Error processing text input: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@api.route('/text_chat_stream', methods=['POST'])
+@admission(text_admission)
+def text_chat_stream():
+    """
+    串流純文字聊天 API，逐段回傳去除 <action> 標籤後的文字
+
+    請求類型：application/json
+        {
+            "text": "你想問的問題"
+        }
+
+    回傳類型：application/x-ndjson（每行一個 JSON 事件）
+        - {"action": int}：偵測到 <action>N</action> 時立即送出
+        - {"text": 文字片段}：可直接送去 TTS 的文字
+        - {"action": int, "response": 完整回應文字}：串流結束
+
+    用途：讓 Unity 在回答生成途中就能開始播放動作與語音
+
+    與其他文字路由共用並行上限，名額保留到串流結束；本來就只回傳文字，降級模式只加上 X-Degraded 標頭。
+    """
+    text_input, error = read_text_input()
+    if error:
+        return error
+
+    logger = current_app.logger
+    request_id = request.id
+    session_id = requested_session()
+
+    def generate():
+        events = []
+        parser = StreamingTagParser(on_action=lambda action: events.append({"action": action}))
+        spoken = []
+        try:
+            # 同一個 session 的 agent 保留到串流讀完（或用戶端中斷、generator 被關閉），只會讓同一個 session 的下一個請求等待
+            with pipeline.agent_manager.using_agent(session_id) as chat_agent:
+                response = chat_agent.chat(text_input)
+                for token in response.response_gen:
+                    text = parser.feed(token)
+                    if text:
+                        events.append({"text": text})
+                        spoken.append(text)
+                    # 動作標籤與文字依照出現順序送出
+                    while events:
+                        event = events.pop(0)
+                        if 'action' in event:
+                            logger.info(f'[Request ID: {request_id}] Parsed action: {event["action"]}')
+                        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+            text = parser.flush()
+            if text:
+                spoken.append(text)
+                yield json.dumps({"text": text}, ensure_ascii=False) + "\n"
+
+            response_text = "".join(spoken)
+            logger.info(f"\033[94m[Bot response] {response_text}\033[0m")
+            yield json.dumps({"action": parser.action, "response": response_text}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Error in text_chat_stream: {e}", exc_info=True)
+            yield json.dumps({"error": "Internal server error"}) + "\n"
+
+    return Response(stream_with_context(generate()), content_type='application/x-ndjson')
+
+@api.route('/test_api', methods=['GET'])
+def test_api():
+    """
+    測試 ChatBot 與語音生成的快速 API（GET 版本）
+
+    請求類型：URL 查詢字串
+        - prompt=你想測試的文字
+
+    回傳：直接傳送 audio/wav 音訊檔案（瀏覽器會直接播放）
+
+    用途：確認文字輸入與語音輸出是否正常運作
+    """
+    try:
+        text_prompt = request.args.get('prompt')
+        if not text_prompt:
+            current_app.logger.warning("No 'prompt' parameter in the request")
+            return jsonify({"error": "Missing 'prompt' parameter"}), 400
+
+        current_app.logger.info(f"Received text prompt: {text_prompt}")
+        response_text, action = pipeline.ask(text_prompt, requested_session())
+        audio = pipeline.encode(pipeline.synthesize(response_text), g.encoding)
+        audio_id = pipeline.audio_store.put(audio.data, audio.extension)
+
+        # 傳回音訊檔案，讓瀏覽器直接播放（可拖曳進度條、重新整理時走快取）
+        return send_stored_audio(audio_id, download_name=f'test_output.{audio.extension}')
+    except Exception as e:
+        current_app.logger.error(f"Error in test_api: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+# ---- App factory ----
+
+def before_request_hooks():
+    # 設置請求唯一 ID
+    request.id = str(uuid.uuid4())
+    start_trace(request.id)
+    current_app.logger.info(f"\033[94m[Request ID: {request.id}] Incoming request: {request.url}\033[0m")
+    pipeline.scratch.start_janitor()
+
+    # 不支援的 profile 或編碼在跑模型之前就先拒絕
+    if requested_profile() not in RESPONSE_PROFILES:
+        return jsonify({"error": f"Unknown response profile: {requested_profile()}"}), 400
+    try:
+        g.encoding = requested_encoding()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 串流上傳的音訊不能在這裡整包讀進記憶體
+    if request.endpoint == 'api.voice_chat_stream':
+        return
+
+    # 確保請求數據是 UTF-8 解碼
+    try:
+        if request.data:
+            request.data = request.data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        current_app.logger.error(f"Unicode decode error: {e}")
+        return jsonify({"error": "Invalid UTF-8 encoding"}), 400
+
+def add_server_timing(response):
+    # 各階段耗時放進 Server-Timing 標頭（瀏覽器 DevTools / Unity 可直接讀），串流回應的階段在送出標頭時還沒跑完所以略過
+    trace = current_trace()
+    if trace is not None and not response.is_streamed:
+        response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+def request_scratch_dir():
+    """
+    這個請求專用的暫存資料夾（第一次呼叫時建立），請求結束時整個刪除，出錯也不會留下檔案。
+    """
+    return pipeline.scratch.request_dir(request.id)
+
+class ScratchRequest(Request):
+    """
+    multipart 上傳的檔案邊收邊寫進這個請求自己的 scratch 資料夾，檔名由伺服器產生：
+    同時上傳同名檔案（例如都叫 recording.wav）不會互相覆蓋，也不會整包放在記憶體或系統的 /tmp。
+    body 的大小上限為 MAX_CONTENT_LENGTH（UPLOAD_MAX_MB），超過時 werkzeug 會在讀取途中丟出 RequestEntityTooLarge。
+    以路徑重新開啟，file.stream.name 就是檔案路徑，decode_audio 直接讀檔（torchaudio 的 sox backend 不接受 file-like）。
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        fd, path = tempfile.mkstemp(dir=request_scratch_dir(), prefix='upload-')
+        os.close(fd)
+        return open(path, 'w+b')
+
+def finish_trace(exc=None):
+    if hasattr(request, 'id'):
+        pipeline.scratch.release(request.id)
+    trace = end_trace()
+    if trace is not None:
+        seconds = time.perf_counter() - trace.start
+        route = request.url_rule.rule if request.url_rule else 'unknown'
+        request_histogram.observe(route, seconds)
+        request_bytes.observe(route, trace.counters.get('scratch_bytes', 0))
+        current_app.logger.info(f"[Request ID: {trace.request_id}] total={seconds:.3f}s {trace.summary()}")
+
+def handle_too_large(e):
+    limit_mb = current_app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+    current_app.logger.warning(f"\033[93m[Request ID: {request.id}] Upload exceeds {limit_mb:g} MB\033[0m")
+    return jsonify({"error": f"Upload too large (max {limit_mb:g} MB)"}), 413
+
+def handle_overloaded(e):
+    current_app.logger.warning(f"\033[93m[Request ID: {request.id}] {e}\033[0m")
+    response = jsonify({"error": "Server busy, please retry later"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def create_app(profile=None, encoding=None):
+    """
+    建立 Flask app。
+    - profile: 預設的回傳格式（unity / json / raw），未指定時讀取 RESPONSE_PROFILE（預設 unity）
+    - encoding: 預設的音訊編碼（EncodingConfig），未指定時讀取 AUDIO_FORMAT / AUDIO_BITRATE_KBPS / AUDIO_SAMPLE_RATE
+    """
+    profile = profile or os.getenv("RESPONSE_PROFILE", "unity")
+    if profile not in RESPONSE_PROFILES:
+        raise ValueError(f"Unknown response profile: {profile}")
+
+    # 要在第一次用到 app.logger 前設定，Flask 才不會再替它加上預設的 handler
+    setup_logging()
+    app = Flask(__name__)
+    app.request_class = ScratchRequest
+    CORS(app)  # 允許所有來源跨域
+    app.config['RESPONSE_PROFILE'] = profile
+    app.config['AUDIO_ENCODING'] = encoding or EncodingConfig.from_env()
+    app.config['ALLOWED_AUDIO_FORMATS'] = {'wav', 'mp3', 'ogg'}
+    # 上傳（含 /voice_chat_stream 的 PCM）的大小上限，有 Content-Length 時在讀取 body 之前就回傳 413
+    app.config['MAX_CONTENT_LENGTH'] = int(float(os.getenv("UPLOAD_MAX_MB", 10)) * 1024 * 1024)
+
+    app.before_request(before_request_hooks)
+    app.after_request(add_server_timing)
+    app.teardown_request(finish_trace)
+    app.register_error_handler(RequestEntityTooLarge, handle_too_large)
+    app.register_error_handler(QueueFullError, handle_overloaded)
+    app.register_error_handler(OverloadedError, handle_overloaded)
+    app.register_blueprint(api)
+    return app
+
+def run(app, port=443):
+    """
+    開發用的啟動方式（python api_voice_input*.py）：載入模型後以 Flask 內建 server 執行。正式環境請用 gunicorn（見 wsgi.py）。
+    """
+    project_root = os.path.abspath(os.path.dirname(__file__))
+    ffmpeg_path = os.path.join(project_root, 'ffmpeg', 'bin')
+    os.environ['PATH'] += os.pathsep + ffmpeg_path
+
+    # 確認 ffmpeg 是否可用
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, check=True)
+        app.logger.info(f"ffmpeg is accessible:\n{result.stdout}")
+    except Exception as e:
+        app.logger.error(f"ffmpeg is not accessible: {e}")
+
+    app.logger.info(f"Current working directory: {os.getcwd()}")
+
+    # 模型在背景分階段載入，server 先開始接受請求；載入完成前 /readyz 回傳 503
+    app.logger.info("Loading chat bot, Denoiser and Whisper model in background (see /readyz)...")
+    pipeline.load(background=True)
+
+    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
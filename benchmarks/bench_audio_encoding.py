@@ -0,0 +1,112 @@
+"""
+比較回傳語音的各種編碼（WAV / OGG-Opus / MP3、位元率、取樣率）的傳輸大小與編碼時間。
+
+- bytes: 編碼後的檔案大小（raw profile 實際傳輸的大小）
+- base64: unity / json profile 以 base64 內嵌後的大小
+- encode: 以 utils.AudioEncoder 在 process 內編碼的時間（中位數）
+- 最後一列為舊版做法（每個請求 fork 一次 ffmpeg 轉成 44.1kHz 16-bit WAV）的時間，作為對照
+
+輸入為 TTS 產生的 wav 檔；沒有指定時會以 --text 呼叫本地 TTS（TTS_LOCAL_URL）產生一段。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.bench_audio_encoding --inputs output/sample.wav --repeat 10
+"""
+import argparse
+import base64
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+import requests
+
+from utils.AudioEncoder import EncodingConfig, encode_audio
+
+DEFAULT_CONFIGS = [
+    EncodingConfig('wav'),
+    EncodingConfig('wav', sample_rate=16000),
+    EncodingConfig('opus', bitrate_kbps=16),
+    EncodingConfig('opus', bitrate_kbps=24),
+    EncodingConfig('opus', bitrate_kbps=32),
+    EncodingConfig('opus', bitrate_kbps=48),
+    EncodingConfig('mp3', bitrate_kbps=32),
+    EncodingConfig('mp3', bitrate_kbps=64),
+]
+
+DEFAULT_TEXT = "你好！我是臺東大學的 AI 導覽員，阿美族是臺灣人口最多的原住民族，主要分布在花東縱谷與海岸一帶。"
+
+
+def load_inputs(paths, text):
+    if paths:
+        clips = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                clips.append(f.read())
+        return clips
+    url = os.getenv("TTS_LOCAL_URL", "http://127.0.0.1:9880/")
+    response = requests.get(url, params={"text": text, "text_language": "zh"}, timeout=120)
+    response.raise_for_status()
+    return [response.content]
+
+
+def legacy_ffmpeg_seconds(wav_bytes):
+    # 舊版 call_tts_and_save：寫暫存檔後 fork ffmpeg 轉成 pcm_s16le 44.1kHz
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'input.wav')
+        target = os.path.join(directory, 'output.wav')
+        with open(source, 'wb') as f:
+            f.write(wav_bytes)
+        start = time.perf_counter()
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', source, '-acodec', 'pcm_s16le', '-ar', '44100', target],
+                       check=True)
+        seconds = time.perf_counter() - start
+        return seconds, os.path.getsize(target)
+
+
+def describe(config):
+    parts = [config.codec]
+    if config.bitrate_kbps:
+        parts.append(f"{config.bitrate_kbps}k")
+    if config.sample_rate:
+        parts.append(f"{config.sample_rate // 1000}kHz")
+    return " ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response audio encoding benchmark")
+    parser.add_argument('--inputs', nargs='*', help="TTS 產生的 wav 檔")
+    parser.add_argument('--text', default=DEFAULT_TEXT, help="沒有 --inputs 時送去本地 TTS 的文字")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    clips = load_inputs(args.inputs, args.text)
+    # 先編碼一次，讓 libav 的編碼器與 resampler 完成初始化
+    for config in DEFAULT_CONFIGS:
+        encode_audio(clips[0], config)
+
+    print(f"{'encoding':<18}{'bytes':>10}{'base64':>10}{'ratio':>8}{'encode ms':>11}")
+    baseline = sum(len(clip) for clip in clips)
+    for config in DEFAULT_CONFIGS:
+        sizes, times = 0, []
+        for clip in clips:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                encoded = encode_audio(clip, config)
+                times.append(time.perf_counter() - start)
+            sizes += len(encoded.data)
+        encoded_base64 = sum(len(base64.b64encode(encode_audio(clip, config).data)) for clip in clips)
+        print(f"{describe(config):<18}{sizes:>10}{encoded_base64:>10}{sizes / baseline:>8.0%}"
+              f"{statistics.median(times) * 1000:>11.1f}")
+
+    try:
+        results = [legacy_ffmpeg_seconds(clip) for clip in clips for _ in range(args.repeat)]
+        size = sum(legacy_ffmpeg_seconds(clip)[1] for clip in clips)
+        print(f"{'ffmpeg fork (old)':<18}{size:>10}{size * 4 // 3:>10}{size / baseline:>8.0%}"
+              f"{statistics.median(seconds for seconds, _ in results) * 1000:>11.1f}")
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"ffmpeg not available, skipping legacy comparison: {e}")
+
+
+if __name__ == "__main__":
+    main()
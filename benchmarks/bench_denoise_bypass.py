@@ -0,0 +1,75 @@
+"""
+評估依 SNR 略過降噪（DENOISE_SNR_THRESHOLD）能省下多少時間，以及對辨識正確率（CER）的影響。
+
+測試資料夾格式與 bench_stt 相同（transcripts.json + 音檔），建議同時放入乾淨與吵雜的錄音。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.bench_denoise_bypass --clips tests/clips --thresholds 20 25 30 35
+"""
+import argparse
+import time
+
+from benchmarks.bench_stt import character_error_rate, load_clips, normalize_text
+from utils.Denoiser import Denoiser
+from utils.VoiceActivityDetector import estimate_snr
+from utils.WhisperTranscriber import WhisperTranscriber
+
+SAMPLE_RATE = 16000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SNR-based denoise bypass benchmark")
+    parser.add_argument('--clips', required=True, help="含 transcripts.json 的測試音檔資料夾")
+    parser.add_argument('--thresholds', nargs='+', type=float, default=[20.0, 25.0, 30.0, 35.0])
+    parser.add_argument('--model', default='medium')
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    denoiser = Denoiser(snr_threshold="")
+    transcriber = WhisperTranscriber(args.model)
+
+    # 每個音檔只跑一次降噪與兩次辨識，不同門檻的結果由這些數據組合出來
+    rows = []
+    for name, audio, reference in clips:
+        start = time.perf_counter()
+        snr_db, _ = estimate_snr(audio, SAMPLE_RATE)
+        estimate_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        denoised = denoiser.denoise_array(audio, SAMPLE_RATE)
+        denoise_seconds = time.perf_counter() - start
+
+        raw_cer = character_error_rate(reference, transcriber.transcribe(audio))
+        denoised_cer = character_error_rate(reference, transcriber.transcribe(denoised))
+        rows.append({
+            'name': name,
+            'chars': len(normalize_text(reference)),
+            'snr_db': snr_db,
+            'estimate_seconds': estimate_seconds,
+            'denoise_seconds': denoise_seconds,
+            'raw_cer': raw_cer,
+            'denoised_cer': denoised_cer,
+        })
+        print(f"  {name}: SNR={snr_db:.1f}dB estimate={estimate_seconds * 1000:.2f}ms "
+              f"denoise={denoise_seconds:.2f}s CER raw={raw_cer:.3f} denoised={denoised_cer:.3f}")
+
+    total_chars = sum(row['chars'] for row in rows) or 1
+    always_seconds = sum(row['denoise_seconds'] for row in rows)
+    always_cer = sum(row['denoised_cer'] * row['chars'] for row in rows) / total_chars
+    never_cer = sum(row['raw_cer'] * row['chars'] for row in rows) / total_chars
+
+    print()
+    print(f"{'policy':<18}{'bypassed':>10}{'denoise (s)':>14}{'saved (s)':>12}{'CER':>10}")
+    print(f"{'always':<18}{0:>10}{always_seconds:>14.2f}{0.0:>12.2f}{always_cer:>10.3f}")
+    for threshold in args.thresholds:
+        bypass = [row['snr_db'] >= threshold for row in rows]
+        seconds = sum(row['estimate_seconds'] + (0.0 if skip else row['denoise_seconds'])
+                      for row, skip in zip(rows, bypass))
+        cer = sum((row['raw_cer'] if skip else row['denoised_cer']) * row['chars']
+                  for row, skip in zip(rows, bypass)) / total_chars
+        print(f"{f'snr >= {threshold:g} dB':<18}{sum(bypass):>10}{seconds:>14.2f}{always_seconds - seconds:>12.2f}{cer:>10.3f}")
+    print(f"{'never':<18}{len(rows):>10}{0.0:>14.2f}{always_seconds:>12.2f}{never_cer:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
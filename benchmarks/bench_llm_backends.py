@@ -0,0 +1,88 @@
+"""
+比較不同 LLM backend（openai / ollama / llamacpp）在同一組問題上的首字延遲與生成速度。
+
+直接以 build_llm() 建立的 LLM 呼叫 stream_chat（system prompt 使用精簡版 ReAct header，不經過 agent 與工具），
+--concurrency 大於 1 時同時送出多個請求，可觀察本地 server 的批次處理（Ollama 的 OLLAMA_NUM_PARALLEL、llama.cpp 的 --parallel）效果。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.bench_llm_backends --backends openai ollama --concurrency 1 4
+
+沒有本地模型時可先啟動替身 server：
+    python -m benchmarks.local_llm_stub --port 8080
+    LLAMACPP_BASE_URL=http://127.0.0.1:8080/v1 python -m benchmarks.bench_llm_backends --backends llamacpp
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llama_index.core.llms import ChatMessage
+from llama_index.core.utilities.token_counting import TokenCounter
+
+from benchmarks.bench_prompt_cache import DEFAULT_QUESTIONS
+from core.chatbot_core import REACT_SYSTEM_HEADERS, build_llm, warm_up_llm
+
+token_counter = TokenCounter()
+
+
+def load_system_prompt():
+    with open(REACT_SYSTEM_HEADERS["compact"], encoding="utf-8") as f:
+        return f.read().format(tool_names="", tool_desc="（本測試不提供工具）")
+
+
+def ask(llm, system_prompt, question):
+    messages = [ChatMessage(role="system", content=system_prompt), ChatMessage(role="user", content=question)]
+    start = time.perf_counter()
+    first = None
+    text = ""
+    for chunk in llm.stream_chat(messages):
+        if first is None and chunk.delta:
+            first = time.perf_counter() - start
+        text += chunk.delta or ""
+    total = time.perf_counter() - start
+    tokens = token_counter.get_string_tokens(text)
+    generation = total - (first or total)
+    return {
+        'ttft': first if first is not None else total,
+        'total': total,
+        'tokens': tokens,
+        'tokens_per_second': tokens / generation if generation > 0 else 0.0,
+    }
+
+
+def run(backend, questions, concurrency):
+    llm = build_llm(backend)
+    warm_up_llm(llm)
+    system_prompt = load_system_prompt()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda question: ask(llm, system_prompt, question), questions * concurrency))
+    wall = time.perf_counter() - start
+    return {
+        'backend': backend,
+        'concurrency': concurrency,
+        'ttft_median': statistics.median(r['ttft'] for r in results),
+        'ttft_max': max(r['ttft'] for r in results),
+        'tokens_per_second': statistics.median(r['tokens_per_second'] for r in results),
+        # 所有請求合計的吞吐量，批次處理有效時會隨 concurrency 上升
+        'throughput': sum(r['tokens'] for r in results) / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM backend latency / throughput benchmark")
+    parser.add_argument('--backends', nargs='+', default=['openai', 'ollama'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1])
+    parser.add_argument('--questions', nargs='+', default=DEFAULT_QUESTIONS)
+    args = parser.parse_args()
+
+    rows = [run(backend, args.questions, concurrency) for backend in args.backends for concurrency in args.concurrency]
+
+    print(f"{'backend':<10}{'conc.':>6}{'TTFT p50':>10}{'TTFT max':>10}{'tok/s p50':>11}{'total tok/s':>13}")
+    for row in rows:
+        print(f"{row['backend']:<10}{row['concurrency']:>6}{row['ttft_median']:>9.2f}s{row['ttft_max']:>9.2f}s"
+              f"{row['tokens_per_second']:>11.1f}{row['throughput']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
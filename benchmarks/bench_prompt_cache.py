@@ -0,0 +1,91 @@
+"""
+比較不同 ReAct system prompt 的 prompt caching 命中率、token 數與首字延遲（TTFT）。
+
+每個 header 各跑兩輪同一組問題：
+- 串流輪：以 stream_chat 量測從送出問題到收到第一個回答 token 的時間（包含前面的 ReAct 推理步驟）
+- 非串流輪：以 chat 取得 OpenAI 回傳的 usage，統計 prompt / cached / completion token（串流回應沒有 usage）
+
+header 可以是 full、compact 或 prompt 檔案路徑。core/promp_configs/專題展用_react_system_header_str_CN.txt
+是調整前（工具清單夾在中間）的版本，可用來比較調整前後。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.bench_prompt_cache --headers core/promp_configs/專題展用_react_system_header_str_CN.txt full compact
+"""
+import argparse
+import statistics
+import time
+
+from core.chatbot_core import ChatBot
+from utils.RequestTracer import end_trace, start_trace
+
+DEFAULT_QUESTIONS = [
+    "你好",
+    "台灣原住民有幾族？",
+    "介紹一下阿美族",
+    "編號AT003217-001是甚麼物品？",
+    "排灣族的傳統工藝有哪些？",
+    "跳舞",
+]
+
+
+def measure_ttft(bot, question):
+    start = time.perf_counter()
+    first = None
+    response = bot.chat(question)
+    for token in response.response_gen:
+        if first is None and token.strip():
+            first = time.perf_counter() - start
+    return first if first is not None else time.perf_counter() - start, time.perf_counter() - start
+
+
+def measure_tokens(bot, question):
+    trace = start_trace(f"bench-{question}")
+    try:
+        bot.normal_chat(question)
+    finally:
+        end_trace()
+    return trace.counters
+
+
+def run_header(header, questions):
+    bot = ChatBot(system_header=header)
+    ttfts, totals = [], []
+    for question in questions:
+        ttft, total = measure_ttft(bot, question)
+        ttfts.append(ttft)
+        totals.append(total)
+
+    bot = ChatBot(system_header=header)
+    usage = {'llm_calls': 0, 'llm_prompt_tokens': 0, 'llm_cached_tokens': 0, 'llm_completion_tokens': 0, 'llm_cost_usd': 0.0}
+    for question in questions:
+        for key, value in measure_tokens(bot, question).items():
+            usage[key] = usage.get(key, 0) + value
+    return {
+        'header': header,
+        'ttft_median': statistics.median(ttfts),
+        'total_median': statistics.median(totals),
+        'calls': usage['llm_calls'],
+        'prompt': usage['llm_prompt_tokens'],
+        'cached_ratio': usage['llm_cached_tokens'] / usage['llm_prompt_tokens'] if usage['llm_prompt_tokens'] else 0.0,
+        'completion': usage['llm_completion_tokens'],
+        'cost': usage['llm_cost_usd'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReAct system prompt caching benchmark")
+    parser.add_argument('--headers', nargs='+', default=['full', 'compact'])
+    parser.add_argument('--questions', nargs='+', default=DEFAULT_QUESTIONS)
+    args = parser.parse_args()
+
+    rows = [run_header(header, args.questions) for header in args.headers]
+
+    print(f"{'header':<40}{'TTFT p50':>10}{'total p50':>11}{'calls':>7}{'prompt':>9}{'cached':>8}{'compl.':>8}{'cost $':>10}")
+    for row in rows:
+        name = row['header'] if len(row['header']) <= 38 else "..." + row['header'][-35:]
+        print(f"{name:<40}{row['ttft_median']:>9.2f}s{row['total_median']:>10.2f}s{row['calls']:>7}"
+              f"{row['prompt']:>9}{row['cached_ratio']:>8.0%}{row['completion']:>8}{row['cost']:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+比較不同 STT backend 的速度（real-time factor）與正確率（CER）。
+
+測試資料夾格式：
+    clips/
+    ├── transcripts.json     {"001.wav": "阿美族的豐年祭在幾月?", ...}
+    ├── 001.wav
+    └── ...
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.bench_stt --clips tests/clips --backends openai-whisper faster-whisper
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import whisper
+
+from utils.WhisperTranscriber import WhisperTranscriber
+
+SAMPLE_RATE = 16000
+
+
+def normalize_text(text):
+    # 只比較文字本身，去掉空白與標點
+    return re.sub(r'[\s\W_]+', '', text)
+
+
+def edit_distance(reference, hypothesis):
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_char != hyp_char)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(reference, hypothesis):
+    reference = normalize_text(reference)
+    hypothesis = normalize_text(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return edit_distance(reference, hypothesis) / len(reference)
+
+
+def load_clips(clips_dir):
+    with open(os.path.join(clips_dir, 'transcripts.json'), 'r', encoding='utf-8') as file:
+        transcripts = json.load(file)
+    # 事先解碼，避免把讀檔時間算進 backend
+    return [
+        (name, whisper.load_audio(os.path.join(clips_dir, name)), reference)
+        for name, reference in sorted(transcripts.items())
+    ]
+
+
+def run_backend(backend, clips, model_name, language, warmup):
+    start = time.perf_counter()
+    transcriber = WhisperTranscriber(model_name, backend=backend)
+    load_seconds = time.perf_counter() - start
+
+    if warmup and clips:
+        transcriber.transcribe(clips[0][1], language)
+
+    total_audio = 0.0
+    total_elapsed = 0.0
+    total_errors = 0.0
+    total_chars = 0
+    for name, audio, reference in clips:
+        start = time.perf_counter()
+        hypothesis = transcriber.transcribe(audio, language)
+        elapsed = time.perf_counter() - start
+
+        duration = len(audio) / SAMPLE_RATE
+        cer = character_error_rate(reference, hypothesis)
+        total_audio += duration
+        total_elapsed += elapsed
+        total_errors += cer * len(normalize_text(reference))
+        total_chars += len(normalize_text(reference))
+        print(f"  [{backend}] {name}: {duration:.1f}s audio, {elapsed:.2f}s, RTF={elapsed / duration:.3f}, CER={cer:.3f} | {hypothesis}")
+
+    return {
+        'backend': backend,
+        'load_seconds': load_seconds,
+        'rtf': total_elapsed / total_audio if total_audio else 0.0,
+        'cer': total_errors / total_chars if total_chars else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STT backend benchmark (RTF / CER)")
+    parser.add_argument('--clips', required=True, help="含 transcripts.json 的測試音檔資料夾")
+    parser.add_argument('--backends', nargs='+', default=['openai-whisper', 'faster-whisper'])
+    parser.add_argument('--model', default='medium')
+    parser.add_argument('--language', default='zh')
+    parser.add_argument('--no-warmup', action='store_true')
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    print(f"Loaded {len(clips)} clips from {args.clips}")
+
+    results = []
+    for backend in args.backends:
+        print(f"Running {backend} ({args.model})...")
+        results.append(run_backend(backend, clips, args.model, args.language, not args.no_warmup))
+
+    print()
+    print(f"{'backend':<16}{'load (s)':>10}{'RTF':>10}{'CER':>10}")
+    for result in results:
+        print(f"{result['backend']:<16}{result['load_seconds']:>10.1f}{result['rtf']:>10.3f}{result['cer']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
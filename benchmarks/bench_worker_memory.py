@@ -0,0 +1,53 @@
+"""
+量測 gunicorn master 與各 worker 的實際記憶體用量（僅限 Linux，讀取 /proc/<pid>/smaps_rollup）。
+
+- RSS: process 看得到的實體記憶體，共用分頁會在每個 process 重複計算
+- PSS: 共用分頁依共用的 process 數平分後的用量，所有 process 的 PSS 加總才是真正佔用的記憶體
+- Shared / Private: 仍與其他 process 共用的分頁，以及已被 copy-on-write 複製出來的分頁
+
+執行方式（在專案根目錄，先用 gunicorn -c gunicorn.conf.py wsgi:app 啟動）：
+    python -m benchmarks.bench_worker_memory --master <gunicorn master pid>
+"""
+import argparse
+import os
+
+FIELDS = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+          'Private_Clean': 'private', 'Private_Dirty': 'private'}
+
+
+def read_smaps_rollup(pid):
+    usage = {'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in FIELDS:
+                usage[FIELDS[key]] += int(value.split()[0])  # kB
+    return usage
+
+
+def child_pids(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory report for a preloaded gunicorn server")
+    parser.add_argument('--master', type=int, required=True, help="gunicorn master process 的 pid")
+    args = parser.parse_args()
+
+    pids = [('master', args.master)] + [('worker', pid) for pid in child_pids(args.master)]
+    print(f"{'role':<8}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'Shared MB':>11}{'Private MB':>12}")
+    total_pss = 0
+    for role, pid in pids:
+        usage = read_smaps_rollup(pid)
+        total_pss += usage['pss']
+        print(f"{role:<8}{pid:>8}{usage['rss'] / 1024:>10.0f}{usage['pss'] / 1024:>10.0f}"
+              f"{usage['shared'] / 1024:>11.0f}{usage['private'] / 1024:>12.0f}")
+    print(f"Total PSS: {total_pss / 1024:.0f} MB for {len(pids) - 1} workers")
+
+
+if __name__ == "__main__":
+    main()
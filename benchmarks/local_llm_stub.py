@@ -0,0 +1,120 @@
+"""
+模擬本地 LLM 的 HTTP server，在沒有 GPU / 還沒下載模型時測試 LLM_BACKEND=ollama 或 llamacpp 的整條流程。
+
+同時提供：
+- Ollama: POST /api/chat、POST /api/generate（NDJSON 串流）
+- llama.cpp / OpenAI 相容: POST /v1/chat/completions、POST /v1/completions（SSE 串流）
+
+回覆固定為 ReAct 格式的答案，逐字送出，每個字間隔 --token-delay 秒，第一個字前等待 --first-token-delay 秒。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.local_llm_stub --port 8080
+    LLM_BACKEND=llamacpp LLAMACPP_BASE_URL=http://127.0.0.1:8080/v1 python api_voice_input_for_unity_openai_tts.py
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = "Thought: 我可以不用任何工具回答。\nAnswer: 你好!我是你的 AI 導覽員，這是本地測試用的回答 peko！"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    first_token_delay = 0.2
+    token_delay = 0.02
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        stream = body.get('stream', self.path.startswith('/api/'))
+        model = body.get('model', 'stub')
+        chat = self.path.endswith('/chat') or self.path.endswith('/chat/completions')
+
+        if self.path.startswith('/api/'):
+            self._ollama(model, chat, stream)
+        elif self.path.startswith('/v1/'):
+            self._openai(model, chat, stream)
+        else:
+            self.send_error(404)
+
+    def _tokens(self):
+        time.sleep(self.first_token_delay)
+        for index, char in enumerate(ANSWER):
+            if index:
+                time.sleep(self.token_delay)
+            yield char
+
+    def _ollama(self, model, chat, stream):
+        def chunk(text, done):
+            payload = {'model': model, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ'), 'done': done}
+            if chat:
+                payload['message'] = {'role': 'assistant', 'content': text}
+            else:
+                payload['response'] = text
+            if done:
+                payload.update({'prompt_eval_count': 0, 'eval_count': len(ANSWER)})
+            return payload
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        if stream:
+            for token in self._tokens():
+                self.wfile.write((json.dumps(chunk(token, False), ensure_ascii=False) + "\n").encode())
+                self.wfile.flush()
+            self.wfile.write((json.dumps(chunk("", True)) + "\n").encode())
+        else:
+            text = "".join(self._tokens())
+            self.wfile.write(json.dumps(chunk(text, True), ensure_ascii=False).encode())
+
+    def _openai(self, model, chat, stream):
+        def choice(text, finish=None, delta=False):
+            if not chat:
+                return {'index': 0, 'text': text, 'finish_reason': finish}
+            key = 'delta' if delta else 'message'
+            return {'index': 0, key: {'role': 'assistant', 'content': text}, 'finish_reason': finish}
+
+        base = {'id': 'stub', 'object': 'chat.completion' if chat else 'text_completion',
+                'created': int(time.time()), 'model': model}
+        if stream:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for token in self._tokens():
+                event = dict(base, object='chat.completion.chunk' if chat else 'text_completion',
+                             choices=[choice(token, delta=True)])
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+                self.wfile.flush()
+            event = dict(base, choices=[choice("", 'stop', delta=True)])
+            self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode())
+        else:
+            text = "".join(self._tokens())
+            usage = {'prompt_tokens': 0, 'completion_tokens': len(ANSWER), 'total_tokens': len(ANSWER)}
+            payload = dict(base, choices=[choice(text, 'stop')], usage=usage)
+            data = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local LLM stand-in server (Ollama + OpenAI-compatible)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    StubHandler.first_token_delay = args.first_token_delay
+    StubHandler.token_delay = args.token_delay
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Local LLM stub listening on http://{args.host}:{args.port} (Ollama /api/*, OpenAI /v1/*)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
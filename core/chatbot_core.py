@@ -1,5 +1,6 @@
 import os
 import json
+import threading
 import requests
 from bs4 import BeautifulSoup
 import warnings
@@ -24,6 +25,14 @@ from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.core.tools import FunctionTool
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.memory import ChatSummaryMemoryBuffer
+
+from utils.AgentTraceHandler import AgentTraceHandler
+from utils.LLMUsageHandler import LLMUsageHandler
+from utils.HedgedLLM import HedgedLLM
+from utils.ScheduledEmbedding import ScheduledEmbedding
+from utils.Hedging import LatencyTracker
 
 # load .env file
 load_dotenv()
@@ -38,15 +47,22 @@ warnings.filterwarnings("ignore", category=InsecureRequestWarning)
 """
 -------- Agent 可以使用的工具 --------
 """
+def truncate_observation(text, max_chars):
+    """工具回傳的內容只保留前 max_chars 個字，避免整頁網頁塞進 ReAct 的每一步 prompt"""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"...（以下省略 {len(text) - max_chars} 字）"
+
 def web_search(keyword: str) -> str:
     """根據給定的關鍵字進行網頁搜尋並返回搜尋結果的主要文字內容。(keyword 只能輸入中文)"""
     urls = get_search_url(keyword=keyword)
     print(urls)
+    page_max_chars = int(os.getenv("WEB_SEARCH_PAGE_MAX_CHARS", 1500))
     result = f'[根據以下文章內容，使用"**繁體中文**"整理有關於"{keyword}"的部分]:\n'
     for i, url in enumerate(urls):
         if not url.lower().endswith('.pdf'):
             result += f'文章{i+1}:\n"""'
-            result += crawl_webpage(url) + '"""\n'
+            result += truncate_observation(crawl_webpage(url), page_max_chars) + '"""\n'
     print(len(result))
     return result
 
@@ -88,8 +104,268 @@ def crawl_webpage(url):
 -------- [END] Agent 可以使用的工具 --------
 """
 
+"""
+-------- 整個 process 共用的模型與索引 --------
+embedding 模型、向量索引、查詢工具與 LLM client 只在第一次建立 ChatBot 時載入，之後每個 session 建立自己的 ChatBot
+（agent 與對話紀錄）或重置 agent 都不會重新載入；
+以 gunicorn --preload 啟動時，這些權重與索引在 fork 前載入，所有 worker 共用同一份記憶體（copy-on-write）。
+"""
+_shared_lock = threading.Lock()
+_shared_embed_model = None
+_shared_embed_scheduler = None
+_shared_indexes = {}
+_shared_chat_llm = None
+_shared_tools_lock = threading.Lock()
+_shared_query_tools = None
+# agent 每一步、tool call、LLM 呼叫的耗時與 token 用量記錄到目前請求的 trace（Server-Timing、/metrics）
+_shared_callback_manager = CallbackManager([AgentTraceHandler(), LLMUsageHandler()])
+
+def get_shared_chat_llm():
+    # 所有 ChatBot（agent、對話摘要、查詢工具）共用同一組 LLM client，本地 backend 也只登記一次 warm-up
+    global _shared_chat_llm
+    with _shared_lock:
+        if _shared_chat_llm is None:
+            _shared_chat_llm = build_chat_llm()
+        return _shared_chat_llm
+
+def use_embedding_scheduler(scheduler):
+    """
+    共用的 embedding 模型改在 scheduler 的工作池中推論（見 ScheduledEmbedding），與降噪、Whisper 一起排程。
+    要在第一次 get_shared_embed_model() 之前呼叫（VoicePipeline 建立時），向量索引載入時就會用到 embedding 模型。
+    """
+    global _shared_embed_scheduler
+    with _shared_lock:
+        if _shared_embed_model is not None and _shared_embed_scheduler is not scheduler:
+            print("Embedding model already loaded, scheduler not applied")
+            return
+        _shared_embed_scheduler = scheduler
+
+def get_shared_embed_model():
+    global _shared_embed_model
+    with _shared_lock:
+        if _shared_embed_model is None:
+            _shared_embed_model = HuggingFaceEmbedding(model_name="intfloat/multilingual-e5-large-instruct")
+            if _shared_embed_scheduler is not None:
+                _shared_embed_model = ScheduledEmbedding(_shared_embed_model, _shared_embed_scheduler)
+        return _shared_embed_model
+
+def load_shared_index(persist_dir, input_files):
+    with _shared_lock:
+        if persist_dir not in _shared_indexes:
+            if os.path.exists(persist_dir):
+                storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+                _shared_indexes[persist_dir] = load_index_from_storage(storage_context)
+                print(f"Index loaded! ({persist_dir})")
+            else:
+                print(f'storage {persist_dir} does not exist!')
+                docs = SimpleDirectoryReader(input_files=input_files).load_data()
+                index = VectorStoreIndex.from_documents(docs)
+                index.storage_context.persist(persist_dir=persist_dir)
+                _shared_indexes[persist_dir] = index
+        return _shared_indexes[persist_dir]
+
+def build_llm(backend=None, model=None, callback_manager=None):
+    """
+    依 LLM_BACKEND 建立 LLM（可離線在展場執行）：
+    - "openai": 預設，gpt-4o-mini（LLM_MODEL 可覆寫）
+    - "ollama": 本機 Ollama（OLLAMA_BASE_URL），OLLAMA_KEEP_ALIVE 預設 -1 讓模型常駐記憶體；
+      同時請求的批次處理由 Ollama 的 OLLAMA_NUM_PARALLEL 決定
+    - "llamacpp": llama.cpp server 等 OpenAI 相容的 HTTP 端點（LLAMACPP_BASE_URL），
+      以 --parallel / --cont-batching 啟動即可合併同時進來的請求
+
+    本地模型的 context window 由 LLM_CONTEXT_WINDOW 設定（預設 8192），完整版 system prompt 約需 6k tokens。
+    model 有指定時覆寫 LLM_MODEL（LLM_CHAIN 中每個 backend 使用不同模型時用到）。
+    """
+    backend = backend or os.getenv("LLM_BACKEND", "openai")
+    timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", 60))
+    context_window = int(os.getenv("LLM_CONTEXT_WINDOW", 8192))
+    callback_manager = callback_manager or _shared_callback_manager
+
+    if backend == "openai":
+        return OpenAI(model=model or os.getenv("LLM_MODEL", "gpt-4o-mini-2024-07-18"), stream=True,
+                      request_timeout=timeout, callback_manager=callback_manager)
+    if backend == "ollama":
+        keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+        return Ollama(
+            model=model or os.getenv("LLM_MODEL", "llama3.2:3b-instruct-fp16"),
+            base_url=os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434"),
+            request_timeout=timeout,
+            context_window=context_window,
+            keep_alive=int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive,
+            additional_kwargs={"num_ctx": context_window},
+            callback_manager=callback_manager
+        )
+    if backend == "llamacpp":
+        from llama_index.llms.openai_like import OpenAILike
+        return OpenAILike(
+            model=model or os.getenv("LLM_MODEL", "local-model"),
+            api_base=os.getenv("LLAMACPP_BASE_URL", "http://127.0.0.1:8080/v1"),
+            api_key=os.getenv("LLAMACPP_API_KEY", "no-key"),
+            is_chat_model=True,
+            context_window=context_window,
+            timeout=timeout,
+            callback_manager=callback_manager
+        )
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+# 各 backend 的延遲統計跨 ChatBot 共用，hedge 的等待時間才會越來越準
+_shared_latency_tracker = LatencyTracker(
+    percentile_q=float(os.getenv("LLM_HEDGE_PERCENTILE", 95)),
+    min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", 1.0)),
+    default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 8.0))
+)
+
+def build_chat_llm():
+    """
+    LLM_CHAIN 設定多個 backend（以逗號分隔的 backend:model，例如 "openai:gpt-4o-mini-2024-07-18,ollama:llama3.2:3b-instruct-fp16"）時，
+    回傳 HedgedLLM：前一個 backend 超過 p95 延遲或出錯就改問下一個；未設定時與 build_llm() 相同。
+    本地 backend 記在 _local_llms，由 warm_up_local_llms() 在實際處理請求的 process 內 warm-up。
+    """
+    chain = [entry.strip() for entry in os.getenv("LLM_CHAIN", "").split(",") if entry.strip()]
+    if not chain:
+        chain = [os.getenv("LLM_BACKEND", "openai")]
+    backends = []
+    for entry in chain:
+        backend, _, model = entry.partition(":")
+        llm = build_llm(backend, model or None)
+        if backend != "openai":
+            _local_llms.append(llm)
+        backends.append((entry, llm))
+    if len(backends) == 1:
+        return backends[0][1]
+    return HedgedLLM(backends, tracker=_shared_latency_tracker, callback_manager=_shared_callback_manager)
+
+_local_llms = []
+_warmed_llms = set()
+
+def warm_up_local_llms():
+    """
+    warm-up 所有本地 backend。warm-up 會建立 HTTP 連線，gunicorn preload 時要在 fork 之後由各 worker 呼叫，
+    否則 worker 會共用 master 留下的 keep-alive 連線。
+    """
+    for llm in list(_local_llms):
+        warm_up_llm(llm)
+
+def warm_up_llm(llm):
+    """
+    本地模型第一次呼叫要先把權重載入 GPU/記憶體，啟動時先送一個很短的請求，避免第一位參觀者等待。
+    同一個 process 每個 backend 只做一次。
+    """
+    key = (type(llm).__name__, llm.metadata.model_name)
+    with _shared_lock:
+        if key in _warmed_llms:
+            return
+        _warmed_llms.add(key)
+    try:
+        llm.complete("你好")
+        print(f"LLM warmed up: {key}")
+    except Exception as e:
+        print(f"LLM warm-up failed: {e}")
+
+def get_shared_query_tools():
+    """
+    向量索引的 CitationQueryEngine 工具（博物館文物、台灣原住民），整個 process 只建立一次，所有 ChatBot 的 agent 共用。
+    索引無法載入或建立時丟出 Exception。
+    """
+    global _shared_query_tools
+    with _shared_tools_lock:
+        if _shared_query_tools is None:
+            _shared_query_tools = build_query_tools()
+        return _shared_query_tools
+
+def build_query_tools():
+    path = "./storage/taiwanese"
+    # nttu_path = "./storage/nttu"
+    museum_path = "./storage/museum"
+
+    try:
+        tw_index = load_shared_index(path, ["./pdfs/原住民資料.pdf", "./pdfs/原住民資料2.pdf"])
+
+        # nttu_index = load_shared_index(nttu_path, ["./pdfs/台東大學介紹.pdf"])
+
+        museuem_index = load_shared_index(museum_path, ["./pdfs/博物館物品.pdf"])
+
+        index_loaded = True
+    except Exception as e:
+        print(f"Index not loaded! {e}")
+        index_loaded = False
+
+    if index_loaded:
+        tw_citation_engine = CitationQueryEngine.from_args(
+            tw_index, similarity_top_k=3, citation_chunk_size=512)
+
+        # nttu_citation_engine = CitationQueryEngine.from_args(
+        #     nttu_index, similarity_top_k=3, citation_chunk_size=512)
+
+        museum_citation_engine = CitationQueryEngine.from_args(
+            museuem_index, similarity_top_k=4, citation_chunk_size=1024)
+
+        # Load custom prompts for citation engine
+        with open("core/promp_configs/query_engine_prompt_CN.json", "r", encoding="utf-8") as file:
+            prompts_dict = json.load(file)
+        custom_qa_prompt_str = prompts_dict.get("response_synthesizer:text_qa_template")['PromptTemplate']['template']
+        custom_refine_prompt_str = prompts_dict.get("response_synthesizer:refine_template")['PromptTemplate']['template']
+        tw_citation_engine.update_prompts(
+            {
+                "response_synthesizer:text_qa_template": PromptTemplate(custom_qa_prompt_str),
+                "response_synthesizer:refine_template": PromptTemplate(custom_refine_prompt_str)
+            }
+        )
+
+        citation_tool = QueryEngineTool(
+            query_engine=tw_citation_engine,
+            metadata=ToolMetadata(
+                name="Taiwanese_indigenous",
+                description="用於幫助回答有關台灣原住民的問題，遇到**原住民**、**部落**或者**XX族**相關問題一律要使用此工具。例如:台灣原住民有幾族?, 介紹'XX族', 任何有關於'原住民'、'XX族'、'族群'或者是'部落'的問題"
+            )
+        )
+
+        # nttu_citation_tool = QueryEngineTool(
+        #     query_engine=nttu_citation_engine,
+        #     metadata=ToolMetadata(
+        #         name="NTTU_tool",
+        #         description="用於回答有關'台東大學', '東大','nttu'的問題。"
+        #     )
+        # )
+
+        museum_citation_tool = QueryEngineTool(
+            query_engine=museum_citation_engine,
+            metadata=ToolMetadata(
+                name="Museum_tool",
+                description="用於回答有關'博物館'文物問題。例如:'編號AT003217-001是甚麼物品?','介紹人形木雕板...任何有關於'博物館'的問題"
+            )
+        )
+
+        return [museum_citation_tool, citation_tool]
+    else:
+        raise Exception("Unable to load or create index. Check the configuration and data files.")
+
+"""
+-------- [END] 整個 process 共用的模型與索引 --------
+"""
+
+# 對話紀錄超過 token 上限時，較舊的對話由 LLM 摘要成一段文字，最近的對話保留原文
+CHAT_SUMMARY_PROMPT = (
+    "請用繁體中文把以下導覽員與參觀民眾的對話摘要成幾句話，"
+    "保留民眾關心的族群、部落、文物編號與還沒回答完的問題，省略寒暄與工具的原始輸出。"
+)
+
+# ReAct system prompt：靜態說明在前、工具清單在最後，整段在每一步、每次重置都逐字相同，
+# 讓 OpenAI 的 prompt caching 可以重用這段前綴（超過 1024 tokens 才會被快取）
+REACT_SYSTEM_HEADERS = {
+    "full": "core/promp_configs/react_system_header_str_CN.txt",
+    "compact": "core/promp_configs/react_system_header_compact_CN.txt",
+}
+
 class ChatBot:
-    def __init__(self):
+    def __init__(self, system_header=None):
+        """
+        system_header（未指定時讀取 .env 的 REACT_SYSTEM_HEADER，預設 full）：
+        - "full": 完整的 system prompt（約 9 KB）
+        - "compact": 精簡版，token 較少，但短於快取門檻時不會被快取
+        - 其他值視為 prompt 檔案路徑
+        """
+        self.system_header = system_header or os.getenv("REACT_SYSTEM_HEADER", "full")
         self.setup_settings()
         # self.load_dotenv_file() # TODO: 如果沒有影響就刪掉他
         self.prepare_environment()
@@ -97,12 +373,14 @@ class ChatBot:
         self.response = None
 
     def setup_settings(self):
-        Settings.embed_model = HuggingFaceEmbedding(model_name="intfloat/multilingual-e5-large-instruct")
+        Settings.callback_manager = _shared_callback_manager
+        Settings.embed_model = get_shared_embed_model()
         # Settings.embed_model = OpenAIEmbedding(embed_batch_size=10)
 
         # Settings.llm = Ollama(model="llama3.2:3b-instruct-fp16", request_timeout=60.0)
         # Settings.llm = Ollama(model="llama3.2:1b", request_timeout=60.0)
-        Settings.llm = OpenAI(model="gpt-4o-mini-2024-07-18", stream=True, request_timeout=60.0)
+        # Settings.llm = OpenAI(model="gpt-4o-mini-2024-07-18", stream=True, request_timeout=60.0)
+        Settings.llm = get_shared_chat_llm()
         # Settings.llm = Ollama(model="llama3:instruct", request_timeout=60.0)
         # Settings.llm = OpenAI(model="gpt-3.5-turbo-instruct")
         # Settings.llm = Ollama(model="cwchang/llama3-taide-lx-8b-chat-alpha1", request_timeout=60.0)
@@ -126,118 +404,40 @@ class ChatBot:
             print(f"'{storage_path}' 資料夾不存在")
 
     def configure_agent(self):
-        path = "./storage/taiwanese"
-        if not os.path.exists(path):
-            print('storage does not exist!')
-            # os.makedirs(path)
-            tw_docs = SimpleDirectoryReader(
-                input_files=["./pdfs/原住民資料.pdf", "./pdfs/原住民資料2.pdf"]
-            ).load_data()
-
-        # nttu_path = "./storage/nttu"
-        # if not os.path.exists(nttu_path):
-        #     nttu_docs = SimpleDirectoryReader(
-        #         input_files=["./pdfs/台東大學介紹.pdf"]
-        #     ).load_data()
-
-        museum_path = "./storage/museum"
-        if not os.path.exists(museum_path):
-            print(f'storage {museum_path} does not exist!')
-            museum_docs = SimpleDirectoryReader(
-                input_files=["./pdfs/博物館物品.pdf"]
-            ).load_data()
-
-        try:
-            storage_context = StorageContext.from_defaults(persist_dir=path)
-            tw_index = load_index_from_storage(storage_context)
-
-            # nttu_storage_context = StorageContext.from_defaults(persist_dir=nttu_path)
-            # nttu_index = load_index_from_storage(nttu_storage_context)
-
-            museum_storage_context = StorageContext.from_defaults(persist_dir=museum_path)
-            museuem_index = load_index_from_storage(museum_storage_context)
-
-            index_loaded = True
-            print("Index loaded!")
-        except:
-            index_loaded = False
-            print("Index not loaded!")
-            if tw_docs:
-                tw_index = VectorStoreIndex.from_documents(tw_docs)
-                tw_index.storage_context.persist(persist_dir=path)
-                index_loaded = True
-
-            # if nttu_docs:
-            #     nttu_index = VectorStoreIndex.from_documents(nttu_docs)
-            #     nttu_index.storage_context.persist(persist_dir=nttu_path)
-            #     index_loaded = True
-
-            if museum_docs:
-                museuem_index = VectorStoreIndex.from_documents(museum_docs)
-                museuem_index.storage_context.persist(persist_dir=museum_path)
-                index_loaded = True
-
-        if index_loaded:
-            tw_citation_engine = CitationQueryEngine.from_args(
-                tw_index, similarity_top_k=3, citation_chunk_size=512)
-            
-            # nttu_citation_engine = CitationQueryEngine.from_args(
-            #     nttu_index, similarity_top_k=3, citation_chunk_size=512)
-
-            museum_citation_engine = CitationQueryEngine.from_args(
-                museuem_index, similarity_top_k=4, citation_chunk_size=1024)
-
-            # Load custom prompts for citation engine
-            with open("core/promp_configs/query_engine_prompt_CN.json", "r", encoding="utf-8") as file:
-                prompts_dict = json.load(file)
-            custom_qa_prompt_str = prompts_dict.get("response_synthesizer:text_qa_template")['PromptTemplate']['template']
-            custom_refine_prompt_str = prompts_dict.get("response_synthesizer:refine_template")['PromptTemplate']['template']
-            tw_citation_engine.update_prompts(
-                {
-                    "response_synthesizer:text_qa_template": PromptTemplate(custom_qa_prompt_str),
-                    "response_synthesizer:refine_template": PromptTemplate(custom_refine_prompt_str)
-                }
-            )
-
-            citation_tool = QueryEngineTool(
-                query_engine=tw_citation_engine,
-                metadata=ToolMetadata(
-                    name="Taiwanese_indigenous",
-                    description="用於幫助回答有關台灣原住民的問題，遇到**原住民**、**部落**或者**XX族**相關問題一律要使用此工具。例如:台灣原住民有幾族?, 介紹'XX族', 任何有關於'原住民'、'XX族'、'族群'或者是'部落'的問題"
-                )
-            )
-
-            # nttu_citation_tool = QueryEngineTool(
-            #     query_engine=nttu_citation_engine,
-            #     metadata=ToolMetadata(
-            #         name="NTTU_tool",
-            #         description="用於回答有關'台東大學', '東大','nttu'的問題。"
-            #     )
-            # )
-
-            museum_citation_tool = QueryEngineTool(
-                query_engine=museum_citation_engine,
-                metadata=ToolMetadata(
-                    name="Museum_tool",
-                    description="用於回答有關'博物館'文物問題。例如:'編號AT003217-001是甚麼物品?','介紹人形木雕板...任何有關於'博物館'的問題"
-                )
-            )
-
-            show_RAG_sources_tool = FunctionTool.from_defaults(fn=self.show_RAG_sources)
-
-            # tools = [nttu_citation_tool, citation_tool, show_RAG_sources_tool, web_search_tool]
-            tools = [museum_citation_tool, citation_tool, show_RAG_sources_tool, web_search_tool]
-            agent = ReActAgent.from_tools(tools=tools, verbose=True, embed_model="local")
+        # 索引與查詢工具所有 ChatBot 共用（見 get_shared_query_tools），這裡只建立這個 ChatBot 自己的 agent 與對話紀錄
+        museum_citation_tool, citation_tool = get_shared_query_tools()
+        # show_RAG_sources 讀取這個 ChatBot 的 self.response，每個 ChatBot 各自建立
+        show_RAG_sources_tool = FunctionTool.from_defaults(fn=self.show_RAG_sources)
+
+        # tools = [nttu_citation_tool, citation_tool, show_RAG_sources_tool, web_search_tool]
+        tools = [museum_citation_tool, citation_tool, show_RAG_sources_tool, web_search_tool]
+        agent = ReActAgent.from_tools(tools=tools, verbose=True, embed_model="local",
+                                      memory=self.build_memory(),
+                                      callback_manager=Settings.callback_manager)
+
+        # Load system prompts from file
+        header_path = REACT_SYSTEM_HEADERS.get(self.system_header, self.system_header)
+        react_system_header_str = self.load_string_from_file(header_path)
+        if react_system_header_str:
+            react_system_prompt = PromptTemplate(react_system_header_str)
+            agent.update_prompts({"agent_worker:system_prompt": react_system_prompt})
+            print("System prompt updated successfully!")
+        return agent
+
+    def build_memory(self):
+        """
+        有 token 上限（CHAT_MEMORY_TOKEN_LIMIT）的對話紀錄：超過上限時把較舊的對話摘要，
+        取代以前每問答幾句就整個重建 agent 的做法，長時間導覽也能保持 prompt 大小穩定又不失去前後文。
+        """
+        return ChatSummaryMemoryBuffer.from_defaults(
+            llm=get_shared_chat_llm(),
+            token_limit=int(os.getenv("CHAT_MEMORY_TOKEN_LIMIT", 1500)),
+            summarize_prompt=CHAT_SUMMARY_PROMPT
+        )
 
-            # Load system prompts from file
-            react_system_header_str = self.load_string_from_file('core/promp_configs/react_system_header_str_CN.txt')
-            if react_system_header_str:
-                react_system_prompt = PromptTemplate(react_system_header_str)
-                agent.update_prompts({"agent_worker:system_prompt": react_system_prompt})
-                print("System prompt updated successfully!")
-            return agent
-        else:
-            raise Exception("Unable to load or create index. Check the configuration and data files.")
+    def reset_memory(self):
+        # 清空對話紀錄，不需要重建 agent
+        self.agent.memory.reset()
 
     def load_string_from_file(self, file_path):
         try:
@@ -282,7 +482,7 @@ if __name__ == "__main__":
         if user_input.lower() == "exit":
             break
         elif user_input.lower() == "reset":
-            bot = ChatBot()
+            bot.reset_memory()
             print("Chatbot has been reset.")
         else:
             # Streaming response
@@ -0,0 +1,361 @@
+"""
+語音導覽的共用處理流程：降噪 → Whisper 辨識 → ChatBot → TTS。
+
+api_server.py 建立的所有部署（Unity、網頁、專題展）都透過同一個 VoicePipeline 處理請求，
+模型只載入一次，各階段的優化與 trace 也只需要寫在這裡。
+"""
+import contextlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import openai
+import requests
+
+from core.chatbot_core import ChatBot, get_shared_embed_model, use_embedding_scheduler, warm_up_local_llms
+from utils.AudioEncoder import EncodingConfig, encode_audio
+from utils.AudioRuntime import AudioBackendError, decode_audio
+from utils.AudioStore import AudioStore
+from utils.BatchTranscriber import BatchTranscriber
+from utils.Denoiser import Denoiser
+from utils.InferenceScheduler import InferenceScheduler, VOICE
+from utils.RequestTracer import record_span, trace_span
+from utils.ScratchStorage import ScratchStorage
+from utils.StartupManager import StartupManager
+from utils.VoiceActivityDetector import VoiceActivityDetector
+from utils.WhisperTranscriber import WhisperTranscriber
+
+SAMPLE_RATE = 16000
+
+ACTION_PATTERN = re.compile(r'<action>(\d+)</action>')
+
+def parse_custom_tag(response):
+    """
+    取出回答中的第一個 <action>N</action>，沒有則為 -1。
+    """
+    match = ACTION_PATTERN.search(response)
+    return {"action": int(match.group(1)) if match else -1}
+
+class TTSError(Exception):
+    pass
+
+class InvalidAudioError(ValueError):
+    """
+    上傳的音檔無法解碼（檔頭正確但內容損毀、被截斷）或沒有任何 sample，API 回傳 400。
+    """
+    pass
+
+class ChatSession:
+    def __init__(self):
+        self.chat_agent = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+class ChatAgentManager:
+    """
+    每個 session（請求的 X-Session-ID，例如一台導覽機）有自己的 ChatBot 與對話紀錄；
+    LLM、查詢工具與向量索引整個 process 共用（見 chatbot_core 的 get_shared_*），建立一個 ChatBot 只需要建立 agent。
+
+    - 沒有 session id 的請求每次使用新的 ChatBot，不帶任何前文
+    - session 閒置超過 idle_seconds（CHAT_SESSION_IDLE_SECONDS）就丟掉，下一位參觀者不會接到前一位的對話；
+      最多保留 max_sessions（CHAT_MAX_SESSIONS）個，超過時丟掉最久沒用的
+    - 同一個 session 同時只有一個請求使用 agent（串流回答到串流結束），不同 session 與沒有 session id 的請求互不等待
+    """
+    def __init__(self, factory=ChatBot, max_sessions=None, idle_seconds=None):
+        self.factory = factory
+        self.max_sessions = max_sessions or int(os.getenv("CHAT_MAX_SESSIONS", 32))
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(os.getenv("CHAT_SESSION_IDLE_SECONDS", 600))
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger('ChatAgentManager')
+        # 啟動時先建立一次，載入共用的 LLM、查詢工具與索引，設定錯誤在啟動時就會發現
+        self.factory()
+
+    @contextlib.contextmanager
+    def using_agent(self, session_id=None):
+        if session_id is None:
+            yield self.factory()
+            return
+        session = self._session(session_id)
+        with session.lock:
+            # agent 的對話紀錄有 token 上限並會自動摘要（見 ChatBot.build_memory），不再每問答幾句就重建
+            if session.chat_agent is None:
+                session.chat_agent = self.factory()
+            try:
+                yield session.chat_agent
+            finally:
+                session.last_used = time.monotonic()
+
+    def _session(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            for expired_id, session in list(self._sessions.items()):
+                if now - session.last_used > self.idle_seconds and not session.lock.locked():
+                    del self._sessions[expired_id]
+                    self._logger.info(f"Chat session {expired_id} expired")
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ChatSession()
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self._logger.info(f"Chat session {evicted_id} evicted")
+            return session
+
+    def reset_agent(self, session_id):
+        # 丟掉這個 session 的 ChatBot，下一個請求以空白的對話紀錄重新開始；模型、索引與工具都沿用
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        self._logger.info(f"\033[92m[成功] Chat session {session_id} 對話紀錄已清除！\033[0m")
+
+class VoicePipeline:
+    """
+    降噪 → STT → agent → TTS，每一步各自記錄 trace span。
+
+    - 降噪與檢索的 e5 embedding（ScheduledEmbedding）在 InferenceScheduler 的工作池中執行，排隊已滿時丟出 QueueFullError
+    - Whisper 推論直接送進 BatchTranscriber（以 scheduler.track 計入排隊上限），同時進來的請求會合併成一個 batch；
+      工作池的執行緒不會卡在等待辨識結果，batch 大小也不受工作池執行緒數限制
+    - 音訊全程在記憶體中處理：上傳只解碼一次，TTS 回傳 bytes，不再經過 uploads/、denoised/、output/ 暫存檔
+    - 回傳的語音可依 EncodingConfig 轉成 Opus / MP3 或降低取樣率（見 encode），並存進 audio_store 供重複下載
+
+    load() 分階段載入所有模型（見 build_startup），沒有先呼叫時各元件會在第一次用到時載入；
+    每個元件有自己的 lock，不論是啟動流程或請求先用到，都只會載入一次。
+    """
+    def __init__(self, scheduler=None, tts_url=None, tts_timeout=None, scratch=None, audio_store=None):
+        self.scheduler = scheduler or InferenceScheduler(
+            workers=int(os.getenv("INFERENCE_WORKERS", 2)),
+            max_queue=int(os.getenv("INFERENCE_MAX_QUEUE", 16))
+        )
+        # 檢索用的 e5 embedding 也交給工作池，與降噪一起排程，不會在請求執行緒上另外搶 torch 的執行緒
+        use_embedding_scheduler(self.scheduler)
+        # 本地 TTS（GPT-SoVITS api.py）
+        self.tts_url = tts_url or os.getenv("TTS_LOCAL_URL", "http://127.0.0.1:9880/")
+        self.tts_timeout = tts_timeout or float(os.getenv("TTS_TIMEOUT", 60))
+        # 重複使用 TCP 連線，不必每句話都重新連到 TTS server
+        self._tts_session = requests.Session()
+        # 暫存檔（請求資料夾、產生的語音）都放在 scratch 底下，由背景 janitor 依時間與容量清理
+        self.scratch = scratch or ScratchStorage.from_env()
+        # 產生的語音以內容雜湊存放，供 /audio/<audio_id> 下載
+        self.audio_store = audio_store or AudioStore(self.scratch.area('audio'))
+        self._components = {}
+        self._locks = {name: threading.Lock() for name in ('agent_manager', 'denoiser', 'transcriber')}
+        self._logger = logging.getLogger('VoicePipeline')
+        self.startup = self.build_startup()
+
+    def build_startup(self):
+        """
+        啟動流程（/readyz 顯示各元件的狀態與載入時間）：
+
+            embedding ──> chatbot（向量索引 + agent）──> llm（本地 LLM backend 的 warm-up）
+            denoiser（dns64）                          三條路徑同時載入
+            whisper
+            tts（不影響 ready：本地 TTS server 可能還沒啟動，或部署只用 OpenAI TTS）
+
+        warm-up 以一秒的合成雜訊跑過降噪與 Whisper、embedding 一句短句、TTS 一句話並轉成預設編碼，
+        讓第一位參觀者不必等 CUDA/MKL 初始化與 TTS server 冷啟動。TTS_WARMUP_SERVICE 設為空字串時略過 TTS。
+        llm 與 tts 會建立 HTTP 連線（network 元件），gunicorn preload 時在 fork 之後由各 worker 執行（見 after_fork）。
+        """
+        startup = StartupManager()
+        startup.add('embedding', get_shared_embed_model,
+                    warm_up=lambda: get_shared_embed_model().get_text_embedding("你好"))
+        startup.add('chatbot', lambda: self.agent_manager, after=('embedding',))
+        startup.add('denoiser', lambda: self.denoiser,
+                    warm_up=lambda: self.denoiser.denoise_array(self._warmup_audio(), SAMPLE_RATE))
+        startup.add('whisper', lambda: self.transcriber,
+                    warm_up=lambda: self.transcriber.transcribe(self._warmup_audio()))
+        startup.add('llm', warm_up=warm_up_local_llms, after=('chatbot',), required=False, network=True)
+        tts_service = os.getenv("TTS_WARMUP_SERVICE", "local")
+        if tts_service:
+            startup.add('tts', warm_up=lambda: self.encode(self.synthesize("你好", tts_service), EncodingConfig.from_env()),
+                        required=False, network=True)
+        return startup
+
+    def load(self, background=False, network=True):
+        """
+        分階段載入並 warm-up（STARTUP_WARMUP=0 時只載入），每個元件整個 process 只執行一次；回傳 self。
+        background=True 時在背景執行緒載入並立即回傳（開發用 server 可以先啟動，載入期間 /readyz 回傳 503）。
+        network=False 時只載入模型，需要連線的 warm-up 留給 after_fork()。
+        """
+        warm_up = os.getenv("STARTUP_WARMUP", "1") != "0"
+        if background:
+            self.startup.start(warm_up=warm_up, network=network)
+        else:
+            self.startup.run(warm_up=warm_up, network=network)
+        return self
+
+    def after_fork(self):
+        """
+        gunicorn worker 啟動後呼叫（gunicorn.conf.py 的 post_worker_init）：重新建立 TTS 的 requests.Session，
+        不與 master 或其他 worker 共用 keep-alive 連線，再在背景執行 network 元件的 warm-up，連線都屬於這個 worker。
+        """
+        self._tts_session = requests.Session()
+        return self.load(background=True)
+
+    def _component(self, name, factory):
+        with self._locks[name]:
+            if name not in self._components:
+                self._components[name] = factory()
+            return self._components[name]
+
+    @staticmethod
+    def _warmup_audio():
+        # 雜訊的 SNR 很低，不會被 Denoiser 的 SNR 門檻略過，確定會跑到模型
+        return np.random.default_rng(0).normal(0, 0.05, SAMPLE_RATE).astype(np.float32)
+
+    @property
+    def agent_manager(self):
+        return self._component('agent_manager', ChatAgentManager)
+
+    @property
+    def denoiser(self):
+        return self._component('denoiser', Denoiser)
+
+    @property
+    def transcriber(self):
+        return self._component('transcriber', lambda: BatchTranscriber(
+            WhisperTranscriber(),
+            max_batch_size=int(os.getenv("STT_BATCH_SIZE", 8)),
+            max_wait_ms=float(os.getenv("STT_BATCH_WAIT_MS", 20))
+        ))
+
+    def voice_models(self):
+        return self.denoiser, self.transcriber
+
+    def transcribe_upload(self, stream, denoise=True):
+        """
+        上傳的音檔在記憶體內解碼一次成 16kHz 單聲道 float32，之後降噪與辨識都直接使用這個陣列。
+        無法解碼時丟出 InvalidAudioError，此時還沒有用到任何模型。
+        只有 torchaudio 對損毀資料丟出的 RuntimeError / ValueError 算是音檔的問題；沒有可用的 backend（AudioBackendError）
+        或其他錯誤是伺服器的問題，照樣往上丟（API 回傳 500）。
+        """
+        with trace_span('decode'):
+            try:
+                audio = decode_audio(stream)
+            except AudioBackendError:
+                raise
+            except (RuntimeError, ValueError) as e:
+                raise InvalidAudioError(f"Unable to decode audio: {e}") from e
+        if not len(audio):
+            raise InvalidAudioError("Audio contains no samples")
+        self._logger.info(f"Decoded upload: {len(audio) / SAMPLE_RATE:.2f}s")
+        return self.transcribe(audio, denoise=denoise)
+
+    def transcribe(self, audio, denoise=True):
+        denoiser, transcriber = self.voice_models()
+        if denoise:
+            with trace_span('denoise'):
+                audio = self.scheduler.run('denoise', denoiser.denoise_array, audio, SAMPLE_RATE, priority=VOICE)
+        with trace_span('stt'):
+            transcription = self.scheduler.track('stt', transcriber.submit, audio).result()
+        self._logger.info(f"\033[94m [Whisper transcription] {transcription}\033[0m")
+        return transcription
+
+    def transcribe_stream(self, stream, sample_rate=SAMPLE_RATE, denoise=True, chunk_size=4096):
+        """
+        邊收音邊做語音活動偵測（VAD）、降噪與 Whisper 辨識，回傳合併後的辨識文字（沒有語音時為空字串）。
+
+        stream 為 16-bit little-endian 單聲道 PCM。16kHz 的音訊邊收邊用串流降噪（DemucsStreamer），
+        VAD 直接在降噪後的音訊上判斷；每偵測到一次停頓就先把前一段語音送去辨識，使用者還在說話時轉錄就已經在進行。
+        其他取樣率則在每段語音結束後才整段降噪。
+        """
+        vad = VoiceActivityDetector(sample_rate=sample_rate)
+        denoiser, transcriber = self.voice_models()
+        streamer = denoiser.streamer() if denoise and sample_rate == denoiser.model.sample_rate else None
+
+        def submit_segment(segment):
+            if denoise and streamer is None:
+                # 整段降噪在工作池中執行，完成後送進 BatchTranscriber 並回傳辨識的 Future，不在工作池裡等辨識
+                return self.scheduler.submit('denoise', lambda: self.scheduler.track(
+                    'stt', transcriber.submit, denoiser.denoise_array(segment, sample_rate)), priority=VOICE)
+            return self.scheduler.track('stt', transcriber.submit, segment)
+
+        def segment_text(future):
+            result = future.result()
+            return (result.result() if isinstance(result, Future) else result).strip()
+
+        futures = []
+        leftover = b''
+        # 收音期間的串流降噪、VAD 都算在 upload，辨識在 BatchTranscriber 中與收音重疊進行
+        upload_start = time.perf_counter()
+        while not vad.end_of_utterance:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            chunk = leftover + chunk
+            usable = len(chunk) - len(chunk) % 2
+            leftover = chunk[usable:]
+            samples = np.frombuffer(chunk[:usable], dtype='<i2').astype(np.float32) / 32768.0
+            if streamer is not None:
+                samples = streamer.feed(samples)
+            for segment in vad.feed(samples):
+                self._logger.info(f"Speech segment {len(segment) / sample_rate:.2f}s queued for transcription")
+                futures.append(submit_segment(segment))
+
+        segments = vad.feed(streamer.flush()) if streamer is not None else []
+        segment = vad.flush()
+        if segment is not None:
+            segments.append(segment)
+        for segment in segments:
+            futures.append(submit_segment(segment))
+        record_span('upload', time.perf_counter() - upload_start)
+
+        if not futures:
+            return ""
+        # 收音結束後還需要等辨識多久
+        with trace_span('stt_wait'):
+            transcription = "".join(segment_text(future) for future in futures)
+        self._logger.info(f"\033[94m [Whisper transcription] {transcription}\033[0m")
+        return transcription
+
+    def ask(self, text, session_id=None):
+        """
+        交給 ChatBot 回答，回傳 (回應文字, action)。session_id 相同的請求共用對話紀錄（見 ChatAgentManager）。
+        """
+        with self.agent_manager.using_agent(session_id) as chat_agent, trace_span('agent'):
+            response = chat_agent.normal_chat(text)
+        response_text = response.response
+        self._logger.info(f"\033[94m [Bot response] {response_text}\033[0m")
+        action = parse_custom_tag(response_text)['action']
+        self._logger.info(f"Parsed action: {action}")
+        return response_text, action
+
+    def synthesize(self, text, tts_service="local"):
+        """
+        產生語音並回傳 wav 的 bytes。
+        tts_service: 可選 "local"（本地 GPT-SoVITS）或 "openai"，預設為 local
+        """
+        with trace_span('tts'):
+            try:
+                if tts_service == "openai":
+                    response = openai.audio.speech.create(model="tts-1", voice="nova", input=text, response_format="wav")
+                    audio = response.read()
+                else:
+                    # 文字以 params 傳遞，由 requests 做 URL 編碼（回答中的 &、#、? 不會截斷文字）
+                    response = self._tts_session.get(
+                        self.tts_url, params={"text": text, "text_language": "zh"}, timeout=self.tts_timeout)
+                    response.raise_for_status()
+                    audio = response.content
+            except (requests.exceptions.RequestException, openai.OpenAIError) as e:
+                raise TTSError(f"TTS failed ({tts_service}): {e}") from e
+        if not audio:
+            raise TTSError(f"TTS returned no audio ({tts_service})")
+        return audio
+
+    def encode(self, audio, config=None):
+        """
+        把 synthesize() 的 wav 依 EncodingConfig 轉成回傳用的格式，回傳 EncodedAudio。
+        編碼器無法使用（例如 libav 沒有編進 libopus）時退回 wav，回應的 mimetype 會跟著改變。
+        """
+        config = config or EncodingConfig()
+        with trace_span('transcode'):
+            try:
+                return encode_audio(audio, config)
+            except Exception as e:
+                self._logger.warning(f"Encoding to {config.codec} failed, falling back to wav: {e}")
+                return encode_audio(audio, EncodingConfig())
@@ -0,0 +1,40 @@
+"""
+gunicorn 設定：preload_app 讓模型在 fork 前只載入一次，所有 worker 共用同一份唯讀權重。
+
+可由 .env / 環境變數調整：
+- BIND: 監聽位址，預設 0.0.0.0:443
+- WEB_WORKERS: worker process 數，預設 2
+- WEB_THREADS: 每個 worker 的執行緒數，預設 4（語音請求大多在等 Whisper / OpenAI，用執行緒併發即可）
+- WEB_TIMEOUT: 單一請求逾時秒數，預設 120
+- WEB_PRELOAD: 是否在 master 載入模型後再 fork（1 / 0 / auto），預設 auto：
+  有 GPU 時關閉，因為 CUDA 在 fork 前初始化後，worker 就無法再使用 CUDA；關閉時每個 worker 匯入 wsgi.py 時各自載入
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("BIND", "0.0.0.0:443")
+workers = int(os.getenv("WEB_WORKERS", 2))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 4))
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+preload = os.getenv("WEB_PRELOAD", "auto")
+if preload == "auto":
+    from utils.AudioRuntime import cuda_available
+    preload_app = not cuda_available()
+else:
+    preload_app = preload == "1"
+
+def post_fork(server, worker):
+    # 多個 worker 分享 CPU，依 worker 數重新分配 PyTorch 執行緒（TORCH_NUM_THREADS 有設定時以它為準）
+    from utils.AudioRuntime import configure_threads
+    configure_threads(processes=workers, force=True)
+    server.log.info(f"Worker {worker.pid} forked")
+
+def post_worker_init(worker):
+    # 不與 master 共用 TTS / LLM 的 keep-alive 連線，需要連線的 warm-up 在每個 worker 內各自執行（見 VoicePipeline.after_fork）
+    from api_server import pipeline
+    pipeline.after_fork()
+    worker.log.info(f"Worker {worker.pid} ready, network warm-up running in background (see /readyz)")
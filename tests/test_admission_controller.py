@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from utils.AdmissionController import AdmissionController, OverloadedError
+
+
+def hold_slots(controller, count):
+    # 讓 count 個請求佔住處理中的名額，直到 release 被設定
+    release = threading.Event()
+    entered = threading.Barrier(count + 1)
+
+    def request():
+        with controller.admit():
+            entered.wait(5)
+            release.wait(5)
+
+    threads = [threading.Thread(target=request) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    entered.wait(5)
+    return release, threads
+
+
+def test_admits_below_limit_without_degrading():
+    controller = AdmissionController('test', max_concurrent=2)
+    with controller.admit() as degraded:
+        assert degraded is False
+        assert controller.in_flight == 1
+    assert controller.in_flight == 0
+
+
+def test_last_free_slot_is_not_degraded():
+    controller = AdmissionController('test', max_concurrent=2)
+    release, threads = hold_slots(controller, 1)
+    with controller.admit() as degraded:
+        assert degraded is False
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_single_slot_is_not_degraded_when_idle():
+    controller = AdmissionController('test', max_concurrent=1)
+    for _ in range(3):
+        with controller.admit() as degraded:
+            assert degraded is False
+    assert controller.degraded == 0
+
+
+def test_request_that_had_to_wait_is_degraded():
+    controller = AdmissionController('test', max_concurrent=1, max_waiting=1, wait_timeout=5)
+    release, threads = hold_slots(controller, 1)
+    threading.Timer(0.05, release.set).start()
+    with controller.admit() as degraded:
+        assert degraded is True
+    for thread in threads:
+        thread.join(5)
+
+
+def test_rejects_when_waiting_queue_is_full():
+    controller = AdmissionController('test', max_concurrent=1, max_waiting=0)
+    release, threads = hold_slots(controller, 1)
+    with pytest.raises(OverloadedError) as excinfo:
+        with controller.admit():
+            pass
+    assert excinfo.value.retry_after >= 1
+    assert controller.rejected == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_rejects_after_wait_timeout():
+    controller = AdmissionController('test', max_concurrent=1, max_waiting=1, wait_timeout=0.05)
+    release, threads = hold_slots(controller, 1)
+    with pytest.raises(OverloadedError):
+        with controller.admit():
+            pass
+    assert controller.waiting == 0
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_waiting_request_is_admitted_when_slot_frees():
+    controller = AdmissionController('test', max_concurrent=1, max_waiting=1, wait_timeout=5)
+    release, threads = hold_slots(controller, 1)
+    threading.Timer(0.05, release.set).start()
+    with controller.admit():
+        assert controller.in_flight == 1
+    for thread in threads:
+        thread.join(5)
@@ -0,0 +1,104 @@
+import io
+import os
+
+import numpy as np
+import pytest
+
+# 需要 flask、torch 與 llama_index；沒有安裝時略過。這些請求都在用到模型之前就被拒絕，不會載入模型。
+api_server = pytest.importorskip('api_server')
+from core import voice_pipeline
+from utils.AudioRuntime import AudioBackendError
+from utils.ScratchStorage import ScratchStorage
+
+BOUNDARY = 'upload-boundary'
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_server.pipeline, 'scratch', ScratchStorage(str(tmp_path)))
+    app = api_server.create_app(profile='json')
+    app.config['MAX_CONTENT_LENGTH'] = 4096
+    return app.test_client()
+
+
+def multipart(content, filename='recording.wav'):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: audio/wav\r\n\r\n').encode() + content + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def chunked_post(client, path, body, content_type):
+    # 沒有 Content-Length 的 chunked 上傳，大小只能在讀取途中檢查
+    return client.post(path, input_stream=io.BytesIO(body), content_type=content_type,
+                       headers={'Transfer-Encoding': 'chunked'}, environ_overrides={'wsgi.input_terminated': True})
+
+
+def test_oversized_upload_is_rejected(client):
+    response = client.post('/voice_chat', data={'file': (io.BytesIO(b'RIFF' + b'\0' * 8192), 'recording.wav')})
+    assert response.status_code == 413
+    assert 'too large' in response.json['error']
+
+
+def test_oversized_chunked_upload_is_rejected(client):
+    body = multipart(b'RIFF\x24\x00\x00\x00WAVE' + b'\0' * 8192)
+    response = chunked_post(client, '/voice_chat', body, f'multipart/form-data; boundary={BOUNDARY}')
+    assert response.status_code == 413
+
+
+def test_oversized_pcm_stream_is_rejected_before_reading(client):
+    response = client.post('/voice_chat_stream', data=b'\0' * 8192, content_type='application/octet-stream')
+    assert response.status_code == 413
+
+
+def test_non_audio_content_is_rejected_regardless_of_extension(client, tmp_path):
+    response = client.post('/voice_chat', data={'file': (io.BytesIO(b'<html>not audio</html>'), 'recording.wav')})
+    assert response.status_code == 400
+    assert response.json['error'] == 'Unsupported audio format'
+    # 請求結束後上傳檔與請求資料夾都已刪除
+    assert os.listdir(tmp_path / 'requests') == []
+
+
+def test_corrupt_audio_with_valid_header_is_rejected(client):
+    corrupt = b'RIFF\x24\x00\x00\x00WAVE' + b'this is not a fmt chunk' * 10
+    response = client.post('/voice_chat', data={'file': (io.BytesIO(corrupt), 'recording.wav')})
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid audio file'
+
+
+@pytest.mark.parametrize('sample_rate', ['0', '33', '-16000', 'abc', '96000'])
+def test_invalid_stream_sample_rate_is_rejected(client, sample_rate):
+    response = client.post(f'/voice_chat_stream?sample_rate={sample_rate}', data=b'\0' * 64,
+                           content_type='application/octet-stream')
+    assert response.status_code == 400
+    assert 'sample_rate' in response.json['error']
+
+
+def test_upload_is_decoded_from_its_file_in_the_request_dir(client, tmp_path, monkeypatch):
+    # torchaudio 的 sox backend 只能讀路徑，上傳檔要有真正的檔案路徑
+    paths = []
+
+    def decode(stream):
+        paths.append(stream.name)
+        return np.zeros(0, dtype=np.float32)
+
+    monkeypatch.setattr(voice_pipeline, 'decode_audio', decode)
+    wav = b'RIFF\x24\x00\x00\x00WAVEfmt ' + b'\0' * 32
+    response = client.post('/voice_chat', data={'file': (io.BytesIO(wav), 'recording.wav')})
+    assert response.status_code == 400
+    assert len(paths) == 1 and os.path.dirname(os.path.dirname(paths[0])) == str(tmp_path / 'requests')
+
+
+@pytest.mark.parametrize('error, status', [
+    (RuntimeError('Failed to open the input'), 400),
+    (ValueError('bad header'), 400),
+    (AudioBackendError('No suitable torchaudio backend found'), 500),
+    (OSError('libsox.so: cannot open shared object file'), 500),
+])
+def test_only_bad_audio_is_a_client_error(client, monkeypatch, error, status):
+    # 音檔損毀是 400；伺服器缺少 backend 或函式庫是 500，才會出現在 log 與 metrics
+    def decode(stream):
+        raise error
+
+    monkeypatch.setattr(voice_pipeline, 'decode_audio', decode)
+    wav = b'RIFF\x24\x00\x00\x00WAVEfmt ' + b'\0' * 32
+    response = client.post('/voice_chat', data={'file': (io.BytesIO(wav), 'recording.wav')})
+    assert response.status_code == status
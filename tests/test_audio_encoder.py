@@ -0,0 +1,39 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+# 需要 torch 與 torchaudio；沒有安裝時略過
+AudioEncoder = pytest.importorskip('utils.AudioEncoder')
+
+
+def tts_wav(sample_rate=24000, seconds=0.5):
+    samples = (np.sin(np.linspace(0, 440 * 2 * np.pi * seconds, int(sample_rate * seconds))) * 16000).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def test_wav_resample_does_not_use_the_torchaudio_backend(monkeypatch):
+    # 只有 sox 的主機：torchaudio.load 不接受 bytes，TTS 的 WAV 要改用 wave 讀取
+    def load(*args, **kwargs):
+        raise RuntimeError('sox backend does not support file-like objects')
+
+    monkeypatch.setattr(AudioEncoder.torchaudio, 'load', load)
+    encoded = AudioEncoder.encode_audio(tts_wav(), AudioEncoder.EncodingConfig(sample_rate=16000))
+    with wave.open(io.BytesIO(encoded.data), 'rb') as wav_file:
+        assert wav_file.getframerate() == 16000
+        assert wav_file.getnchannels() == 1
+        assert wav_file.getnframes() == 8000
+
+
+def test_pcm_wav_is_read_as_float_samples():
+    waveform, sample_rate = AudioEncoder._read_wav(tts_wav(sample_rate=16000))
+    assert sample_rate == 16000
+    assert tuple(waveform.shape) == (1, 8000)
+    assert float(waveform.abs().max()) == pytest.approx(16000 / 32768, abs=1e-3)
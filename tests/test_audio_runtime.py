@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+# 需要 torch、torchaudio 與 denoiser；沒有安裝時略過
+AudioRuntime = pytest.importorskip('utils.AudioRuntime')
+torch = pytest.importorskip('torch')
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    # 模擬只有 sox 與 soundfile 的主機（缺少 FFmpeg 函式庫），記錄每次 torchaudio.load 的輸入與 backend
+    calls = []
+
+    def load(source, backend=None):
+        if backend == 'sox' and not isinstance(source, str):
+            raise RuntimeError('sox backend does not support file-like objects')
+        calls.append((source, backend))
+        return torch.zeros(1, 1600), 16000
+
+    monkeypatch.setattr(AudioRuntime, '_audio_backends', {})
+    monkeypatch.setattr(AudioRuntime.torchaudio, 'list_audio_backends', lambda: ['sox', 'soundfile'])
+    monkeypatch.setattr(AudioRuntime.torchaudio, 'load', load)
+    return calls
+
+
+def test_upload_file_is_decoded_from_its_path(loads, tmp_path):
+    path = tmp_path / 'upload-1'
+    with open(path, 'w+b') as upload:
+        upload.write(b'RIFF')
+        upload.seek(0)
+        AudioRuntime.decode_audio(upload)
+    assert loads == [(str(path), 'sox')]
+
+
+def test_bytes_without_a_path_use_a_file_like_backend(loads):
+    AudioRuntime.decode_audio(b'RIFF')
+    AudioRuntime.decode_audio(io.BytesIO(b'RIFF'))
+    assert [backend for _, backend in loads] == ['soundfile', 'soundfile']
+
+
+def test_missing_backend_is_a_server_error(monkeypatch):
+    monkeypatch.setattr(AudioRuntime, '_audio_backends', {})
+    monkeypatch.setattr(AudioRuntime.torchaudio, 'list_audio_backends', lambda: ['sox'])
+    with pytest.raises(AudioRuntime.AudioBackendError):
+        AudioRuntime.decode_audio(b'RIFF')
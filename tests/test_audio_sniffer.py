@@ -0,0 +1,18 @@
+from utils.AudioSniffer import sniff_audio_format
+
+
+def test_sniffs_supported_formats():
+    assert sniff_audio_format(b'RIFF\x24\x08\x00\x00WAVEfmt ') == 'wav'
+    assert sniff_audio_format(b'OggS\x00\x02\x00\x00\x00\x00\x00\x00') == 'ogg'
+    assert sniff_audio_format(b'ID3\x04\x00\x00\x00\x00\x00\x00\x00\x00') == 'mp3'
+    # MPEG-1 Layer III frame，沒有 ID3 標籤
+    assert sniff_audio_format(b'\xff\xfb\x90\x64\x00\x00\x00\x00\x00\x00\x00\x00') == 'mp3'
+
+
+def test_rejects_other_content():
+    assert sniff_audio_format(b'') is None
+    assert sniff_audio_format(b'RIFF\x24\x08\x00\x00AVI LIST') is None
+    assert sniff_audio_format(b'\x89PNG\r\n\x1a\n\x00\x00\x00\r') is None
+    assert sniff_audio_format(b'fake.wav contents') is None
+    # AAC ADTS（layer 00）不是 mp3
+    assert sniff_audio_format(b'\xff\xf1\x50\x80\x00\x1f\xfc\x00\x00\x00\x00\x00') is None
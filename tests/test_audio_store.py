@@ -0,0 +1,29 @@
+from utils.AudioStore import AudioStore
+
+
+def test_put_is_content_addressed(tmp_path):
+    store = AudioStore(str(tmp_path))
+    first = store.put(b'RIFF-audio', 'wav')
+    second = store.put(b'RIFF-audio', 'wav')
+    other = store.put(b'OggS-audio', 'ogg')
+    assert first == second
+    assert first != other
+    assert first.endswith('.wav') and other.endswith('.ogg')
+    with open(store.path(first), 'rb') as f:
+        assert f.read() == b'RIFF-audio'
+    assert not [name for name in tmp_path.iterdir() if name.suffix == '.tmp']
+
+
+def test_path_rejects_invalid_or_missing_ids(tmp_path):
+    store = AudioStore(str(tmp_path))
+    audio_id = store.put(b'data', 'mp3')
+    assert store.path(audio_id) is not None
+    assert store.path('../' + audio_id) is None
+    assert store.path('0' * 32 + '.mp3') is None
+    assert store.path(audio_id.replace('.mp3', '.exe')) is None
+
+
+def test_etag_is_the_hash(tmp_path):
+    store = AudioStore(str(tmp_path))
+    audio_id = store.put(b'data', 'ogg')
+    assert AudioStore.etag(audio_id) == audio_id[:32]
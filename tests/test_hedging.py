@@ -0,0 +1,96 @@
+import contextvars
+import time
+
+import pytest
+
+from utils.Hedging import LatencyTracker, hedged_call, hedged_stream
+
+
+def tracker(delay=0.05):
+    return LatencyTracker(min_delay=0.0, default_delay=delay)
+
+
+def slow(value, seconds):
+    def call():
+        time.sleep(seconds)
+        return value
+    return call
+
+
+def fail():
+    raise RuntimeError("backend down")
+
+
+def test_primary_wins_when_fast():
+    t = tracker()
+    assert hedged_call([('primary', slow('a', 0)), ('secondary', slow('b', 0))], t) == 'a'
+    assert 'secondary' not in t.stats()
+
+
+def test_hedge_wins_when_primary_is_slow():
+    t = tracker(delay=0.05)
+    start = time.perf_counter()
+    assert hedged_call([('primary', slow('a', 1.0)), ('secondary', slow('b', 0))], t) == 'b'
+    assert time.perf_counter() - start < 0.5
+
+
+def test_falls_back_immediately_on_error():
+    t = tracker(delay=5.0)
+    start = time.perf_counter()
+    assert hedged_call([('primary', fail), ('secondary', slow('b', 0))], t) == 'b'
+    assert time.perf_counter() - start < 1.0
+
+
+def test_raises_when_every_backend_fails():
+    with pytest.raises(RuntimeError):
+        hedged_call([('primary', fail), ('secondary', fail)], tracker())
+
+
+def test_stream_races_on_first_chunk():
+    def stream(prefix, first_delay):
+        def call():
+            def gen():
+                time.sleep(first_delay)
+                for i in range(3):
+                    yield f"{prefix}{i}"
+            return gen()
+        return call
+
+    chunks = list(hedged_stream([('primary', stream('a', 1.0)), ('secondary', stream('b', 0))], tracker(0.05)))
+    assert chunks == ['b0', 'b1', 'b2']
+
+
+def test_hedge_delay_uses_percentile_after_enough_samples():
+    t = LatencyTracker(percentile_q=95, min_delay=0.1, default_delay=8.0, min_samples=10)
+    assert t.hedge_delay('primary') == 8.0
+    for i in range(1, 21):
+        t.record('primary', i / 10)
+    assert 1.8 <= t.hedge_delay('primary') <= 2.0
+    assert t.stats()['primary']['count'] == 20
+
+
+def test_losing_stream_is_drained_so_its_callback_ends():
+    # 模擬 llama_index 的串流 callback：建立串流時 start，讀完才 end，end 時記錄當時的請求
+    request = contextvars.ContextVar('request', default=None)
+    open_events, ended = set(), []
+
+    def stream(name, first_delay):
+        def call():
+            open_events.add(name)
+
+            def gen():
+                time.sleep(first_delay)
+                yield from (f"{name}{i}" for i in range(3))
+                open_events.discard(name)
+                ended.append((name, request.get()))
+            return gen()
+        return call
+
+    request.set('req-1')
+    attempts = [('primary', stream('a', 0.3)), ('secondary', stream('b', 0))]
+    assert list(hedged_stream(attempts, tracker(0.05))) == ['b0', 'b1', 'b2']
+    deadline = time.monotonic() + 2.0
+    while open_events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert open_events == set()
+    assert sorted(ended) == [('a', 'req-1'), ('b', 'req-1')]
@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from utils.InferenceScheduler import BACKGROUND, VOICE, InferenceScheduler, QueueFullError
+
+
+def blocked_scheduler(max_queue=16):
+    # 一個 worker 先卡在 gate 上，之後送進來的工作都會留在佇列裡
+    scheduler = InferenceScheduler(workers=1, max_queue=max_queue)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        gate.wait(5)
+
+    blocker = scheduler.submit('hold', hold)
+    started.wait(5)
+    return scheduler, gate, blocker
+
+
+def test_run_returns_result_and_records_stage():
+    scheduler = InferenceScheduler(workers=2)
+    assert scheduler.run('add', lambda a, b: a + b, 1, 2) == 3
+    stats = scheduler.stats()
+    assert stats['stages']['add']['count'] == 1
+    assert stats['depth'] == 0
+
+
+def test_exception_is_forwarded_to_future():
+    scheduler = InferenceScheduler(workers=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        scheduler.run('fail', fail)
+
+
+def test_voice_jobs_run_before_background_jobs():
+    scheduler, gate, blocker = blocked_scheduler()
+    order = []
+    futures = [
+        scheduler.submit('bg', order.append, 'bg1', priority=BACKGROUND),
+        scheduler.submit('voice', order.append, 'voice1', priority=VOICE),
+        scheduler.submit('bg', order.append, 'bg2', priority=BACKGROUND),
+        scheduler.submit('voice', order.append, 'voice2', priority=VOICE),
+    ]
+    gate.set()
+    for future in [blocker] + futures:
+        future.result(5)
+    assert order == ['voice1', 'voice2', 'bg1', 'bg2']
+
+
+def test_queue_full_raises_with_retry_after():
+    scheduler, gate, blocker = blocked_scheduler(max_queue=2)
+    futures = [scheduler.submit('stt', lambda: None) for _ in range(2)]
+    with pytest.raises(QueueFullError) as excinfo:
+        scheduler.submit('stt', lambda: None)
+    assert excinfo.value.retry_after >= 1
+    gate.set()
+    for future in [blocker] + futures:
+        future.result(5)
+    assert scheduler.run('stt', lambda: 'ok') == 'ok'
+
+
+def test_track_counts_external_futures_without_using_workers():
+    scheduler, gate, blocker = blocked_scheduler(max_queue=2)
+    external = Future()
+    tracked = scheduler.track('stt', lambda: external)
+    # worker 還卡在 blocker 上，track 的工作不需要 worker 也會計入佇列深度
+    assert scheduler.depth == 1
+    scheduler.submit('denoise', lambda: None)
+    with pytest.raises(QueueFullError):
+        scheduler.track('stt', Future)
+    external.set_result('text')
+    assert tracked.result(5) == 'text'
+    gate.set()
+    blocker.result(5)
+    assert scheduler.stats()['stages']['stt']['count'] == 1
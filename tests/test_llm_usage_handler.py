@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+# 需要 llama_index；沒有安裝時略過
+LLMUsageHandler = pytest.importorskip('utils.LLMUsageHandler')
+from llama_index.core.callbacks import CBEventType, EventPayload
+from utils.RequestTracer import end_trace, start_trace
+
+
+def value(counter, *labels):
+    return counter._values.get(labels, 0)
+
+
+def snapshot(scope):
+    return {
+        'calls': value(LLMUsageHandler.llm_calls, scope),
+        'prompt': value(LLMUsageHandler.llm_tokens, scope, 'prompt'),
+        'cached': value(LLMUsageHandler.llm_tokens, scope, 'cached'),
+        'completion': value(LLMUsageHandler.llm_tokens, scope, 'completion'),
+    }
+
+
+def delta(before, scope):
+    after = snapshot(scope)
+    return {key: after[key] - before[key] for key in after}
+
+
+@pytest.fixture
+def handler():
+    handler = LLMUsageHandler.LLMUsageHandler()
+    # 以字數當 token 數，不需要下載 tokenizer
+    handler._token_counter = SimpleNamespace(
+        get_string_tokens=len,
+        estimate_tokens_in_messages=lambda messages: sum(len(message.content) for message in messages))
+    return handler
+
+
+def usage_response(prompt, completion, cached):
+    raw = {'usage': {'prompt_tokens': prompt, 'completion_tokens': completion,
+                     'prompt_tokens_details': {'cached_tokens': cached}}}
+    return SimpleNamespace(raw=raw, message=SimpleNamespace(content='x' * completion))
+
+
+def test_agent_and_tool_calls_are_attributed_to_their_scope(handler):
+    agent, tool = snapshot('agent'), snapshot('tool_Museum_tool')
+    trace = start_trace('req-usage')
+    try:
+        handler.on_event_start(CBEventType.AGENT_STEP, event_id='step', parent_id='root')
+        # ReAct 推理：OpenAI 有回傳 usage（含 cached_tokens）
+        handler.on_event_start(CBEventType.LLM, event_id='llm-1', parent_id='step')
+        handler.on_event_end(CBEventType.LLM, {EventPayload.RESPONSE: usage_response(100, 20, 60)}, event_id='llm-1')
+
+        # tool call 底下（中間隔著 synthesize）的 LLM 呼叫，串流沒有 usage，以 tokenizer 估計
+        handler.on_event_start(CBEventType.FUNCTION_CALL, {EventPayload.TOOL: SimpleNamespace(name='Museum_tool')},
+                               event_id='tool', parent_id='step')
+        handler.on_event_start(CBEventType.SYNTHESIZE, event_id='synth', parent_id='tool')
+        handler.on_event_start(CBEventType.LLM, event_id='llm-2', parent_id='synth')
+        handler.on_event_end(CBEventType.LLM, {
+            EventPayload.MESSAGES: [SimpleNamespace(content='介紹人形木雕板')],
+            EventPayload.RESPONSE: SimpleNamespace(raw=None, message=SimpleNamespace(content='人形木雕板是'))
+        }, event_id='llm-2')
+        for event_type, event_id in ((CBEventType.SYNTHESIZE, 'synth'), (CBEventType.FUNCTION_CALL, 'tool'),
+                                     (CBEventType.AGENT_STEP, 'step')):
+            handler.on_event_end(event_type, event_id=event_id)
+    finally:
+        end_trace()
+
+    assert delta(agent, 'agent') == {'calls': 1, 'prompt': 100, 'cached': 60, 'completion': 20}
+    assert delta(tool, 'tool_Museum_tool') == {'calls': 1, 'prompt': 7, 'cached': 0, 'completion': 6}
+    assert trace.counters['llm_calls'] == 2
+    assert trace.counters['llm_prompt_tokens'] == 107
+    assert trace.counters['llm_cached_tokens'] == 60
+    assert trace.counters['llm_completion_tokens'] == 26
+    assert trace.counters['llm_cost_usd'] > 0
+    # 所有事件結束後不留下任何狀態
+    assert handler._events == {} and handler._steps == {}
+
+
+def test_completion_without_usage_is_estimated_from_the_prompt(handler, monkeypatch):
+    monkeypatch.setenv('LLM_PRICE_INPUT_PER_1M', '1000000')
+    monkeypatch.setenv('LLM_PRICE_OUTPUT_PER_1M', '0')
+    agent = snapshot('agent')
+    trace = start_trace('req-complete')
+    try:
+        handler.on_event_start(CBEventType.LLM, event_id='llm', parent_id='root')
+        handler.on_event_end(CBEventType.LLM, {
+            EventPayload.PROMPT: '你好',
+            EventPayload.COMPLETION: SimpleNamespace(raw={}, text='歡迎參觀')
+        }, event_id='llm')
+    finally:
+        end_trace()
+
+    assert delta(agent, 'agent') == {'calls': 1, 'prompt': 2, 'cached': 0, 'completion': 4}
+    assert trace.counters['llm_cost_usd'] == pytest.approx(2.0)
+
+
+def test_end_without_start_is_ignored(handler):
+    handler.on_event_end(CBEventType.LLM, {EventPayload.RESPONSE: usage_response(10, 1, 0)}, event_id='unknown')
+    assert handler._events == {}
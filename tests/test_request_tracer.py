@@ -0,0 +1,75 @@
+from utils.RequestTracer import (
+    Counter, Histogram, RequestTrace, current_trace, end_trace, record_span, start_trace, trace_span
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('stage_seconds', 'Stage durations.', 'stage', buckets=(0.1, 1.0))
+    histogram.observe('stt', 0.05)
+    histogram.observe('stt', 0.5)
+    histogram.observe('stt', 5.0)
+    text = histogram.render()
+    assert '# TYPE stage_seconds histogram' in text
+    assert 'stage_seconds_bucket{stage="stt",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="stt",le="1"} 2' in text
+    assert 'stage_seconds_bucket{stage="stt",le="+Inf"} 3' in text
+    assert 'stage_seconds_sum{stage="stt"} 5.550000' in text
+    assert 'stage_seconds_count{stage="stt"} 3' in text
+
+
+def test_server_timing_sums_repeated_stages():
+    trace = RequestTrace('abc')
+    trace.record('denoise', 0.2)
+    trace.record('tool_Museum_tool', 0.1)
+    trace.record('tool_Museum_tool', 0.3)
+    header = trace.server_timing()
+    entries = header.split(', ')
+    assert entries[0] == 'denoise;dur=200.0'
+    assert entries[1] == 'tool_Museum_tool;dur=400.0;desc="x2"'
+    assert entries[-1].startswith('total;dur=')
+
+
+def test_server_timing_sanitizes_names():
+    trace = RequestTrace('abc')
+    trace.record('tool_web search', 0.001)
+    assert trace.server_timing().startswith('tool_web_search;dur=1.0')
+
+
+def test_spans_are_recorded_on_current_trace():
+    trace = start_trace('req-1')
+    try:
+        assert current_trace() is trace
+        with trace_span('stt'):
+            pass
+        record_span('llm', 0.25)
+    finally:
+        assert end_trace() is trace
+    assert [name for name, _ in trace.spans] == ['stt', 'llm']
+    assert current_trace() is None
+
+
+def test_span_outside_request_does_not_fail():
+    assert current_trace() is None
+    with trace_span('warmup'):
+        pass
+    record_span('warmup', 0.1)
+
+
+def test_counter_renders_multiple_labels():
+    counter = Counter('llm_tokens_total', 'Tokens.', ('scope', 'kind'))
+    counter.inc(('agent', 'prompt'), 120)
+    counter.inc(('agent', 'prompt'), 30)
+    counter.inc(('tool_Museum_tool', 'completion'), 0.5)
+    text = counter.render()
+    assert '# TYPE llm_tokens_total counter' in text
+    assert 'llm_tokens_total{scope="agent",kind="prompt"} 150' in text
+    assert 'llm_tokens_total{scope="tool_Museum_tool",kind="completion"} 0.500000' in text
+
+
+def test_trace_counters_appear_in_summary():
+    trace = RequestTrace('abc')
+    trace.add('llm_calls')
+    trace.add('llm_calls')
+    trace.add('llm_cost_usd', 0.0012)
+    assert 'llm_calls=2' in trace.summary()
+    assert 'llm_cost_usd=0.001200' in trace.summary()
@@ -0,0 +1,37 @@
+import threading
+from typing import List
+
+import pytest
+
+# 需要 llama_index；沒有安裝時略過
+ScheduledEmbedding = pytest.importorskip('utils.ScheduledEmbedding').ScheduledEmbedding
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from utils.InferenceScheduler import InferenceScheduler
+
+calls = []
+
+
+class RecordingEmbedding(BaseEmbedding):
+    # 不載入模型，記錄每次推論在哪個執行緒執行
+    def _get_query_embedding(self, query: str) -> List[float]:
+        calls.append(('query', threading.current_thread()))
+        return [1.0, 0.0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        calls.append(('text', threading.current_thread()))
+        return [0.0, 1.0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+
+def test_embeddings_run_on_the_inference_pool():
+    calls.clear()
+    scheduler = InferenceScheduler(workers=1)
+    embed_model = ScheduledEmbedding(RecordingEmbedding(model_name='fake'), scheduler)
+
+    assert embed_model.get_query_embedding('阿美族') == [1.0, 0.0]
+    assert embed_model.get_text_embedding('阿美族的豐年祭') == [0.0, 1.0]
+    assert [kind for kind, _ in calls] == ['query', 'text']
+    assert all(thread is not threading.current_thread() for _, thread in calls)
+    assert scheduler.stats()['stages']['embedding']['count'] == 2
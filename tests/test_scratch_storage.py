@@ -0,0 +1,51 @@
+import os
+import time
+
+from utils.ScratchStorage import ScratchStorage
+
+
+def write(path, size, age=0):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+
+
+def test_request_dir_is_removed_on_release(tmp_path):
+    storage = ScratchStorage(str(tmp_path))
+    path = storage.request_dir('req-1')
+    write(os.path.join(path, 'upload.wav'), 100)
+    storage.release('req-1')
+    assert not os.path.exists(path)
+    storage.release('req-1')  # 重複 release 不會出錯
+
+
+def test_sweep_removes_old_files_and_stale_request_dirs(tmp_path):
+    storage = ScratchStorage(str(tmp_path), max_age=60, request_max_age=30)
+    audio = storage.area('audio')
+    write(os.path.join(audio, 'old.ogg'), 10, age=120)
+    write(os.path.join(audio, 'new.ogg'), 10)
+    stale = storage.request_dir('crashed')
+    write(os.path.join(stale, 'upload.wav'), 5)
+    os.utime(stale, (time.time() - 100, time.time() - 100))
+    active = storage.request_dir('active')
+    write(os.path.join(active, 'upload.wav'), 5)
+
+    removed = storage.sweep()
+    assert removed['age'] == 15
+    assert not os.path.exists(os.path.join(audio, 'old.ogg'))
+    assert os.path.exists(os.path.join(audio, 'new.ogg'))
+    assert not os.path.exists(stale)
+    assert os.path.exists(active)
+
+
+def test_sweep_enforces_quota_oldest_first(tmp_path):
+    storage = ScratchStorage(str(tmp_path), max_age=3600, max_bytes=250)
+    audio = storage.area('audio')
+    for name, age in (('a.ogg', 30), ('b.ogg', 20), ('c.ogg', 10)):
+        write(os.path.join(audio, name), 100, age=age)
+
+    removed = storage.sweep()
+    assert removed['quota'] == 100
+    assert sorted(os.listdir(audio)) == ['b.ogg', 'c.ogg']
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from utils.StartupManager import StartupManager
+
+
+def test_runs_each_component_once_after_its_dependencies():
+    calls = []
+    startup = StartupManager()
+    startup.add('embedding', lambda: calls.append('embedding'), warm_up=lambda: calls.append('embedding_warm'))
+    startup.add('chatbot', lambda: calls.append('chatbot'), after=('embedding',))
+    startup.add('whisper', lambda: calls.append('whisper'))
+
+    assert startup.run() is True
+    assert startup.run() is True
+    assert sorted(calls) == ['chatbot', 'embedding', 'embedding_warm', 'whisper']
+    assert calls.index('chatbot') > calls.index('embedding_warm')
+    status = startup.status()
+    assert status['ready'] and status['state'] == 'ready'
+    assert status['components']['embedding']['load_seconds'] is not None
+    assert status['components']['embedding']['warmup_seconds'] is not None
+    assert status['components']['chatbot']['warmup_seconds'] is None
+
+
+def test_independent_components_load_in_parallel():
+    # 兩個元件互相等待對方開始，沒有平行載入就會逾時失敗
+    barrier = threading.Barrier(2, timeout=5)
+    startup = StartupManager()
+    startup.add('denoiser', barrier.wait)
+    startup.add('whisper', barrier.wait)
+    assert startup.run() is True
+
+
+def test_failure_propagates_to_dependents():
+    def fail():
+        raise RuntimeError("no index")
+
+    startup = StartupManager()
+    startup.add('embedding', fail)
+    startup.add('chatbot', lambda: None, after=('embedding',))
+    startup.add('tts', warm_up=fail, required=False)
+    startup.add('whisper', lambda: None)
+
+    assert startup.run() is False
+    components = startup.status()['components']
+    assert components['embedding'] == {
+        'state': 'failed', 'required': True, 'load_seconds': None, 'warmup_seconds': None, 'error': 'no index'}
+    assert components['chatbot']['error'] == 'dependency failed: embedding'
+    assert components['whisper']['state'] == 'ready'
+    assert startup.status()['state'] == 'failed'
+
+
+def test_optional_failure_does_not_block_ready():
+    def fail():
+        raise RuntimeError("TTS server is down")
+
+    startup = StartupManager()
+    startup.add('whisper', lambda: None)
+    startup.add('tts', warm_up=fail, required=False)
+    assert startup.status()['state'] == 'pending' and not startup.ready
+    assert startup.run() is True
+    assert startup.status()['components']['tts']['state'] == 'failed'
+
+
+def test_warm_up_can_be_skipped_and_dependencies_must_exist():
+    warmed = []
+    startup = StartupManager()
+    startup.add('whisper', lambda: None, warm_up=lambda: warmed.append(True))
+    startup.run(warm_up=False)
+    assert warmed == []
+    with pytest.raises(ValueError):
+        startup.add('chatbot', lambda: None, after=('embedding',))
+
+
+def test_network_components_wait_for_a_later_run():
+    calls = []
+    startup = StartupManager()
+    startup.add('chatbot', lambda: calls.append('chatbot'))
+    startup.add('llm', warm_up=lambda: calls.append('llm'), after=('chatbot',), network=True)
+
+    # 例如 gunicorn master：只載入模型，network 元件留給 fork 之後的 worker
+    assert startup.run(network=False) is False
+    assert calls == ['chatbot']
+    assert startup.status()['components']['llm']['state'] == 'pending'
+    assert startup.run() is True
+    assert calls == ['chatbot', 'llm']
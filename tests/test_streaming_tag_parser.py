@@ -0,0 +1,74 @@
+from utils.StreamingTagParser import StreamingTagParser, parse_stream
+
+
+def feed_all(chunks, on_action=None):
+    parser = StreamingTagParser(on_action=on_action)
+    spoken = "".join(parser.feed(chunk) for chunk in chunks) + parser.flush()
+    return spoken, parser
+
+
+def test_tag_in_single_chunk():
+    spoken, parser = feed_all(["好啊我來跳舞<action>0</action>"])
+    assert spoken == "好啊我來跳舞"
+    assert parser.action == 0
+
+
+def test_tag_split_inside_open_tag():
+    spoken, parser = feed_all(["跳舞囉<ac", "tion>0</action>!"])
+    assert spoken == "跳舞囉!"
+    assert parser.action == 0
+
+
+def test_tag_split_at_every_character():
+    text = "換背景<action>3</action>嘻嘻"
+    spoken, parser = feed_all(list(text))
+    assert spoken == "換背景嘻嘻"
+    assert parser.action == 3
+
+
+def test_tag_split_inside_number_and_close_tag():
+    spoken, parser = feed_all(["<action>1", "2</ac", "tion>"])
+    assert spoken == ""
+    assert parser.action == 12
+
+
+def test_action_published_before_stream_ends():
+    published = []
+    parser = StreamingTagParser(on_action=published.append)
+    parser.feed("<action>2</action>")
+    assert published == [2]
+    parser.feed("我甚麼都會唱 peko")
+    assert published == [2]
+
+
+def test_text_is_released_as_soon_as_tag_is_ruled_out():
+    parser = StreamingTagParser()
+    assert parser.feed("a <act") == "a "
+    assert parser.feed("ive> b") == "<active> b"
+    assert parser.action == -1
+
+
+def test_non_numeric_action_is_kept_as_text():
+    spoken, parser = feed_all(["<action>", "abc</action>"])
+    assert spoken == "<action>abc</action>"
+    assert parser.action == -1
+
+
+def test_unterminated_tag_is_flushed_as_text():
+    spoken, parser = feed_all(["結束<action>4</act"])
+    assert spoken == "結束<action>4</act"
+    assert parser.action == -1
+
+
+def test_first_action_wins_and_all_tags_are_stripped():
+    spoken, parser = feed_all(["<action>0</action>a", "<action>1</action>"])
+    assert spoken == "a"
+    assert parser.action == 0
+    assert parser.actions == [0, 1]
+
+
+def test_parse_stream_wraps_generator():
+    published = []
+    chunks = iter(["嘿嘿", "<action", ">1</action>", "跟著你"])
+    assert "".join(parse_stream(chunks, on_action=published.append)) == "嘿嘿跟著你"
+    assert published == [1]
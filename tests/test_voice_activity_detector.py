@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from utils.VoiceActivityDetector import VoiceActivityDetector, estimate_snr, trim_silence
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def noise(seconds, amplitude=0.001):
+    rng = np.random.default_rng(0)
+    return (amplitude * rng.standard_normal(int(SAMPLE_RATE * seconds))).astype(np.float32)
+
+
+def feed_in_chunks(vad, audio, chunk=1000):
+    segments = []
+    for start in range(0, len(audio), chunk):
+        segments.extend(vad.feed(audio[start:start + chunk]))
+    return segments
+
+
+def test_silence_produces_no_segments():
+    vad = VoiceActivityDetector()
+    assert feed_in_chunks(vad, noise(2.0)) == []
+    assert vad.flush() is None
+    assert not vad.end_of_utterance
+
+
+def test_pause_splits_segments_and_long_silence_ends_utterance():
+    vad = VoiceActivityDetector(pause_ms=300, end_of_utterance_ms=900)
+    audio = np.concatenate([noise(0.5), tone(1.0), noise(0.4), tone(0.8), noise(1.2)])
+    segments = feed_in_chunks(vad, audio)
+
+    assert len(segments) == 2
+    assert 0.9 < len(segments[0]) / SAMPLE_RATE < 1.6
+    assert vad.end_of_utterance
+
+
+def test_flush_returns_unfinished_speech():
+    vad = VoiceActivityDetector()
+    segments = feed_in_chunks(vad, np.concatenate([noise(0.5), tone(0.6)]))
+    assert segments == []
+    segment = vad.flush()
+    assert segment is not None
+    assert len(segment) / SAMPLE_RATE >= 0.6
+
+
+def test_short_click_is_ignored():
+    vad = VoiceActivityDetector(min_speech_ms=150)
+    audio = np.concatenate([noise(0.5), tone(0.03), noise(1.0)])
+    assert feed_in_chunks(vad, audio) == []
+    assert not vad.end_of_utterance
+
+
+def test_long_speech_is_cut_for_whisper_window():
+    vad = VoiceActivityDetector(max_segment_ms=2000)
+    segments = feed_in_chunks(vad, np.concatenate([noise(0.3), tone(5.0)]))
+    assert len(segments) == 2
+    assert all(len(segment) / SAMPLE_RATE <= 2.1 for segment in segments)
+
+
+def test_trim_silence_keeps_speech_with_padding():
+    audio = np.concatenate([noise(1.0), tone(0.5), noise(2.0)])
+    trimmed, start = trim_silence(audio, padding_ms=100)
+    assert 0.5 <= len(trimmed) / SAMPLE_RATE <= 0.8
+    assert 0.85 <= start / SAMPLE_RATE <= 1.0
+
+
+def test_trim_silence_keeps_quiet_syllables_without_surrounding_silence():
+    # 開頭與結尾是小聲的音節（約 -37 dBFS），中間是正常音量，頭尾完全沒有靜音
+    audio = np.concatenate([tone(0.3, amplitude=0.02), tone(2.0), tone(0.3, amplitude=0.02)])
+    trimmed, start = trim_silence(audio)
+    assert start == 0
+    assert len(trimmed) == len(audio)
+
+
+def test_trim_silence_leaves_pure_noise_untouched():
+    audio = noise(1.0)
+    trimmed, start = trim_silence(audio)
+    assert start == 0
+    assert len(trimmed) == len(audio)
+
+
+def test_estimate_snr_separates_clean_and_noisy_clips():
+    clean = np.concatenate([noise(0.5, 0.001), tone(1.0), noise(0.5, 0.001)])
+    noisy = np.concatenate([noise(0.5, 0.1), tone(1.0) + noise(1.0, 0.1), noise(0.5, 0.1)])
+    clean_snr, clean_floor = estimate_snr(clean)
+    noisy_snr, noisy_floor = estimate_snr(noisy)
+    assert clean_snr > 30
+    assert noisy_snr < 15
+    assert noisy_floor > clean_floor
+
+
+def test_rejects_sample_rate_too_low_for_a_frame():
+    with pytest.raises(ValueError):
+        VoiceActivityDetector(sample_rate=0)
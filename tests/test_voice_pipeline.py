@@ -0,0 +1,125 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# 需要 torch、whisper 與 llama_index；沒有安裝時略過
+voice_pipeline = pytest.importorskip('core.voice_pipeline')
+from utils.BatchTranscriber import BatchTranscriber
+from utils.InferenceScheduler import InferenceScheduler
+from utils.ScratchStorage import ScratchStorage
+
+
+class RecordingBatchTranscriber(BatchTranscriber):
+    # 不跑 Whisper，只記錄每次解碼的 batch 大小
+    def __init__(self, *args, **kwargs):
+        self.batches = []
+        super().__init__(*args, **kwargs)
+
+    def _decode_batch(self, language, items):
+        self.batches.append(len(items))
+        for _, future in items:
+            future.set_result('ok')
+
+
+def test_concurrent_transcribe_calls_form_one_batch(tmp_path):
+    requests = 6
+    whisper = SimpleNamespace(model=object(), config=SimpleNamespace(language='zh'))
+    transcriber = RecordingBatchTranscriber(whisper, max_batch_size=8, max_wait_ms=500)
+    # 工作池只有 2 個執行緒，辨識不經過工作池，batch 才能超過 2
+    pipeline = voice_pipeline.VoicePipeline(
+        scheduler=InferenceScheduler(workers=2), scratch=ScratchStorage(str(tmp_path)))
+    pipeline._components['transcriber'] = transcriber
+    pipeline._components['denoiser'] = None
+
+    audio = np.random.default_rng(0).normal(0, 0.1, 16000).astype(np.float32)
+    barrier = threading.Barrier(requests)
+    results = []
+
+    def visitor():
+        barrier.wait(5)
+        results.append(pipeline.transcribe(audio, denoise=False))
+
+    threads = [threading.Thread(target=visitor) for _ in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results == ['ok'] * requests
+    assert transcriber.batches == [requests]
+
+
+class OverlapRecordingAgent:
+    # 假的 ChatBot：回答期間 sleep，記錄所有 agent 同時在回答的請求數
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def normal_chat(self, text):
+        cls = OverlapRecordingAgent
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+        return SimpleNamespace(response=f'{text}<action>1</action>')
+
+
+def ask_concurrently(pipeline, session_ids):
+    results = []
+    threads = [threading.Thread(target=lambda i=i, s=s: results.append(pipeline.ask(str(i), s)))
+               for i, s in enumerate(session_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return sorted(results)
+
+
+@pytest.fixture
+def chat_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(OverlapRecordingAgent, 'active', 0)
+    monkeypatch.setattr(OverlapRecordingAgent, 'max_active', 0)
+    pipeline = voice_pipeline.VoicePipeline(
+        scheduler=InferenceScheduler(workers=2), scratch=ScratchStorage(str(tmp_path)))
+    pipeline._components['agent_manager'] = voice_pipeline.ChatAgentManager(factory=OverlapRecordingAgent)
+    return pipeline
+
+
+def test_same_session_uses_its_agent_one_at_a_time(chat_pipeline):
+    results = ask_concurrently(chat_pipeline, ['kiosk-1'] * 4)
+    assert results == [(f'{i}<action>1</action>', 1) for i in range(4)]
+    assert OverlapRecordingAgent.max_active == 1
+
+
+def test_different_sessions_and_anonymous_requests_do_not_wait(chat_pipeline):
+    ask_concurrently(chat_pipeline, ['kiosk-1', 'kiosk-2', None, None])
+    assert OverlapRecordingAgent.max_active == 4
+
+
+def test_sessions_keep_their_own_agent_until_idle():
+    manager = voice_pipeline.ChatAgentManager(factory=object, max_sessions=2, idle_seconds=60)
+    with manager.using_agent('a') as first, manager.using_agent('b') as other:
+        assert first is not other
+    with manager.using_agent('a') as again:
+        assert again is first
+    with manager.using_agent(None) as anonymous:
+        assert anonymous is not first
+
+    # 閒置超過 idle_seconds 的 session 換成新的 agent，下一位參觀者不會接到前一位的對話
+    manager._sessions['a'].last_used -= 120
+    with manager.using_agent('a') as expired:
+        assert expired is not first
+
+
+def test_oldest_session_is_evicted_over_the_limit():
+    manager = voice_pipeline.ChatAgentManager(factory=object, max_sessions=2, idle_seconds=60)
+    for session_id in ('a', 'b', 'c'):
+        with manager.using_agent(session_id):
+            pass
+    assert list(manager._sessions) == ['b', 'c']
+    manager.reset_agent('b')
+    assert list(manager._sessions) == ['c']
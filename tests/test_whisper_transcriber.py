@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+# 需要 torch 與 openai-whisper；沒有安裝時略過
+WhisperTranscriber = pytest.importorskip('utils.WhisperTranscriber')
+
+
+@pytest.fixture
+def transcriber(monkeypatch):
+    # 不載入模型：whisper.decode 依序回傳 results，記錄每次收到的輸入
+    transcriber = WhisperTranscriber.WhisperTranscriber.__new__(WhisperTranscriber.WhisperTranscriber)
+    transcriber.config = WhisperTranscriber.TranscriptionConfig(temperatures=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0))
+    transcriber.model = SimpleNamespace(device=SimpleNamespace(type='cpu'))
+    transcriber.calls = []
+    transcriber.results = []
+
+    def decode(model, features, options):
+        transcriber.calls.append((features, options.temperature))
+        return transcriber.results.pop(0)
+
+    monkeypatch.setattr(WhisperTranscriber.whisper, 'decode', decode)
+    monkeypatch.setattr(WhisperTranscriber.whisper, 'DecodingOptions', lambda **options: SimpleNamespace(**options))
+    return transcriber
+
+
+def result(text, avg_logprob, no_speech_prob):
+    return SimpleNamespace(text=text, avg_logprob=avg_logprob, no_speech_prob=no_speech_prob)
+
+
+def test_silent_clip_is_not_decoded_again(transcriber):
+    transcriber.results = [result('謝謝觀看', avg_logprob=-1.8, no_speech_prob=0.9)]
+    decoded = transcriber.decode_with_fallback('features', 'zh', 1.0)
+    assert [temperature for _, temperature in transcriber.calls] == [0.0]
+    # 沒有人說話時不輸出 Whisper 的幻覺文字
+    assert transcriber.result_text(decoded) == ''
+
+
+def test_unreliable_speech_falls_back_reusing_the_encoded_audio(transcriber):
+    transcriber.results = [result('阿美族', avg_logprob=-1.5, no_speech_prob=0.1),
+                           result('阿美族', avg_logprob=-1.2, no_speech_prob=0.1),
+                           result('阿美族的豐年祭', avg_logprob=-0.3, no_speech_prob=0.1)]
+    decoded = transcriber.decode_with_fallback('features', 'zh', 1.0)
+    assert transcriber.calls == [('features', 0.0), ('features', 0.2), ('features', 0.4)]
+    assert transcriber.result_text(decoded) == '阿美族的豐年祭'
+
+
+def test_no_speech_check_can_be_disabled(transcriber):
+    transcriber.config.no_speech_threshold = None
+    assert transcriber.needs_fallback(result('謝謝觀看', avg_logprob=-1.8, no_speech_prob=0.9))
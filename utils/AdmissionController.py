@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+class OverloadedError(RuntimeError):
+    """
+    路由已達並行上限且等待佇列也滿了（或等待逾時）時丟出，retry_after 是建議用戶端幾秒後重試。
+    """
+    def __init__(self, name, retry_after):
+        super().__init__(f"Route '{name}' is overloaded")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    單一路由（或一組路由）的准入控制。
+
+    - 同時最多 max_concurrent 個請求在處理，其餘最多 max_waiting 個在門口等待，
+      等待超過 wait_timeout 秒或等待佇列已滿時立即丟出 OverloadedError，不讓請求無限排隊到逾時。
+    - 進入時已經滿載（必須在門口等待），或其他處理中 + 等待中的請求數已達 degrade_at（預設等於 max_concurrent），
+      admit() 回傳 degraded=True，由路由決定要略過哪些步驟（例如降噪、TTS）。
+      只計算自己以外的請求，所以閒置時（即使 max_concurrent=1）不會進入降級模式。
+    """
+    def __init__(self, name, max_concurrent=4, max_waiting=8, wait_timeout=10.0, degrade_at=None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.degrade_at = degrade_at or max_concurrent
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.degraded = 0
+        self._average_seconds = None
+        self._condition = threading.Condition()
+        self._logger = logging.getLogger('AdmissionController')
+
+    @contextmanager
+    def admit(self):
+        degraded = self._acquire()
+        start = time.perf_counter()
+        try:
+            yield degraded
+        finally:
+            self._release(time.perf_counter() - start)
+
+    def retry_after(self):
+        # 以平均處理時間估計目前排隊的請求需要多久才消化完，至少 1 秒
+        average = self._average_seconds or 1.0
+        return max(1, int((self.waiting + 1) * average / self.max_concurrent + 0.999))
+
+    def stats(self):
+        with self._condition:
+            return {
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_waiting': self.max_waiting,
+                'rejected': self.rejected,
+                'degraded': self.degraded,
+                'average_seconds': self._average_seconds,
+            }
+
+    def _acquire(self):
+        with self._condition:
+            queued = self.in_flight >= self.max_concurrent or self.waiting > 0
+            if queued:
+                if self.waiting >= self.max_waiting:
+                    self._reject()
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self.in_flight < self.max_concurrent, timeout=self.wait_timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self._reject()
+            # 在加上自己之前比較：拿到最後一個空位的請求不算滿載
+            degraded = queued or self.in_flight + self.waiting >= self.degrade_at
+            self.in_flight += 1
+            if degraded:
+                self.degraded += 1
+            return degraded
+
+    def _release(self, seconds):
+        with self._condition:
+            self.in_flight -= 1
+            # 指數移動平均，讓 retry_after 跟著最近的處理速度調整
+            if self._average_seconds is None:
+                self._average_seconds = seconds
+            else:
+                self._average_seconds += 0.2 * (seconds - self._average_seconds)
+            self._condition.notify()
+
+    def _reject(self):
+        # 呼叫時已持有 _condition
+        self.rejected += 1
+        retry_after = self.retry_after()
+        self._logger.warning(f"Rejected request for {self.name}: in_flight={self.in_flight} "
+                             f"waiting={self.waiting} retry_after={retry_after}s")
+        raise OverloadedError(self.name, retry_after)
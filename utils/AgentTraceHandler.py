@@ -0,0 +1,50 @@
+import time
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+
+from utils.RequestTracer import record_span
+
+# 只記錄這些事件；tool call 以 tool 名稱區分（tool_Museum_tool、tool_web_search ...）
+EVENT_STAGES = {
+    CBEventType.AGENT_STEP: "agent_step",
+    CBEventType.LLM: "llm",
+    CBEventType.RETRIEVE: "retrieve",
+    CBEventType.EMBEDDING: "embedding",
+    CBEventType.SYNTHESIZE: "synthesize",
+}
+
+
+class AgentTraceHandler(BaseCallbackHandler):
+    """
+    llama_index 的 callback handler，把 ReAct agent 每一步、每次 LLM 呼叫、tool call、檢索與 embedding 的耗時
+    記錄到目前請求的 trace（utils.RequestTracer），最後出現在 Server-Timing 與 /metrics。
+    """
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self._starts = {}
+
+    def on_event_start(self, event_type, payload=None, event_id="", parent_id="", **kwargs):
+        stage = self._stage_name(event_type, payload)
+        if stage is not None:
+            self._starts[event_id] = (stage, time.perf_counter())
+        return event_id
+
+    def on_event_end(self, event_type, payload=None, event_id="", **kwargs):
+        started = self._starts.pop(event_id, None)
+        if started is not None:
+            stage, start = started
+            record_span(stage, time.perf_counter() - start)
+
+    def start_trace(self, trace_id=None):
+        pass
+
+    def end_trace(self, trace_id=None, trace_map=None):
+        pass
+
+    @staticmethod
+    def _stage_name(event_type, payload):
+        if event_type == CBEventType.FUNCTION_CALL:
+            tool = (payload or {}).get(EventPayload.TOOL)
+            return f"tool_{getattr(tool, 'name', 'unknown')}"
+        return EVENT_STAGES.get(event_type)
@@ -0,0 +1,157 @@
+"""
+TTS 輸出音訊的編碼：WAV / OGG(Opus) / MP3，可調整位元率與取樣率。
+
+- WAV 且不改取樣率時直接回傳 TTS 的原始 bytes，不做任何處理
+- 其他格式以 torchaudio.io.StreamWriter（libav）在 process 內編碼，不會每個請求 fork 一個 ffmpeg 子行程
+- 取樣率轉換由 libav 的 filter 完成（WAV 則用 torchaudio.functional.resample）
+- TTS 的 PCM WAV 以標準庫 wave 讀取，不經過 torchaudio 的 I/O backend（sox backend 不接受 bytes）
+
+Opus 只接受 8/12/16/24/48 kHz，指定其他取樣率時會取最接近且不低於它的值。
+"""
+import io
+import os
+import wave
+from dataclasses import dataclass, replace
+
+import numpy as np
+import torch
+import torchaudio
+from torchaudio.io import CodecConfig, StreamWriter
+
+from utils.AudioRuntime import FILE_LIKE_BACKENDS, resolve_audio_backend
+from utils.RequestTracer import metrics
+
+output_bytes = metrics.counter('audio_output_bytes_total', 'Bytes of encoded response audio by codec.', ('codec',))
+outputs = metrics.counter('audio_outputs_total', 'Encoded response audio clips by codec.', ('codec',))
+
+CODECS = {
+    'wav': {'format': 'wav', 'encoder': 'pcm_s16le', 'mimetype': 'audio/wav', 'extension': 'wav'},
+    'opus': {'format': 'ogg', 'encoder': 'libopus', 'mimetype': 'audio/ogg', 'extension': 'ogg'},
+    'mp3': {'format': 'mp3', 'encoder': 'libmp3lame', 'mimetype': 'audio/mpeg', 'extension': 'mp3'},
+}
+
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# wave 讀出的 PCM 每個 sample 的 bytes 數 -> numpy dtype（8-bit WAV 為無號整數）
+PCM_DTYPES = {1: np.dtype('u1'), 2: np.dtype('<i2'), 4: np.dtype('<i4')}
+
+@dataclass
+class EncodingConfig:
+    """
+    回傳音訊的編碼設定。可由 .env 覆寫預設值（見 from_env），每個請求也可以個別指定（見 override）。
+
+    - codec: "wav"、"opus"（OGG 容器）或 "mp3"
+    - bitrate_kbps: None 代表使用編碼器預設值（WAV 忽略）
+    - sample_rate: None 代表保留 TTS 輸出的取樣率
+    """
+    codec: str = "wav"
+    bitrate_kbps: int = None
+    sample_rate: int = None
+
+    def __post_init__(self):
+        if self.codec not in CODECS:
+            raise ValueError(f"Unknown audio format: {self.codec}（可用：{', '.join(CODECS)}）")
+        if self.bitrate_kbps is not None and self.bitrate_kbps <= 0:
+            raise ValueError(f"Invalid audio bitrate: {self.bitrate_kbps}")
+        if self.sample_rate is not None and self.sample_rate <= 0:
+            raise ValueError(f"Invalid audio sample rate: {self.sample_rate}")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            codec=os.getenv("AUDIO_FORMAT", "wav"),
+            bitrate_kbps=int(os.getenv("AUDIO_BITRATE_KBPS", 0)) or None,
+            sample_rate=int(os.getenv("AUDIO_SAMPLE_RATE", 0)) or None
+        )
+
+    def override(self, codec=None, bitrate_kbps=None, sample_rate=None):
+        """
+        以請求中有指定的欄位覆寫，回傳新的設定。
+        """
+        changes = {key: value for key, value in
+                   (('codec', codec), ('bitrate_kbps', bitrate_kbps), ('sample_rate', sample_rate)) if value}
+        return replace(self, **changes) if changes else self
+
+    @property
+    def mimetype(self):
+        return CODECS[self.codec]['mimetype']
+
+    @property
+    def extension(self):
+        return CODECS[self.codec]['extension']
+
+@dataclass
+class EncodedAudio:
+    data: bytes
+    codec: str
+    mimetype: str
+    extension: str
+
+def encode_audio(wav_bytes, config):
+    """
+    把 TTS 回傳的 WAV bytes 依 config 編碼，回傳 EncodedAudio。
+    """
+    if config.codec == 'wav' and config.sample_rate is None:
+        data = wav_bytes
+    else:
+        waveform, sample_rate = _read_wav(wav_bytes)
+        if config.codec == 'wav':
+            data = _write_wav(torchaudio.functional.resample(waveform, sample_rate, config.sample_rate), config.sample_rate)
+        else:
+            data = _stream_write(waveform, sample_rate, config)
+    output_bytes.inc((config.codec,), len(data))
+    outputs.inc((config.codec,))
+    return EncodedAudio(data, config.codec, config.mimetype, config.extension)
+
+def _read_wav(wav_bytes):
+    """
+    回傳 ((channels, frames) float32 tensor, 取樣率)。
+    wave 讀不了的 WAV（float、24-bit 等）才交給能讀 bytes 的 torchaudio backend（FILE_LIKE_BACKENDS）。
+    """
+    try:
+        with wave.open(io.BytesIO(wav_bytes), 'rb') as wav_file:
+            channels, width, sample_rate = wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getframerate()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError):
+        width = None
+    if width not in PCM_DTYPES:
+        return torchaudio.load(io.BytesIO(wav_bytes), backend=resolve_audio_backend(FILE_LIKE_BACKENDS))
+
+    # 串流產生的 WAV 檔頭長度可能不正確，只取完整的 frame
+    usable = len(frames) - len(frames) % (width * channels)
+    samples = np.frombuffer(frames[:usable], dtype=PCM_DTYPES[width]).astype(np.float32)
+    if width == 1:
+        samples = (samples - 128.0) / 128.0
+    else:
+        samples /= float(2 ** (8 * width - 1))
+    return torch.from_numpy(samples.reshape(-1, channels).T.copy()), sample_rate
+
+def _write_wav(waveform, sample_rate):
+    pcm = (waveform.clamp(-1.0, 1.0) * 32767).round().to(torch.int16).t().contiguous()
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(waveform.shape[0])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.numpy().tobytes())
+    return buffer.getvalue()
+
+def _stream_write(waveform, sample_rate, config):
+    codec = CODECS[config.codec]
+    target_rate = config.sample_rate or sample_rate
+    if config.codec == 'opus':
+        target_rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= target_rate), OPUS_SAMPLE_RATES[-1])
+
+    buffer = io.BytesIO()
+    writer = StreamWriter(dst=buffer, format=codec['format'])
+    writer.add_audio_stream(
+        sample_rate=sample_rate,
+        num_channels=waveform.shape[0],
+        encoder=codec['encoder'],
+        encoder_sample_rate=target_rate,
+        codec_config=CodecConfig(bit_rate=config.bitrate_kbps * 1000) if config.bitrate_kbps else None
+    )
+    with writer.open():
+        # StreamWriter 的輸入為 (frames, channels)
+        writer.write_audio_chunk(0, waveform.t().contiguous())
+    return buffer.getvalue()
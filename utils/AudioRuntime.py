@@ -0,0 +1,128 @@
+# utils/AudioRuntime.py
+"""
+整個 process 共用的音訊執行環境：
+
+- resolve_audio_backend(): 每組偏好順序只在第一次呼叫時挑選 torchaudio 的 I/O backend，之後直接回傳結果。
+  不再呼叫已棄用的 torchaudio.set_audio_backend，而是在 load/save 時以 backend= 參數指定。
+  sox backend 只能讀檔案路徑，bytes / file-like 改用 FILE_LIKE_BACKENDS（ffmpeg、soundfile）。
+- load_denoiser_model(): 同一組 (模型, 裝置, 最佳化方式) 只載入一次，所有 Denoiser 共用同一份權重。
+- configure_threads(): 設定 PyTorch intra-op / inter-op 執行緒數，避免降噪與 Whisper 同時執行時把 CPU 核心搶爆。
+- decode_audio(): 上傳的音檔只在 process 內解碼一次成 16kHz 單聲道 float32，直接交給降噪與辨識。
+- cuda_available(): 不初始化 CUDA 就判斷有沒有 GPU，gunicorn master 用來決定能不能在 fork 前載入模型。
+"""
+import io
+import logging
+import os
+import threading
+
+import torch
+import torchaudio
+from denoiser import pretrained
+
+logger = logging.getLogger('AudioRuntime')
+
+_lock = threading.Lock()
+_audio_backends = {}
+_denoiser_models = {}
+_threads_configured = False
+
+# torchaudio 的 sox backend 不接受 file-like 物件，只能讀檔案路徑
+FILE_LIKE_BACKENDS = ("ffmpeg", "soundfile")
+
+class AudioBackendError(RuntimeError):
+    """
+    這台主機沒有可用的 torchaudio backend（例如缺少 FFmpeg 函式庫又沒有 soundfile）；是伺服器的設定問題，不是音檔的問題。
+    """
+    pass
+
+def resolve_audio_backend(preferred=("ffmpeg", "sox", "soundfile")):
+    with _lock:
+        if preferred not in _audio_backends:
+            available_backends = torchaudio.list_audio_backends()
+            logger.info(f"Available torchaudio backends: {available_backends}")
+            for backend in preferred:
+                if backend in available_backends:
+                    _audio_backends[preferred] = backend
+                    break
+            else:
+                raise AudioBackendError(f"No suitable torchaudio backend found (wanted one of {', '.join(preferred)}).")
+            logger.info(f"Using torchaudio backend: {_audio_backends[preferred]}")
+        return _audio_backends[preferred]
+
+def load_denoiser_model(model_name="dns64", device="cpu", optimize=None):
+    """
+    optimize（未指定時讀取 DENOISE_OPTIMIZE）:
+    - None / "": 原始 fp32 模型
+    - "quantize": 對 LSTM/Linear 做 int8 dynamic quantization（僅 CPU），減少記憶體並加快 bottleneck LSTM
+
+    Demucs 的 padding 長度會隨輸入長度變化，trace 出來的 TorchScript 只適用單一長度，所以不提供 TorchScript 選項。
+    """
+    if optimize is None:
+        optimize = os.getenv("DENOISE_OPTIMIZE", "")
+    key = (model_name, str(device), optimize)
+    with _lock:
+        if key not in _denoiser_models:
+            model = getattr(pretrained, model_name)().to(device)
+            model.eval()
+            if optimize == "quantize":
+                if str(device) != "cpu":
+                    raise ValueError("DENOISE_OPTIMIZE=quantize 只支援 CPU")
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8)
+            elif optimize:
+                raise ValueError(f"Unknown denoiser optimization: {optimize}")
+            _denoiser_models[key] = model
+            logger.info(f"Loaded denoiser model {model_name} on {device} (optimize={optimize or 'none'})")
+        return _denoiser_models[key]
+
+def configure_threads(intra_op=None, inter_op=None, processes=1, force=False):
+    """
+    intra_op（TORCH_NUM_THREADS）：單一運算可以使用的執行緒數，預設為 CPU 核心數 / (2 * processes)，
+    因為每個 process 的降噪與 Whisper 兩條推論路徑可能同時在跑。
+    inter_op（TORCH_INTEROP_THREADS）：只能在第一次平行運算之前設定，之後的設定會被忽略。
+    force：fork 出來的 worker 需要依 worker 數重新設定。
+    """
+    global _threads_configured
+    with _lock:
+        if _threads_configured and not force:
+            return
+        intra_op = intra_op or int(os.getenv("TORCH_NUM_THREADS", 0)) or max(1, (os.cpu_count() or 2) // (2 * processes))
+        inter_op = inter_op or int(os.getenv("TORCH_INTEROP_THREADS", 0))
+        torch.set_num_threads(intra_op)
+        if inter_op:
+            try:
+                torch.set_num_interop_threads(inter_op)
+            except RuntimeError as e:
+                logger.warning(f"Unable to set inter-op threads: {e}")
+        _threads_configured = True
+        logger.info(f"torch threads: intra-op={torch.get_num_threads()} inter-op={torch.get_num_interop_threads()}")
+
+def cuda_available():
+    """
+    以 NVML 檢查有沒有可用的 GPU，不會建立 CUDA context，之後 fork 出來的 worker 仍然可以使用 CUDA。
+    Denoiser 與 Whisper 有 GPU 時都會自動使用 cuda。
+    """
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    return torch.cuda.is_available()
+
+def decode_audio(source, sample_rate=16000):
+    """
+    在 process 內把上傳的音檔（路徑、bytes 或 file-like）解碼一次，轉成 sample_rate 單聲道 float32 numpy 陣列。
+    使用 resolve_audio_backend() 選到的 torchaudio backend（ffmpeg backend 走 libav，不會 fork ffmpeg 子行程）。
+    file-like 有對應的檔案時（例如寫在 scratch 資料夾的上傳檔）改讀檔案路徑，任何 backend 都能讀；
+    沒有檔案路徑時只使用能讀 file-like 的 backend（FILE_LIKE_BACKENDS）。
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    path = getattr(source, 'name', None)
+    if isinstance(path, str) and os.path.isfile(path):
+        source.flush()
+        source = path
+    if isinstance(source, (str, os.PathLike)):
+        backend = resolve_audio_backend()
+    else:
+        backend = resolve_audio_backend(FILE_LIKE_BACKENDS)
+    wav, sr = torchaudio.load(source, backend=backend)
+    wav = wav.mean(dim=0)
+    if sr != sample_rate:
+        wav = torchaudio.functional.resample(wav, sr, sample_rate)
+    return wav.numpy().astype('float32', copy=False)
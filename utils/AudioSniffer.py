@@ -0,0 +1,24 @@
+"""
+以檔頭的 magic bytes 判斷上傳音檔的格式，不相信用戶端給的檔名與副檔名。
+
+- wav: "RIFF" + 4 bytes 長度 + "WAVE"
+- ogg: "OggS"（Opus / Vorbis）
+- mp3: "ID3" 標籤，或沒有標籤時直接以 MPEG audio frame sync 開頭（11 個 1，layer 不為保留值）
+"""
+SNIFF_BYTES = 12
+
+def sniff_audio_format(header):
+    """
+    header 為檔案開頭至少 SNIFF_BYTES 個 bytes，回傳 "wav"、"ogg"、"mp3"，無法辨識時回傳 None。
+    """
+    if len(header) >= 12 and header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:3] == b'ID3':
+        return 'mp3'
+    # frame sync；version 01 與 layer 00 是保留值（layer 00 也是 AAC ADTS 的檔頭）
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 \
+            and header[1] & 0x18 != 0x08 and header[1] & 0x06 != 0x00:
+        return 'mp3'
+    return None
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from utils.ScratchStorage import record_write
+
+AUDIO_ID_PATTERN = re.compile(r'^[0-9a-f]{32}\.(wav|ogg|mp3)$')
+
+class AudioStore:
+    """
+    以內容雜湊命名的語音檔存放區，供 /audio/<audio_id> 重複下載、續傳與快取。
+
+    audio_id 為 sha256 前 32 個十六進位字元加上副檔名（例如 "3f2a...9c.ogg"），
+    同樣的內容只會存一份，也可以直接當 ETag 使用；檔案內容永遠不會改變，所以可以長期快取。
+    檔案的清理由 ScratchStorage 的 janitor 負責（依修改時間與總容量）。
+    """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, data, extension):
+        audio_id = f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+        path = os.path.join(self.root, audio_id)
+        try:
+            # 已經存在：更新修改時間，常用的語音（例如固定的招呼語）不會被 janitor 當成舊檔刪掉
+            os.utime(path)
+        except FileNotFoundError:
+            # 先寫暫存檔再改名，同時下載的請求不會讀到寫到一半的檔案
+            fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            record_write('audio', len(data))
+        return audio_id
+
+    def path(self, audio_id):
+        """
+        回傳 audio_id 對應的檔案路徑；格式不對（例如含有 ../）或檔案不存在時回傳 None。
+        """
+        if not AUDIO_ID_PATTERN.match(audio_id):
+            return None
+        path = os.path.join(self.root, audio_id)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def etag(audio_id):
+        return audio_id.split('.', 1)[0]
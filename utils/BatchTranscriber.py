@@ -0,0 +1,116 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+import whisper
+from whisper.audio import SAMPLE_RATE, N_SAMPLES
+
+from utils.AudioRuntime import decode_audio
+from utils.VoiceActivityDetector import trim_silence
+
+class BatchTranscriber:
+    """
+    把同時進來的多個轉錄請求合併成一個 batch 交給 Whisper 解碼。
+
+    submit() 立即回傳 Future；背景執行緒收到第一個請求後最多再等 max_wait_ms，
+    把期間內（最多 max_batch_size 個）同語言的請求疊成一個 (B, n_mels, 3000) 的 log-Mel batch，
+    一次 encoder + decoder forward 後再把結果分回各自的 Future。
+
+    超過 30 秒的音訊或非 openai-whisper backend 無法併批，會在同一個背景執行緒逐一處理，
+    因此所有 Whisper 推論都集中在這個執行緒，不會有多執行緒同時使用同一個模型的問題。
+    """
+    def __init__(self, transcriber, max_batch_size=8, max_wait_ms=20):
+        self.transcriber = transcriber
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._logger = logging.getLogger('BatchTranscriber')
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        # 執行緒不會跟著 fork 到子行程（gunicorn --preload），在新的 process 第一次使用時重新啟動
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._worker, args=(self._queue,), daemon=True)
+                self._thread.start()
+
+    def submit(self, audio, language=None):
+        # language 未指定時使用 transcriber.config.language
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((audio, language or self.transcriber.config.language, future))
+        return future
+
+    def transcribe(self, audio, language=None):
+        # 與 WhisperTranscriber.transcribe 相同的介面，方便直接替換
+        return self.submit(audio, language).result()
+
+    def _worker(self, requests):
+        while True:
+            batch = [requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch):
+        groups = {}
+        for audio, language, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if isinstance(audio, str):
+                    audio = decode_audio(audio, SAMPLE_RATE)
+                if self.transcriber.model is None:
+                    # faster-whisper 等其他 backend：逐一處理
+                    future.set_result(self.transcriber.transcribe(audio, language))
+                    continue
+                audio, _ = trim_silence(audio, SAMPLE_RATE)
+                if len(audio) > N_SAMPLES:
+                    # 長音訊需要多個視窗，走原本的 chunked 流程
+                    future.set_result(self.transcriber.transcribe_chunked(audio, language))
+                    continue
+                groups.setdefault(language, []).append((audio, future))
+            except Exception as e:
+                future.set_exception(e)
+
+        for language, items in groups.items():
+            try:
+                self._decode_batch(language, items)
+            except Exception as e:
+                self._logger.error(f"Batch decode failed: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _decode_batch(self, language, items):
+        start = time.perf_counter()
+        mel = torch.stack([self.transcriber.prepare_mel(audio) for audio, _ in items])
+        longest = max(len(audio) for audio, _ in items) / SAMPLE_RATE
+        # encoder 整個 batch 只跑一次，重解時沿用同一份 audio features
+        features = self.transcriber.embed_audio(mel)
+        # language 為 None 時由 whisper.decode 在同一次 forward 裡逐筆偵測
+        options = self.transcriber.decoding_options(language, longest)
+        results = whisper.decode(self.transcriber.model, features, options)
+        fallback_temperatures = self.transcriber.config.temperatures[1:]
+        for index, ((audio, future), result) in enumerate(zip(items, results)):
+            if fallback_temperatures and self.transcriber.needs_fallback(result):
+                # 只有不可靠的那幾筆才用較高溫度單獨重解
+                result = self.transcriber.decode_with_fallback(
+                    features[index], result.language, len(audio) / SAMPLE_RATE, temperatures=fallback_temperatures)
+            future.set_result(self.transcriber.result_text(result))
+        self._logger.info("batch=%d language=%s longest=%.2fs decode=%.3fs",
+                          len(items), language, longest, time.perf_counter() - start)
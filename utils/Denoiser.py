@@ -2,36 +2,42 @@
 import torch
 import torchaudio
 import subprocess
-from denoiser import pretrained
+import os
+from denoiser.demucs import DemucsStreamer
 from denoiser.dsp import convert_audio
 import logging
 
+from utils.AudioRuntime import configure_threads, load_denoiser_model, resolve_audio_backend
+from utils.RequestTracer import metrics
+from utils.VoiceActivityDetector import estimate_snr
+
+# 每段音訊是否經過 dns64，相除即略過降噪的比例（見 DENOISE_SNR_THRESHOLD）
+denoise_decisions = metrics.counter(
+    'denoise_decisions_total', 'Denoiser decisions per clip (denoise or bypass).', ('decision',))
+
 class Denoiser:
-    def __init__(self, model_path='dns64', device=None):
+    def __init__(self, model_path='dns64', device=None, chunk_seconds=10.0, overlap_seconds=0.5, snr_threshold=None):
+        # 超過 chunk_seconds 的音訊會切成固定長度、以 overlap_seconds 交叉淡入淡出的片段（overlap-add），記憶體用量固定
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+
+        # 估計的 SNR（dB）高於門檻就視為乾淨音訊，直接跳過 dns64；未指定時讀取 DENOISE_SNR_THRESHOLD，設為空字串代表一律降噪
+        if snr_threshold is None:
+            snr_threshold = os.getenv("DENOISE_SNR_THRESHOLD", "30")
+        self.snr_threshold = float(snr_threshold) if snr_threshold != "" else None
+
         # 自動判斷使用 GPU 還是 CPU
         self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"[INFO] Using device: {self.device}")
 
-        # 自動選擇 torchaudio backend
-        available_backends = torchaudio.list_audio_backends()
-        print(f"[INFO] Available torchaudio backends: {available_backends}")
-        for backend in ["sox_io", "soundfile", "sox"]:
-            if backend in available_backends:
-                try:
-                    torchaudio.set_audio_backend(backend)
-                    print(f"[INFO] Using torchaudio backend: {backend}")
-                    break
-                except:
-                    pass
-        else:
-            raise RuntimeError("No suitable torchaudio backend found.")
-        
-        # self.model = pretrained.dns64().to(device)
-        self.model = pretrained.dns64().to(self.device)
+        # torchaudio backend、模型權重與執行緒設定都由 AudioRuntime 在整個 process 內只處理一次
+        configure_threads()
+        self.audio_backend = resolve_audio_backend()
+        self.model = load_denoiser_model(model_path, self.device)
 
     def load_audio(self, file_path):
         try:
-            wav, sr = torchaudio.load(file_path)
+            wav, sr = torchaudio.load(file_path, backend=self.audio_backend)
             return wav.to(self.device), sr
         except Exception as e:
             logging.getLogger('Denoiser').error(f"Failed to load audio file: {e}")
@@ -39,13 +45,76 @@ class Denoiser:
 
     def denoise_audio(self, wav, sr):
         wav = convert_audio(wav, sr, self.model.sample_rate, self.model.chin)
+        if not self.should_denoise(wav):
+            return wav
+        if wav.shape[-1] > (self.chunk_seconds + self.overlap_seconds) * self.model.sample_rate:
+            return self.denoise_chunked(wav)
         with torch.no_grad():
             denoised = self.model(wav[None])[0]
         return denoised
 
+    def should_denoise(self, wav):
+        if self.snr_threshold is None:
+            denoise_decisions.inc(('denoise',))
+            return True
+        snr_db, noise_floor_db = estimate_snr(wav[0].cpu().numpy(), self.model.sample_rate)
+        denoise = snr_db < self.snr_threshold
+        denoise_decisions.inc(('denoise' if denoise else 'bypass',))
+        logging.getLogger('Denoiser').info(
+            "SNR=%.1fdB noise_floor=%.1fdBFS threshold=%.1fdB -> %s",
+            snr_db, noise_floor_db, self.snr_threshold, "denoise" if denoise else "bypass"
+        )
+        return denoise
+
+    def denoise_chunked(self, wav):
+        # wav: (chin, T)，已經是 model.sample_rate
+        chunk = int(self.chunk_seconds * self.model.sample_rate)
+        overlap = int(self.overlap_seconds * self.model.sample_rate)
+        hop = chunk - overlap
+        length = wav.shape[-1]
+        fade_in = torch.linspace(0.0, 1.0, overlap, device=wav.device)
+        fade_out = 1.0 - fade_in
+
+        denoised = torch.zeros(self.model.chout, length, device=wav.device)
+        start = 0
+        while True:
+            piece = wav[:, start:start + chunk]
+            with torch.no_grad():
+                out = self.model(piece[None])[0][..., :piece.shape[-1]]
+            if start > 0:
+                out[..., :overlap] *= fade_in
+            last = start + chunk >= length
+            if not last:
+                out[..., -overlap:] *= fade_out
+            denoised[..., start:start + out.shape[-1]] += out
+            if last:
+                return denoised
+            start += hop
+
+    def streamer(self, num_frames=4):
+        # 即時音訊用：逐段 feed 16kHz 音訊，回傳已經可以使用的降噪結果
+        return StreamingDenoiser(self, num_frames=num_frames)
+
+    def stream(self, chunks, num_frames=4):
+        # chunks: 逐段進來的 model.sample_rate 單聲道 float32 numpy 陣列
+        streamer = self.streamer(num_frames)
+        for chunk in chunks:
+            out = streamer.feed(chunk)
+            if len(out):
+                yield out
+        out = streamer.flush()
+        if len(out):
+            yield out
+
+    def denoise_array(self, samples, sr):
+        # samples: 單聲道 float32 numpy 陣列，回傳 model.sample_rate 取樣率的降噪結果
+        wav = torch.from_numpy(samples).float().unsqueeze(0).to(self.device)
+        denoised = self.denoise_audio(wav, sr)
+        return denoised[0].cpu().numpy()
+
     def save_audio(self, audio_tensor, file_path, sample_rate):
         try:
-            torchaudio.save(file_path, audio_tensor.cpu(), sample_rate)
+            torchaudio.save(file_path, audio_tensor.cpu(), sample_rate, backend=self.audio_backend)
         except Exception as e:
             logging.getLogger('Denoiser').error(f"Failed to save audio file: {e}")
             raise
@@ -61,6 +130,28 @@ class Denoiser:
         if output_mp3:
             self.convert_to_mp3(output_wav, output_mp3)
 
+class StreamingDenoiser:
+    """
+    包裝 denoiser 的 DemucsStreamer，一次處理 num_frames 個 frame，只保留必要的前後文，
+    不需要等整段上傳完成就能開始降噪，記憶體用量與音訊長度無關。
+    輸入與輸出皆為 model.sample_rate（dns64 為 16kHz）的單聲道 float32 numpy 陣列。
+    """
+    def __init__(self, denoiser, num_frames=4):
+        self.device = denoiser.device
+        self.sample_rate = denoiser.model.sample_rate
+        self._streamer = DemucsStreamer(denoiser.model, dry=0, num_frames=num_frames)
+
+    def feed(self, samples):
+        wav = torch.from_numpy(samples).float()[None].to(self.device)
+        with torch.no_grad():
+            out = self._streamer.feed(wav)
+        return out[0].cpu().numpy()
+
+    def flush(self):
+        with torch.no_grad():
+            out = self._streamer.flush()
+        return out[0].cpu().numpy()
+
 if __name__ == '__main__':
     denoiser = Denoiser()
     denoiser.process('..\tests\test.wav', 'denoised.wav', 'denoised.mp3')
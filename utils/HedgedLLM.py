@@ -0,0 +1,66 @@
+from typing import Any, List, Tuple
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.llm import LLM
+
+from utils.Hedging import LatencyTracker, hedged_call, hedged_stream
+
+
+class HedgedLLM(LLM):
+    """
+    包裝多個 LLM 的備援鏈（primary → secondary → ...），介面與一般 llama_index LLM 相同，可直接設為 Settings.llm。
+
+    - 前一個 backend 超過自己的 p95 延遲還沒回應時，同時送出下一個（hedged request），先回應的獲勝
+    - 前一個 backend 出錯時立即改用下一個
+    - 串流以第一個 chunk 的到達時間比賽
+    - 每個 backend 的延遲記錄在 LatencyTracker，並輸出到 /metrics
+
+    token 用量與 trace 由各個 backend 自己的 callback 記錄，所以被丟棄的 hedge 請求也會算進費用。
+    async 介面只使用 primary。
+    """
+    _backends: List[Tuple[str, LLM]] = PrivateAttr()
+    _tracker: LatencyTracker = PrivateAttr()
+
+    def __init__(self, backends, tracker=None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._backends = list(backends)
+        self._tracker = tracker or LatencyTracker()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HedgedLLM"
+
+    @property
+    def metadata(self):
+        return self._backends[0][1].metadata
+
+    @property
+    def tracker(self):
+        return self._tracker
+
+    def _attempts(self, method, *args, **kwargs):
+        return [(name, lambda llm=llm: getattr(llm, method)(*args, **kwargs)) for name, llm in self._backends]
+
+    def chat(self, messages, **kwargs):
+        return hedged_call(self._attempts('chat', messages, **kwargs), self._tracker)
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        return hedged_call(self._attempts('complete', prompt, formatted=formatted, **kwargs), self._tracker)
+
+    def stream_chat(self, messages, **kwargs):
+        return hedged_stream(self._attempts('stream_chat', messages, **kwargs), self._tracker)
+
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        return hedged_stream(self._attempts('stream_complete', prompt, formatted=formatted, **kwargs), self._tracker)
+
+    async def achat(self, messages, **kwargs):
+        return await self._backends[0][1].achat(messages, **kwargs)
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        return await self._backends[0][1].acomplete(prompt, formatted=formatted, **kwargs)
+
+    async def astream_chat(self, messages, **kwargs):
+        return await self._backends[0][1].astream_chat(messages, **kwargs)
+
+    async def astream_complete(self, prompt, formatted=False, **kwargs):
+        return await self._backends[0][1].astream_complete(prompt, formatted=formatted, **kwargs)
@@ -0,0 +1,161 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from utils.InferenceScheduler import percentile
+from utils.RequestTracer import metrics
+
+backend_seconds = metrics.histogram(
+    'llm_backend_seconds', 'Latency (or time to first chunk for streams) of each LLM backend.', 'backend')
+backend_launches = metrics.counter(
+    'llm_backend_requests_total', 'LLM requests sent to each backend, by reason (primary, hedge, fallback).',
+    ('backend', 'reason'))
+backend_results = metrics.counter(
+    'llm_backend_results_total', 'LLM backend outcomes (win, lose, error).', ('backend', 'result'))
+
+logger = logging.getLogger('Hedging')
+
+
+class LatencyTracker:
+    """
+    記錄每個 backend 最近 window 次的延遲，hedge_delay() 以 p95 決定要等多久才送出備援請求。
+    樣本數不足 min_samples 時使用 default_delay。
+    """
+    def __init__(self, window=200, percentile_q=95, min_delay=1.0, default_delay=8.0, min_samples=10):
+        self.window = window
+        self.percentile_q = percentile_q
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+        backend_seconds.observe(name, seconds)
+
+    def hedge_delay(self, name):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, percentile(samples, self.percentile_q))
+
+    def stats(self):
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+        return {name: {'count': len(samples), 'p50': percentile(samples, 50), 'p95': percentile(samples, 95)}
+                for name, samples in snapshot.items()}
+
+
+class _Outcome:
+    """
+    比賽結果：decided 在 _race 結束（不論勝負或全部失敗）時設定，winner 為獲勝的 attempt index。
+    """
+    def __init__(self):
+        self.decided = threading.Event()
+        self.winner = None
+
+
+def _drain(name, iterator):
+    # llama_index 的串流要讀完才會送出 LLM 的 on_event_end，輸掉的串流也讀完，token 用量與 trace 才不會少記
+    try:
+        for _ in iterator:
+            pass
+    except Exception as e:
+        logger.debug(f"Discarded stream from {name} failed: {e}")
+
+
+def _launch(attempts, index, reason, results, tracker, first_chunk, outcome):
+    name, call = attempts[index]
+    backend_launches.inc((name, reason))
+    # 每個嘗試各自複製一份 contextvars，讓 callback（trace、token 用量）仍然記在原本的請求上
+    context = contextvars.copy_context()
+
+    def run():
+        start = time.perf_counter()
+        try:
+            value = call()
+            if first_chunk:
+                # 串流：等到第一個 chunk 才算有回應
+                iterator = iter(value)
+                value = (next(iterator, None), iterator)
+            tracker.record(name, time.perf_counter() - start)
+            results.put((True, index, value))
+        except Exception as e:
+            backend_results.inc((name, 'error'))
+            logger.warning(f"LLM backend {name} failed: {e}")
+            results.put((False, index, e))
+            return
+        if first_chunk:
+            # 串流輸掉時在這個執行緒（與原本請求相同的 contextvars）讀完其餘 chunk 再丟棄
+            outcome.decided.wait()
+            if outcome.winner != index:
+                _drain(name, value[1])
+
+    threading.Thread(target=context.run, args=(run,), daemon=True).start()
+
+
+def _race(attempts, tracker, first_chunk):
+    """
+    依序啟動 attempts（[(name, callable), ...]），回傳 (index, value)：
+    - 前一個嘗試超過它的 p95 延遲還沒回應時，送出下一個（hedge），先回應的獲勝
+    - 前一個嘗試失敗時，立即送出下一個（fallback）
+    全部失敗時丟出最後一個錯誤。輸掉的請求不會被中斷，只是結果被丟棄；輸掉的串流在背景讀完（見 _drain）。
+    """
+    results = queue.Queue()
+    outcome = _Outcome()
+    try:
+        return _run_race(attempts, tracker, first_chunk, results, outcome)
+    finally:
+        outcome.decided.set()
+
+
+def _run_race(attempts, tracker, first_chunk, results, outcome):
+    _launch(attempts, 0, 'primary', results, tracker, first_chunk, outcome)
+    launched, pending, error, failed = 1, 1, None, set()
+    while True:
+        timeout = tracker.hedge_delay(attempts[launched - 1][0]) if launched < len(attempts) else None
+        try:
+            ok, index, value = results.get(timeout=timeout)
+        except queue.Empty:
+            logger.info(f"Hedging: {attempts[launched - 1][0]} slower than its p95, also asking {attempts[launched][0]}")
+            _launch(attempts, launched, 'hedge', results, tracker, first_chunk, outcome)
+            launched += 1
+            pending += 1
+            continue
+        pending -= 1
+        if ok:
+            outcome.winner = index
+            backend_results.inc((attempts[index][0], 'win'))
+            for other in range(launched):
+                if other != index and other not in failed:
+                    backend_results.inc((attempts[other][0], 'lose'))
+            return index, value
+        failed.add(index)
+        error = value
+        if launched < len(attempts):
+            _launch(attempts, launched, 'fallback', results, tracker, first_chunk, outcome)
+            launched += 1
+            pending += 1
+        elif pending == 0:
+            raise error
+
+
+def hedged_call(attempts, tracker):
+    _, value = _race(attempts, tracker, first_chunk=False)
+    return value
+
+
+def hedged_stream(attempts, tracker):
+    """
+    串流版本：以第一個 chunk 的到達時間比賽，獲勝者的其餘 chunk 直接在呼叫端繼續讀取。
+    """
+    _, (first, iterator) = _race(attempts, tracker, first_chunk=True)
+    if first is not None:
+        yield first
+    yield from iterator
@@ -0,0 +1,148 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+VOICE = 0
+BACKGROUND = 10
+
+
+class QueueFullError(RuntimeError):
+    """
+    推論佇列已滿時由 submit() 丟出，retry_after 是建議用戶端幾秒後重試。
+    """
+    def __init__(self, stage, depth, retry_after):
+        super().__init__(f"Inference queue is full ({depth} pending), rejected stage '{stage}'")
+        self.stage = stage
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class InferenceScheduler:
+    """
+    CPU 密集的推論（降噪、Whisper）專用的工作池，與 Flask 處理 HTTP 的執行緒分開。
+
+    - submit(stage, fn, ...) 把工作放進優先佇列並立即回傳 Future；priority 數字越小越先執行，
+      語音請求（VOICE）會排在背景工作（BACKGROUND）前面，同優先權則先進先出。
+    - 等待中的工作超過 max_queue 時直接丟出 QueueFullError，讓 API 回 503，而不是無限排隊到逾時。
+    - 每個 stage 記錄最近 history 筆的排隊時間與執行時間，stats() 回傳平均值與 p95。
+    - track(stage, submit, ...) 給有自己執行緒的元件（例如 BatchTranscriber）：工作不佔用這裡的 worker，
+      但一樣計入排隊上限與 stats，worker 不會卡在等待其他元件的結果。
+
+    PyTorch / numpy 的運算會釋放 GIL，而且所有 worker 共用同一份已載入的模型，所以用執行緒而不是 process。
+    """
+    def __init__(self, workers=2, max_queue=16, history=500):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.history = history
+        self._logger = logging.getLogger('InferenceScheduler')
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._pending = 0
+        self._samples = {}
+        self._pid = None
+
+    def _ensure_workers(self):
+        # 執行緒不會跟著 fork 到子行程（gunicorn --preload），在新的 process 第一次使用時才啟動
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = 0
+            self._queue = queue.PriorityQueue()
+            for _ in range(self.workers):
+                threading.Thread(target=self._worker, args=(self._queue,), daemon=True).start()
+
+    def submit(self, stage, fn, *args, priority=VOICE, **kwargs):
+        with self._lock:
+            self._ensure_workers()
+            if self._pending >= self.max_queue:
+                raise QueueFullError(stage, self._pending, self.retry_after())
+            self._pending += 1
+            self._sequence += 1
+            future = Future()
+            self._queue.put((priority, self._sequence, stage, time.perf_counter(), fn, args, kwargs, future))
+        return future
+
+    def track(self, stage, submit, *args, **kwargs):
+        """
+        呼叫 submit(*args, **kwargs)（需回傳 Future）並把這個工作計入佇列深度，直到 Future 完成；
+        佇列已滿時丟出 QueueFullError。stats 的 wait 記為 0，run 為送出到完成的時間。
+        """
+        with self._lock:
+            self._ensure_workers()
+            if self._pending >= self.max_queue:
+                raise QueueFullError(stage, self._pending, self.retry_after())
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def finished(_):
+            with self._lock:
+                self._pending -= 1
+            self._record(stage, 0.0, time.perf_counter() - submitted)
+
+        try:
+            future = submit(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(finished)
+        return future
+
+    def run(self, stage, fn, *args, priority=VOICE, **kwargs):
+        return self.submit(stage, fn, *args, priority=priority, **kwargs).result()
+
+    @property
+    def depth(self):
+        return self._pending
+
+    def retry_after(self):
+        # 以目前排隊數量與平均執行時間估計清空佇列需要幾秒，至少 1 秒
+        runs = [run for samples in self._samples.values() for _, run in samples]
+        average = sum(runs) / len(runs) if runs else 1.0
+        return max(1, int(self._pending * average / self.workers + 0.999))
+
+    def stats(self):
+        with self._lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+            result = {'depth': self._pending, 'max_queue': self.max_queue, 'workers': self.workers, 'stages': {}}
+        for stage, samples in snapshot.items():
+            waits = sorted(wait for wait, _ in samples)
+            runs = sorted(run for _, run in samples)
+            result['stages'][stage] = {
+                'count': len(samples),
+                'wait_avg': sum(waits) / len(waits),
+                'wait_p95': percentile(waits, 95),
+                'run_avg': sum(runs) / len(runs),
+                'run_p95': percentile(runs, 95),
+            }
+        return result
+
+    def _worker(self, jobs):
+        while True:
+            _, _, stage, queued_at, fn, args, kwargs, future = jobs.get()
+            with self._lock:
+                self._pending -= 1
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finished = time.perf_counter()
+            self._record(stage, started - queued_at, finished - started)
+
+    def _record(self, stage, wait, run):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.history)).append((wait, run))
+        self._logger.info("stage=%s wait=%.3fs run=%.3fs depth=%d", stage, wait, run, self._pending)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+import time
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.utilities.token_counting import TokenCounter
+
+from utils.RequestTracer import current_trace, metrics
+
+llm_tokens = metrics.counter(
+    'llm_tokens_total', 'LLM tokens by scope (agent or tool_<name>) and kind.', ('scope', 'kind'))
+llm_calls = metrics.counter('llm_calls_total', 'LLM calls by scope.', ('scope',))
+llm_cost = metrics.counter('llm_cost_usd_total', 'Estimated LLM cost in USD by scope.', ('scope',))
+llm_seconds = metrics.histogram('llm_call_seconds', 'Latency of each LLM call in seconds.', 'scope')
+
+
+def llm_prices():
+    """
+    每百萬 token 的美元價格，預設為 gpt-4o-mini，可用 .env 覆寫。
+    """
+    return {
+        'prompt': float(os.getenv("LLM_PRICE_INPUT_PER_1M", 0.15)),
+        'cached': float(os.getenv("LLM_PRICE_CACHED_INPUT_PER_1M", 0.075)),
+        'completion': float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", 0.60)),
+    }
+
+
+def _field(obj, name):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def extract_usage(response):
+    """
+    從 ChatResponse / CompletionResponse 的 raw（OpenAI 回傳的 usage）取出 (prompt, completion, cached) token 數，
+    沒有 usage（例如串流回應）時回傳 None。
+    """
+    usage = _field(_field(response, 'raw'), 'usage')
+    if usage is None or _field(usage, 'prompt_tokens') is None:
+        return None
+    cached = _field(_field(usage, 'prompt_tokens_details'), 'cached_tokens') or 0
+    return _field(usage, 'prompt_tokens'), _field(usage, 'completion_tokens') or 0, cached
+
+
+class LLMUsageHandler(BaseCallbackHandler):
+    """
+    llama_index 的 callback handler，記錄每次 LLM 呼叫的 token 數、次數、耗時與估計費用。
+
+    - scope：LLM 呼叫若發生在 tool call 底下（例如 CitationQueryEngine 的回答合成）記為 tool_<工具名稱>，
+      否則是 ReAct agent 本身的推理，記為 agent
+    - 每個請求的總量寫進目前的 trace（請求結束時的 log），全部累計在 /metrics
+    - 每個 agent step 結束時寫一行 log，列出這一步用掉的 token
+    - OpenAI 有回傳 usage 時使用實際數字（含 cached_tokens），串流回應沒有 usage 時以 tokenizer 估計
+    """
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self._events = {}
+        self._steps = {}
+        self._lock = threading.Lock()
+        self._token_counter = TokenCounter()
+        self._logger = logging.getLogger('LLMUsage')
+
+    def on_event_start(self, event_type, payload=None, event_id="", parent_id="", **kwargs):
+        label = None
+        if event_type == CBEventType.FUNCTION_CALL:
+            tool = (payload or {}).get(EventPayload.TOOL)
+            label = f"tool_{getattr(tool, 'name', 'unknown')}"
+        with self._lock:
+            self._events[event_id] = (event_type, parent_id, label, time.perf_counter())
+            if event_type == CBEventType.AGENT_STEP:
+                self._steps[event_id] = {'calls': 0, 'prompt': 0, 'completion': 0, 'cached': 0}
+        return event_id
+
+    def on_event_end(self, event_type, payload=None, event_id="", **kwargs):
+        with self._lock:
+            event = self._events.get(event_id)
+        if event is None:
+            return
+        try:
+            if event_type == CBEventType.LLM:
+                self._record_llm(event_id, event, payload or {})
+            elif event_type == CBEventType.AGENT_STEP:
+                with self._lock:
+                    step = self._steps.pop(event_id, None)
+                trace = current_trace()
+                if step and step['calls']:
+                    self._logger.info(
+                        f"[Request ID: {trace.request_id if trace else '-'}] agent step: llm_calls={step['calls']} "
+                        f"prompt={step['prompt']} (cached={step['cached']}) completion={step['completion']}")
+        finally:
+            with self._lock:
+                self._events.pop(event_id, None)
+
+    def start_trace(self, trace_id=None):
+        pass
+
+    def end_trace(self, trace_id=None, trace_map=None):
+        pass
+
+    def _record_llm(self, event_id, event, payload):
+        _, parent_id, _, start = event
+        seconds = time.perf_counter() - start
+        scope, step_id = self._scope(parent_id)
+
+        response = payload.get(EventPayload.RESPONSE) or payload.get(EventPayload.COMPLETION)
+        usage = extract_usage(response)
+        if usage is None:
+            usage = (self._estimate_prompt(payload), self._estimate_completion(response), 0)
+        prompt, completion, cached = usage
+
+        prices = llm_prices()
+        cost = ((prompt - cached) * prices['prompt'] + cached * prices['cached']
+                + completion * prices['completion']) / 1_000_000
+
+        llm_calls.inc((scope,))
+        llm_tokens.inc((scope, 'prompt'), prompt)
+        llm_tokens.inc((scope, 'cached'), cached)
+        llm_tokens.inc((scope, 'completion'), completion)
+        llm_cost.inc((scope,), cost)
+        llm_seconds.observe(scope, seconds)
+
+        trace = current_trace()
+        if trace is not None:
+            trace.add('llm_calls')
+            trace.add('llm_prompt_tokens', prompt)
+            trace.add('llm_cached_tokens', cached)
+            trace.add('llm_completion_tokens', completion)
+            trace.add('llm_cost_usd', cost)
+        with self._lock:
+            step = self._steps.get(step_id)
+            if step is not None:
+                step['calls'] += 1
+                step['prompt'] += prompt
+                step['completion'] += completion
+                step['cached'] += cached
+
+    def _scope(self, parent_id):
+        # 往上找：最近的 tool call 決定 scope，最近的 agent step 用來彙總這一步的用量
+        scope, step_id = None, None
+        with self._lock:
+            while parent_id in self._events:
+                event_type, next_parent, label, _ = self._events[parent_id]
+                if scope is None and label is not None:
+                    scope = label
+                if step_id is None and event_type == CBEventType.AGENT_STEP:
+                    step_id = parent_id
+                parent_id = next_parent
+        return scope or 'agent', step_id
+
+    def _estimate_prompt(self, payload):
+        messages = payload.get(EventPayload.MESSAGES)
+        if messages:
+            return self._token_counter.estimate_tokens_in_messages(messages)
+        prompt = payload.get(EventPayload.PROMPT)
+        return self._token_counter.get_string_tokens(str(prompt)) if prompt else 0
+
+    def _estimate_completion(self, response):
+        text = _field(_field(response, 'message'), 'content') or _field(response, 'text') or ''
+        return self._token_counter.get_string_tokens(str(text)) if text else 0
@@ -0,0 +1,193 @@
+import contextvars
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = contextvars.ContextVar('request_trace', default=None)
+
+
+def format_value(value):
+    return str(value) if isinstance(value, int) else f"{value:.6f}"
+
+
+class Histogram:
+    """
+    Prometheus 格式的累積直方圖，以單一 label（例如 stage、route）區分不同序列。
+    """
+    def __init__(self, name, help_text, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        with self._lock:
+            series = self._series.setdefault(label_value, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += seconds
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{label_value}"'
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{label}}} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return "\n".join(lines)
+
+
+class Counter:
+    """
+    Prometheus 格式的累加計數器，可以有多個 label（例如 scope + kind）。
+    """
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[tuple(label_values)] = self._values.get(tuple(label_values), 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                label = ",".join(f'{key}="{val}"' for key, val in zip(self.labels, label_values))
+                lines.append(f'{self.name}{{{label}}} {format_value(value)}')
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, label, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, label, buckets)
+            return self._metrics[name]
+
+    def counter(self, name, help_text, labels):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text, labels)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            collected = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in collected) + "\n"
+
+
+metrics = MetricsRegistry()
+stage_histogram = metrics.histogram(
+    'voice_pipeline_stage_seconds', 'Duration of each pipeline stage in seconds.', 'stage')
+request_histogram = metrics.histogram(
+    'http_request_duration_seconds', 'Duration of HTTP requests in seconds.', 'route')
+
+
+class RequestTrace:
+    """
+    單一請求的各階段耗時。以 request.id 為 key 寫進 log，並轉成 Server-Timing 標頭。
+    """
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.spans = []
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.spans.append((name, seconds))
+        stage_histogram.observe(name, seconds)
+
+    def add(self, name, amount=1):
+        # 與耗時無關的累計值，例如這個請求用掉的 LLM token 數
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def totals(self):
+        # 同名的階段（例如多次 tool call、多段語音）加總，保留第一次出現的順序
+        totals = {}
+        for name, seconds in self.spans:
+            count, total = totals.get(name, (0, 0.0))
+            totals[name] = (count + 1, total + seconds)
+        return totals
+
+    def server_timing(self):
+        entries = []
+        for name, (count, total) in self.totals().items():
+            token = re.sub(r'[^A-Za-z0-9_\-]', '_', name)
+            description = f';desc="x{count}"' if count > 1 else ''
+            entries.append(f"{token};dur={total * 1000:.1f}{description}")
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+    def summary(self):
+        parts = [f"{name}={total:.3f}s" for name, (_, total) in self.totals().items()]
+        parts += [f"{name}={format_value(value)}" for name, value in self.counters.items()]
+        return " ".join(parts)
+
+
+def start_trace(request_id):
+    trace = RequestTrace(request_id)
+    _current_trace.set(trace)
+    return trace
+
+
+def end_trace():
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_span(name):
+    """
+    在目前請求的 trace 記錄一個階段；不在請求內（例如 CLI、背景執行緒）時只更新直方圖。
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace.span(name):
+            yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_histogram.observe(name, time.perf_counter() - start)
+
+
+def record_span(name, seconds):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(name, seconds)
+    else:
+        stage_histogram.observe(name, seconds)
+    logging.getLogger('RequestTracer').debug(f"{name} took {seconds:.3f}s")
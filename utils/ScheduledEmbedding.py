@@ -0,0 +1,48 @@
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from utils.InferenceScheduler import BACKGROUND, VOICE, InferenceScheduler
+
+
+class ScheduledEmbedding(BaseEmbedding):
+    """
+    包裝本地 embedding 模型（e5），推論改在 InferenceScheduler 的工作池中執行，介面與一般 llama_index embedding 相同，可直接設為 Settings.embed_model。
+
+    - 檢索時的 query embedding 在參觀者的請求路徑上，以 VOICE 優先權與降噪排在同一個佇列
+    - 建立索引時的文件 embedding 以 BACKGROUND 優先權執行，不會搶在語音請求前面
+    - 與降噪共用工作池的執行緒數，不會在請求執行緒上另外搶 torch 的 CPU 執行緒；排隊已滿時一樣丟出 QueueFullError
+
+    callback（trace 的 embedding span）由這一層記錄，包裝的模型只呼叫內部方法，不會重複記錄。
+    """
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _scheduler: InferenceScheduler = PrivateAttr()
+
+    def __init__(self, embed_model, scheduler, **kwargs: Any):
+        super().__init__(model_name=embed_model.model_name, embed_batch_size=embed_model.embed_batch_size, **kwargs)
+        self._embed_model = embed_model
+        self._scheduler = scheduler
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ScheduledEmbedding"
+
+    @property
+    def embed_model(self):
+        return self._embed_model
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._scheduler.run('embedding', self._embed_model._get_query_embedding, query, priority=VOICE)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._scheduler.run('embedding', self._embed_model._get_text_embedding, text, priority=BACKGROUND)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._scheduler.run('embedding', self._embed_model._get_text_embeddings, texts, priority=BACKGROUND)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
@@ -0,0 +1,175 @@
+import logging
+import os
+import shutil
+import threading
+import time
+
+from utils.RequestTracer import current_trace, metrics
+
+BYTE_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+
+written_bytes = metrics.counter(
+    'scratch_bytes_written_total', 'Bytes written to scratch storage by area.', ('area',))
+removed_bytes = metrics.counter(
+    'scratch_bytes_removed_total', 'Bytes removed from scratch storage by reason (request, age, quota).', ('reason',))
+request_bytes = metrics.histogram(
+    'scratch_request_bytes', 'Bytes written to scratch storage per request.', 'route', BYTE_BUCKETS)
+
+
+def record_write(area, nbytes):
+    """
+    記錄寫入暫存區的 bytes：累加到 /metrics，並記在目前請求的 trace（請求結束時觀測到 scratch_request_bytes）。
+    """
+    written_bytes.inc((area,), nbytes)
+    trace = current_trace()
+    if trace is not None:
+        trace.add('scratch_bytes', nbytes)
+
+
+def tree_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+class ScratchStorage:
+    """
+    所有暫存檔的統一存放區（SCRATCH_DIR；展場可以放在 /dev/shm 等 tmpfs，不耗損 SD 卡或硬碟）。
+
+    - area(name): 長期保留的區域，例如 audio（/audio/<audio_id> 的語音），由 janitor 依時間與容量清理
+    - request_dir(request_id): 每個請求自己的資料夾，請求結束時 release() 整個刪除；
+      程式中途出錯沒有 release 的資料夾，超過 request_max_age 後由 janitor 清掉
+
+    背景 janitor 每 sweep_interval 秒執行一次 sweep()：
+    1. 刪除超過 max_age 秒沒有修改的檔案，以及超過 request_max_age 秒的請求資料夾
+    2. 總大小仍超過 max_bytes 時，從最舊的檔案開始刪除（進行中的請求資料夾不刪）
+    """
+    REQUESTS = 'requests'
+
+    def __init__(self, root, max_age=3600, request_max_age=600, max_bytes=1024 ** 3, sweep_interval=60):
+        self.root = root
+        self.max_age = max_age
+        self.request_max_age = request_max_age
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._requests_root = os.path.join(root, self.REQUESTS)
+        os.makedirs(self._requests_root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._logger = logging.getLogger('ScratchStorage')
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("SCRATCH_DIR", os.path.join(os.getcwd(), 'scratch')),
+            max_age=float(os.getenv("SCRATCH_MAX_AGE_SECONDS", 3600)),
+            request_max_age=float(os.getenv("SCRATCH_REQUEST_MAX_AGE_SECONDS", 600)),
+            max_bytes=int(float(os.getenv("SCRATCH_MAX_MB", 1024)) * 1024 * 1024),
+            sweep_interval=float(os.getenv("SCRATCH_SWEEP_SECONDS", 60))
+        )
+
+    def area(self, name):
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def request_dir(self, request_id):
+        path = os.path.join(self._requests_root, request_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def release(self, request_id):
+        path = os.path.join(self._requests_root, request_id)
+        if os.path.isdir(path):
+            removed_bytes.inc(('request',), tree_size(path))
+            shutil.rmtree(path, ignore_errors=True)
+
+    def start_janitor(self):
+        # 執行緒不會跟著 fork 到子行程（gunicorn --preload），每個 process 第一次呼叫時各自啟動
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._janitor, daemon=True).start()
+
+    def _janitor(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if any(removed.values()):
+                    self._logger.info(f"Scratch cleanup: {removed}")
+            except Exception as e:
+                self._logger.warning(f"Scratch cleanup failed: {e}")
+
+    def sweep(self, now=None):
+        """
+        清理一次，回傳依原因（age / quota）刪除的 bytes。
+        多個 worker 同時清理同一個資料夾時，已被其他 worker 刪掉的檔案直接略過。
+        """
+        now = now or time.time()
+        removed = {'age': 0, 'quota': 0}
+
+        active_bytes = 0
+        for entry in self._scandir(self._requests_root):
+            size = tree_size(entry.path)
+            if now - self._mtime(entry.path, now) > self.request_max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed['age'] += size
+            else:
+                active_bytes += size
+
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root and self.REQUESTS in dirnames:
+                dirnames.remove(self.REQUESTS)
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    if self._remove(path):
+                        removed['age'] += stat.st_size
+                else:
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        total = active_bytes + sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                removed['quota'] += size
+            total -= size
+
+        for reason, amount in removed.items():
+            if amount:
+                removed_bytes.inc((reason,), amount)
+        return removed
+
+    @staticmethod
+    def _scandir(path):
+        try:
+            return [entry for entry in os.scandir(path) if entry.is_dir()]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _mtime(path, default):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return default
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
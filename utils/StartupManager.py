@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+PENDING = 'pending'
+LOADING = 'loading'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+@dataclass
+class Component:
+    name: str
+    load: object = None
+    warm_up: object = None
+    after: tuple = ()
+    required: bool = True
+    network: bool = False
+    state: str = PENDING
+    load_seconds: float = None
+    warmup_seconds: float = None
+    error: str = None
+
+    def status(self):
+        status = {'state': self.state, 'required': self.required,
+                  'load_seconds': self.load_seconds, 'warmup_seconds': self.warmup_seconds}
+        if self.error:
+            status['error'] = self.error
+        return status
+
+
+class StartupManager:
+    """
+    分階段載入服務的各個元件（embedding、ChatBot、dns64、Whisper、TTS ...），提供 /readyz 使用的就緒狀態。
+
+    - add(name, load, warm_up, after) 登記元件：load 載入模型，warm_up 用一小段假資料跑一次推論，
+      after 列出必須先載入完成的元件（例如 ChatBot 要等 embedding 模型）
+    - network=True 的元件會連到其他 server（TTS、本地 LLM），run(network=False) 時先略過，
+      留給 fork 之後的 worker 再 run()，連線才不會被 gunicorn master 與所有 worker 共用
+    - run() 以執行緒同時載入彼此沒有相依的元件；每個元件整個 process 只執行一次，
+      同時呼叫 run() 時後來的會等前一次結束
+    - 相依的元件載入失敗時，後面的元件直接標記為 failed；required=False 的元件失敗不影響 ready
+
+    PyTorch 載入權重與推論大多會釋放 GIL，所以用執行緒平行載入。
+    """
+    def __init__(self):
+        self._components = {}
+        self._run_lock = threading.Lock()
+        self._running = False
+        self._started_at = None
+        self._seconds = None
+        self._logger = logging.getLogger('StartupManager')
+
+    def add(self, name, load=None, warm_up=None, after=(), required=True, network=False):
+        for dependency in after:
+            if dependency not in self._components:
+                raise ValueError(f"Unknown startup dependency '{dependency}' for '{name}'")
+        self._components[name] = Component(name, load, warm_up, tuple(after), required, network)
+        return self
+
+    def start(self, warm_up=True, network=True):
+        """
+        在背景執行緒執行 run()，立即回傳（開發用 server 可以先開始接受 /healthz、/readyz）。
+        """
+        self._running = True
+        threading.Thread(target=self.run, args=(warm_up, network), daemon=True).start()
+
+    def run(self, warm_up=True, network=True):
+        """
+        載入所有還沒執行過的元件（network=False 時略過 network 元件），回傳 ready。
+        """
+        with self._run_lock:
+            self._running = True
+            start = time.perf_counter()
+            if self._started_at is None:
+                self._started_at = start
+            try:
+                self._run_stages(warm_up, network)
+            finally:
+                # 分成 master / worker 兩次執行時，只加總實際載入的時間
+                self._seconds = (self._seconds or 0.0) + time.perf_counter() - start
+                self._running = False
+            summary = ", ".join(f"{c.name}={c.state}" for c in self._components.values())
+            self._logger.info(f"Startup finished in {self._seconds:.2f}s: {summary}")
+        return self.ready
+
+    def _run_stages(self, warm_up, network):
+        pending = {name: component for name, component in self._components.items()
+                   if component.state == PENDING and (network or not component.network)}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix='startup') as executor:
+            while pending or running:
+                # 依登記順序檢查，相依的元件一定先登記，所以失敗會在同一輪一路傳下去
+                for name, component in list(pending.items()):
+                    states = [self._components[dependency].state for dependency in component.after]
+                    if FAILED in states:
+                        failed = [d for d in component.after if self._components[d].state == FAILED]
+                        component.state = FAILED
+                        component.error = f"dependency failed: {', '.join(failed)}"
+                        del pending[name]
+                    elif all(state == READY for state in states):
+                        running[executor.submit(self._load, component, warm_up)] = name
+                        del pending[name]
+                if not running:
+                    # 剩下的元件依賴這次沒有執行的 network 元件
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+
+    def _load(self, component, warm_up):
+        try:
+            if component.load is not None:
+                component.state = LOADING
+                start = time.perf_counter()
+                component.load()
+                component.load_seconds = round(time.perf_counter() - start, 3)
+            if warm_up and component.warm_up is not None:
+                component.state = WARMING
+                start = time.perf_counter()
+                component.warm_up()
+                component.warmup_seconds = round(time.perf_counter() - start, 3)
+            component.state = READY
+            self._logger.info(
+                f"{component.name} ready (load={component.load_seconds}s, warm-up={component.warmup_seconds}s)")
+        except Exception as e:
+            component.state = FAILED
+            component.error = str(e)
+            log = self._logger.error if component.required else self._logger.warning
+            log(f"{component.name} failed to start: {e}", exc_info=component.required)
+
+    @property
+    def ready(self):
+        return self._started_at is not None and not self._running and all(
+            component.state == READY for component in self._components.values() if component.required)
+
+    def status(self):
+        if self._running:
+            state = LOADING
+        elif self._started_at is None:
+            state = PENDING
+        else:
+            state = READY if self.ready else FAILED
+        return {
+            'ready': self.ready,
+            'state': state,
+            'seconds': round(self._seconds, 3) if self._seconds is not None else None,
+            'components': {name: component.status() for name, component in self._components.items()}
+        }
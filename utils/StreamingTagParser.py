@@ -0,0 +1,85 @@
+import re
+
+
+class StreamingTagParser:
+    """
+    逐段解析 LLM streaming 輸出中的 <action>N</action> 標籤。
+
+    每次 feed() 一段 token，回傳已經確定「不是標籤」、可以直接送去 TTS 的文字；
+    被切在兩段 token 之間的標籤會先暫存，直到能判斷它是不是完整標籤為止。
+    偵測到標籤時會立即呼叫 on_action(action)，不必等整段回答生成完畢。
+    """
+    OPEN_TAG = "<action>"
+    CLOSE_TAG = "</action>"
+    TAG_PATTERN = re.compile(r'<action>(\d+)</action>')
+
+    def __init__(self, on_action=None):
+        self.on_action = on_action
+        self.actions = []
+        self._buffer = ""
+
+    @property
+    def action(self):
+        # 與 parse_custom_tag 相同：取第一個標籤，沒有則為 -1
+        return self.actions[0] if self.actions else -1
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        spoken = []
+        while self._buffer:
+            start = self._buffer.find('<')
+            if start == -1:
+                spoken.append(self._buffer)
+                self._buffer = ""
+                break
+
+            spoken.append(self._buffer[:start])
+            self._buffer = self._buffer[start:]
+
+            match = self.TAG_PATTERN.match(self._buffer)
+            if match:
+                self._publish(int(match.group(1)))
+                self._buffer = self._buffer[match.end():]
+            elif self._is_partial_tag(self._buffer):
+                # 標籤被切斷了，等下一段 token 再判斷
+                break
+            else:
+                spoken.append('<')
+                self._buffer = self._buffer[1:]
+        return "".join(spoken)
+
+    def flush(self):
+        # 串流結束時還沒收完的「標籤」其實只是普通文字
+        remaining, self._buffer = self._buffer, ""
+        return remaining
+
+    def _publish(self, action):
+        self.actions.append(action)
+        if self.on_action:
+            self.on_action(action)
+
+    def _is_partial_tag(self, text):
+        if len(text) < len(self.OPEN_TAG):
+            return self.OPEN_TAG.startswith(text)
+        if not text.startswith(self.OPEN_TAG):
+            return False
+        inner = text[len(self.OPEN_TAG):]
+        digits = len(inner) - len(inner.lstrip('0123456789'))
+        tail = inner[digits:]
+        if not tail:
+            return True
+        return digits > 0 and self.CLOSE_TAG.startswith(tail)
+
+
+def parse_stream(response_gen, on_action=None):
+    """
+    包裝 response_gen，逐段產生去除 <action> 標籤後的文字。
+    """
+    parser = StreamingTagParser(on_action=on_action)
+    for token in response_gen:
+        text = parser.feed(token)
+        if text:
+            yield text
+    text = parser.flush()
+    if text:
+        yield text
@@ -0,0 +1,179 @@
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """
+    以能量為基礎的即時語音活動偵測（VAD）。
+
+    - feed(samples)：送入一段 16-bit PCM 轉成的 float32 音訊，回傳已經結束（遇到停頓）的語音片段。
+    - end_of_utterance：講完話後靜音超過 end_of_utterance_ms 時會變成 True，代表使用者說完了。
+    - flush()：串流結束時取出最後一段還沒結束的語音。
+
+    噪音底限（noise floor）會隨著非語音音框自動調整，所以不同展場環境不需要手動調門檻。
+    """
+    def __init__(self, sample_rate=16000, frame_ms=30, margin_db=10.0, min_speech_db=-50.0,
+                 pause_ms=500, end_of_utterance_ms=1200, pre_roll_ms=200, min_speech_ms=150,
+                 max_segment_ms=25000):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        if self.frame_size <= 0:
+            raise ValueError(f"sample_rate {sample_rate} is too low for {frame_ms}ms frames")
+        self.margin_db = margin_db
+        self.min_speech_db = min_speech_db
+        self.pause_frames = max(1, pause_ms // frame_ms)
+        self.end_frames = max(1, end_of_utterance_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_segment_frames = max_segment_ms // frame_ms
+
+        self.noise_floor_db = None
+        self.has_speech = False
+        self.end_of_utterance = False
+
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pre_roll = []
+        self._segment = []
+        self._speech_frames = 0
+        self._silence_run = 0
+        self._in_speech = False
+
+    def is_speech(self, energy_db):
+        if self.noise_floor_db is None:
+            self.noise_floor_db = energy_db
+        speech = energy_db > max(self.noise_floor_db + self.margin_db, self.min_speech_db)
+        if not speech:
+            # 只在非語音音框更新噪音底限，上升慢、下降快
+            rate = 0.05 if energy_db > self.noise_floor_db else 0.5
+            self.noise_floor_db += rate * (energy_db - self.noise_floor_db)
+        return speech
+
+    def feed(self, samples):
+        samples = np.concatenate([self._pending, np.asarray(samples, dtype=np.float32)])
+        n_frames = len(samples) // self.frame_size
+        self._pending = samples[n_frames * self.frame_size:]
+        if n_frames == 0:
+            return []
+
+        frames = samples[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        energies = frame_energy_db(frames.reshape(-1), self.frame_size)
+
+        segments = []
+        for frame, energy_db in zip(frames, energies):
+            segment = self._process_frame(frame, self.is_speech(float(energy_db)))
+            if segment is not None:
+                segments.append(segment)
+        return segments
+
+    def flush(self):
+        segment = None
+        if self._in_speech and self._speech_frames >= self.min_speech_frames:
+            segment = self._close_segment()
+        self._reset_segment()
+        return segment
+
+    def _process_frame(self, frame, speech):
+        if not self._in_speech:
+            if speech:
+                self._in_speech = True
+                self._segment = self._pre_roll + [frame]
+                self._pre_roll = []
+                self._speech_frames = 1
+                self._silence_run = 0
+                return None
+
+            self._pre_roll.append(frame)
+            if len(self._pre_roll) > self.pre_roll_frames:
+                self._pre_roll.pop(0)
+            if self.has_speech:
+                self._silence_run += 1
+                if self._silence_run >= self.end_frames:
+                    self.end_of_utterance = True
+            return None
+
+        self._segment.append(frame)
+        if speech:
+            self._speech_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+
+        if self._silence_run >= self.pause_frames:
+            # 停頓夠久，結束這一段
+            segment = None
+            if self._speech_frames >= self.min_speech_frames:
+                segment = self._close_segment()
+            silence_run = self._silence_run
+            self._reset_segment()
+            if self.has_speech:
+                self._silence_run = silence_run
+                if self._silence_run >= self.end_frames:
+                    self.end_of_utterance = True
+            return segment
+
+        if len(self._segment) >= self.max_segment_frames:
+            # Whisper 一次只能看 30 秒，太長就強制切段
+            segment = self._close_segment()
+            self._segment = []
+            self._speech_frames = 0
+            self._silence_run = 0
+            return segment
+        return None
+
+    def _close_segment(self):
+        # 保留一小段停頓當作結尾，其餘靜音丟掉
+        keep = len(self._segment) - max(0, self._silence_run - self.pre_roll_frames)
+        segment = np.concatenate(self._segment[:keep])
+        self.has_speech = True
+        return segment
+
+    def _reset_segment(self):
+        self._in_speech = False
+        self._segment = []
+        self._speech_frames = 0
+        self._silence_run = 0
+
+
+def frame_energy_db(audio, frame_size):
+    """
+    把音訊切成不重疊的音框，一次算出每個音框的 RMS 能量（dBFS）。
+    """
+    n_frames = len(audio) // frame_size
+    frames = np.asarray(audio[:n_frames * frame_size], dtype=np.float32).reshape(n_frames, frame_size)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def estimate_snr(audio, sample_rate=16000, frame_ms=30, noise_percentile=10, speech_percentile=95):
+    """
+    快速估計整段音訊的訊噪比，回傳 (snr_db, noise_floor_db)。
+    噪音底限取音框能量的低百分位數，語音強度取高百分位數，兩者相減即為 SNR。
+    """
+    energy_db = frame_energy_db(audio, int(sample_rate * frame_ms / 1000))
+    if len(energy_db) == 0:
+        return 0.0, -100.0
+    noise_floor_db, speech_db = np.percentile(energy_db, [noise_percentile, speech_percentile])
+    return float(speech_db - noise_floor_db), float(noise_floor_db)
+
+
+def trim_silence(audio, sample_rate=16000, frame_ms=30, margin_db=10.0, min_speech_db=-50.0, max_silence_db=-40.0,
+                 padding_ms=200):
+    """
+    去掉頭尾的靜音，回傳 (trimmed_audio, start_sample)。
+    噪音底限取所有音框能量的第 10 百分位數，門檻為底限 + margin_db，並限制在 [min_speech_db, max_silence_db] dBFS 之間：
+    頭尾沒有靜音的音訊，第 10 百分位數其實是語音本身，門檻不設上限會把開頭、結尾較小聲的音節切掉。
+    整段都沒有語音時原樣回傳。
+    """
+    frame_size = int(sample_rate * frame_ms / 1000)
+    energy_db = frame_energy_db(audio, frame_size)
+    if len(energy_db) == 0:
+        return audio, 0
+    threshold = min(max(np.percentile(energy_db, 10) + margin_db, min_speech_db), max_silence_db)
+
+    voiced = np.flatnonzero(energy_db > threshold)
+    if len(voiced) == 0:
+        return audio, 0
+
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(0, voiced[0] * frame_size - padding)
+    end = min(len(audio), (voiced[-1] + 1) * frame_size + padding)
+    return audio[start:end], start
@@ -1,44 +1,263 @@
+import logging
+import os
+import time
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+import torch
 import whisper
+from whisper.audio import SAMPLE_RATE, N_SAMPLES, N_FRAMES
+
+from utils.AudioRuntime import decode_audio
+from utils.VoiceActivityDetector import trim_silence
+
+# 展場常見專有名詞，當作 Whisper 的 initial prompt 可以提高族名、部落名的辨識率，也讓輸出偏向繁體中文
+DEFAULT_INITIAL_PROMPT = (
+    "以下是臺東大學 AI 導覽員與參觀民眾的對話，內容包含臺灣原住民族："
+    "阿美族、排灣族、卑南族、布農族、魯凱族、達悟族、雅美族、泰雅族、賽夏族、鄒族、邵族、"
+    "噶瑪蘭族、太魯閣族、撒奇萊雅族、賽德克族、拉阿魯哇族、卡那卡那富族，以及博物館文物與部落。"
+)
+
+@dataclass
+class TranscriptionConfig:
+    """
+    Whisper 轉錄設定，每次呼叫只套用一次。可由 .env 覆寫（見 from_env）。
+
+    - language: 語言代碼，None 代表自動偵測（每次呼叫最多偵測一次）
+    - task: "transcribe" 或 "translate"
+    - beam_size: None 代表 greedy，只在 temperature 為 0 時使用
+    - temperatures: 解碼結果不可靠（壓縮率過高或平均 logprob 過低）時依序改用的溫度
+    - no_speech_threshold: no_speech_prob 高於此值且平均 logprob 過低時視為沒有人說話（與 whisper.transcribe 相同），
+      不再換溫度重解、也不輸出文字；None 代表不判斷
+    - fp16: None 代表 GPU 用 fp16、CPU 用 fp32
+    - initial_prompt: 提供給解碼器的前文，放入展場詞彙
+    """
+    language: str = "zh"
+    task: str = "transcribe"
+    beam_size: int = None
+    temperatures: tuple = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+    compression_ratio_threshold: float = 2.4
+    logprob_threshold: float = -1.0
+    no_speech_threshold: float = 0.6
+    fp16: bool = None
+    initial_prompt: str = DEFAULT_INITIAL_PROMPT
+
+    @classmethod
+    def from_env(cls):
+        config = cls()
+        if os.getenv("STT_LANGUAGE") is not None:
+            config.language = os.getenv("STT_LANGUAGE") or None
+        if os.getenv("STT_TASK"):
+            config.task = os.getenv("STT_TASK")
+        if os.getenv("STT_BEAM_SIZE"):
+            config.beam_size = int(os.getenv("STT_BEAM_SIZE")) or None
+        if os.getenv("STT_TEMPERATURES"):
+            config.temperatures = tuple(float(t) for t in os.getenv("STT_TEMPERATURES").split(","))
+        if os.getenv("STT_NO_SPEECH_THRESHOLD") is not None:
+            threshold = os.getenv("STT_NO_SPEECH_THRESHOLD")
+            config.no_speech_threshold = float(threshold) if threshold else None
+        if os.getenv("STT_FP16"):
+            config.fp16 = os.getenv("STT_FP16").lower() == "true"
+        if os.getenv("STT_INITIAL_PROMPT") is not None:
+            config.initial_prompt = os.getenv("STT_INITIAL_PROMPT") or None
+        return config
 
 class WhisperTranscriber:
-    def __init__(self, model_name="medium"):
+    def __init__(self, model_name="medium", mode="chunked", backend=None, compute_type=None, config=None):
         """
         - "tiny": 最小的模型，適合快速識別，但精度較低。
         - "base": 平衡了速度和精度的模型。
         - "small": 小型模型，精度和速度適中。
         - "medium": 中型模型，精度較高，適合需要較高識別質量的場景。
         - "large": 最大的模型，提供最高的精度，適用於計算資源充足的情況。
+
+        mode:
+        - "chunked": 先去除頭尾靜音，只對實際長度算 log-Mel，超過 30 秒的音訊切成多個視窗依序解碼。
+        - "single": 舊的做法，只解碼前 30 秒（超過 30 秒的部分會被截掉）。
+
+        backend（未指定時讀取 .env 的 STT_BACKEND）:
+        - "openai-whisper": 預設，PyTorch fp32/fp16。
+        - "faster-whisper": CTranslate2 int8 量化（compute_type 未指定時讀取 STT_COMPUTE_TYPE，預設 int8），
+          需另外安裝 faster-whisper，mode 對此 backend 無效。
+
+        config: TranscriptionConfig，未指定時由 .env 產生。
         """
+        self.backend_name = backend or os.getenv("STT_BACKEND", "openai-whisper")
+        self.mode = mode
+        self.config = config or TranscriptionConfig.from_env()
+        self.last_timings = {}
+        self.backend = None
+        self.model = None
+
+        if self.backend_name == "faster-whisper":
+            from utils.FasterWhisperBackend import FasterWhisperBackend
+            self.backend = FasterWhisperBackend(
+                model_name, compute_type=compute_type or os.getenv("STT_COMPUTE_TYPE", "int8")
+            )
+        elif self.backend_name == "openai-whisper":
+            # Load the specified Whisper model
+            self.model = whisper.load_model(model_name)
+        else:
+            raise ValueError(f"Unknown STT backend: {self.backend_name}")
 
-        # Load the specified Whisper model
-        self.model = whisper.load_model(model_name)
+    def transcribe(self, audio, language=None):
+        # audio 可以是檔案路徑，或是已經解碼好的 16kHz float32 numpy 陣列
+        # language 未指定時使用 config.language
+        language = language or self.config.language
+        if self.backend is not None:
+            text = self.backend.transcribe(audio, language, self.config)
+            self.last_timings = self.backend.last_timings
+            return text
+        return self._transcribe(audio, language, chunked=self.mode == "chunked")
 
-    def transcribe(self, audio_path, language="zh"):
-        # Load the audio file from the given path
-        audio = whisper.load_audio(audio_path)
-        audio = whisper.pad_or_trim(audio)
+    def transcribe_chunked(self, audio, language=None):
+        return self._transcribe(audio, language or self.config.language, chunked=True)
 
-        # Make log-Mel spectrogram and move to the same device as the model
-        mel = whisper.log_mel_spectrogram(audio).to(self.model.device)
+    def _transcribe(self, audio, language, chunked):
+        timings = {}
+        start = time.perf_counter()
+        if isinstance(audio, str):
+            audio = decode_audio(audio, SAMPLE_RATE)
+        timings['load'] = time.perf_counter() - start
 
-        if language == 'zh':
-            # 設定識別選項，包括指定語言為中文
-            options = whisper.DecodingOptions(language=language)
+        if chunked:
+            stage = time.perf_counter()
+            audio, _ = trim_silence(audio, SAMPLE_RATE)
+            timings['trim'] = time.perf_counter() - stage
+            windows = self.split_windows(audio)
         else:
-            # Detect the spoken language
-            _, probs = self.model.detect_language(mel)
-            detected_language = max(probs, key=probs.get)
-            print(f"Detected language: {detected_language}")
+            windows = [audio[:N_SAMPLES]]
+        timings['audio_seconds'] = len(audio) / SAMPLE_RATE
+
+        texts = []
+        timings['mel'] = 0.0
+        timings['encode'] = 0.0
+        timings['detect'] = 0.0
+        timings['decode'] = 0.0
+        for window in windows:
+            stage = time.perf_counter()
+            mel = self.prepare_mel(window)
+            timings['mel'] += time.perf_counter() - stage
+
+            # encoder 每個視窗只跑一次，語言偵測與各溫度的解碼共用同一份 audio features
+            stage = time.perf_counter()
+            features = self.embed_audio(mel)
+            timings['encode'] += time.perf_counter() - stage
+
+            if language is None:
+                # 只在第一個視窗偵測一次，後面的視窗沿用
+                stage = time.perf_counter()
+                language = self.detect_language(features)
+                timings['detect'] = time.perf_counter() - stage
 
+            stage = time.perf_counter()
+            result = self.decode_with_fallback(features, language, len(window) / SAMPLE_RATE, "".join(texts)[-200:])
+            timings['decode'] += time.perf_counter() - stage
+            texts.append(self.result_text(result))
 
-        # Decode the audio
-        options = whisper.DecodingOptions()
-        result = whisper.decode(self.model, mel, options)
+        timings['language'] = language
+        timings['windows'] = len(windows)
+        timings['total'] = time.perf_counter() - start
+        self.last_timings = timings
+        logging.getLogger('WhisperTranscriber').info(
+            "audio=%.2fs windows=%d language=%s load=%.3fs mel=%.3fs encode=%.3fs detect=%.3fs decode=%.3fs total=%.3fs",
+            timings['audio_seconds'], timings['windows'], language, timings['load'],
+            timings['mel'], timings['encode'], timings['detect'], timings['decode'], timings['total']
+        )
+        return "".join(texts)
+
+    def detect_language(self, features):
+        # 傳入 embed_audio() 的結果時，model.detect_language 不會再跑一次 encoder
+        _, probs = self.model.detect_language(features)
+        detected_language = max(probs, key=probs.get)
+        logging.getLogger('WhisperTranscriber').info(f"Detected language: {detected_language}")
+        return detected_language
+
+    def prepare_mel(self, window):
+        # 只對實際音訊算 log-Mel，再補零到 encoder 固定的 3000 frames
+        mel = whisper.log_mel_spectrogram(window, n_mels=self.model.dims.n_mels).to(self.model.device)
+        return whisper.pad_or_trim(mel, N_FRAMES)
+
+    def use_fp16(self):
+        return self.config.fp16 if self.config.fp16 is not None else self.model.device.type != "cpu"
+
+    def embed_audio(self, mel):
+        """
+        跑一次 encoder，回傳 audio features（mel 為 (n_mels, 3000) 或 (B, n_mels, 3000)）。
+        whisper.decode 收到 features 時直接使用，不會再跑 encoder，換溫度重解只需要重跑 decoder。
+        """
+        single = mel.ndim == 2
+        mel = (mel[None] if single else mel).to(torch.float16 if self.use_fp16() else torch.float32)
+        with torch.no_grad():
+            features = self.model.embed_audio(mel)
+        return features[0] if single else features
+
+    def decoding_options(self, language, seconds, prompt=None, temperature=0.0):
+        config = self.config
+        fp16 = self.use_fp16()
+        return whisper.DecodingOptions(
+            task=config.task,
+            language=language,
+            temperature=temperature,
+            beam_size=config.beam_size if temperature == 0 else None,
+            without_timestamps=True,
+            # 短句不需要解到 224 個 token，限制長度可以避免幻覺重複拖慢解碼
+            sample_len=self.max_tokens_for(seconds),
+            # 後面的視窗以前一段文字為前文，第一個視窗用展場詞彙
+            prompt=prompt or config.initial_prompt,
+            fp16=fp16
+        )
+
+    def decode_with_fallback(self, features, language, seconds, prompt=None, temperatures=None):
+        # features 為 embed_audio() 的結果，每個溫度只重跑 decoder
+        result = None
+        for temperature in temperatures or self.config.temperatures:
+            result = whisper.decode(self.model, features, self.decoding_options(language, seconds, prompt, temperature))
+            if not self.needs_fallback(result):
+                break
+        return result
+
+    def is_no_speech(self, result):
+        threshold = self.config.no_speech_threshold
+        return (threshold is not None and result.no_speech_prob > threshold
+                and result.avg_logprob < self.config.logprob_threshold)
+
+    def result_text(self, result):
+        # 沒有人說話（靜音、雜訊）時 Whisper 的輸出多半是幻覺，與 whisper.transcribe 一樣直接丟掉
+        return "" if self.is_no_speech(result) else result.text.strip()
+
+    def needs_fallback(self, result):
+        if self.is_no_speech(result):
+            # 靜音或雜訊在每個溫度都會通不過 logprob 門檻，再重解只是浪費
+            return False
+        text = result.text.encode("utf-8")
+        compression_ratio = len(text) / len(zlib.compress(text)) if text else 0.0
+        return (compression_ratio > self.config.compression_ratio_threshold
+                or result.avg_logprob < self.config.logprob_threshold)
+
+    def split_windows(self, audio, search_seconds=5.0, frame_size=480):
+        """
+        把音訊切成不超過 30 秒的視窗，切點選在每個視窗最後 search_seconds 秒內最安靜的地方，避免把字切斷。
+        """
+        windows = []
+        while len(audio) > N_SAMPLES:
+            search = audio[N_SAMPLES - int(search_seconds * SAMPLE_RATE):N_SAMPLES]
+            n_frames = len(search) // frame_size
+            energy = np.square(search[:n_frames * frame_size].reshape(n_frames, frame_size)).mean(axis=1)
+            cut = N_SAMPLES - len(search) + int(np.argmin(energy)) * frame_size + frame_size // 2
+            windows.append(audio[:cut])
+            audio = audio[cut:]
+        if len(audio) > 0:
+            windows.append(audio)
+        return windows
 
-        # Return the recognized text
-        return result.text
+    @staticmethod
+    def max_tokens_for(seconds):
+        # 中文語速約每秒 4~5 字，保留兩倍以上餘裕
+        return int(min(224, max(32, seconds * 15)))
 
 if __name__ == "__main__":
     transcriber = WhisperTranscriber()
     transcription = transcriber.transcribe("audio.mp3")
-    print("Transcription:", transcription)
\ No newline at end of file
+    print("Transcription:", transcription)
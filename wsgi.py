@@ -0,0 +1,29 @@
+"""
+正式環境的 WSGI 進入點（gunicorn）。
+
+preload 時（CPU 主機的預設），master process 匯入這個檔案時就把 embedding 模型、向量索引、dns64 與 Whisper 全部載入，
+之後 fork 出來的 worker 透過 copy-on-write 共用同一份權重與索引，不會各自再載入一次。
+有 GPU 時不 preload（見 gunicorn.conf.py 的 WEB_PRELOAD），每個 worker 在 fork 之後才匯入這個檔案並各自載入。
+
+啟動方式（設定見 gunicorn.conf.py）：
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import gc
+import os
+
+from api_server import create_app, pipeline
+
+# 預設的回傳格式由 RESPONSE_PROFILE 決定（unity / json / raw），每個請求也可用 ?profile= 改用其他格式
+app = create_app()
+
+# embedding 模型、索引、dns64 與 Whisper 全部在 fork 前（或沒有 preload 時在 worker 內）載入並 warm-up（各元件的載入時間見 /readyz）；
+# 需要連線的 warm-up（TTS、本地 LLM）由每個 worker 在 post_worker_init 各自執行，不在 master 建立任何連線
+pipeline.load(network=False)
+if not pipeline.startup.ready:
+    app.logger.error(f"Startup incomplete, /readyz will report 503: {pipeline.startup.status()['components']}")
+
+# 把目前所有物件移出 GC 追蹤，避免 worker 跑 GC 時改寫物件標頭，讓共用的記憶體分頁被複製
+gc.collect()
+gc.freeze()
+
+app.logger.info(f"Models loaded (pid={os.getpid()})")